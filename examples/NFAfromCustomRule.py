@@ -7,7 +7,10 @@ sys.path.append(os.path.join(_project_root, 'examples'))
 from typing import Optional, List, Tuple, Dict, Set, cast, Union
 import re
 
-from src.automata_tools import BuildAutomata, Automata
+from src.automata_tools import BuildAutomata, BuildAutomataInPlace, AutomataFragment, Automata, TokenClassifier, Tokenizer, MultiRuleDFA, NFAtoDFA
+from src.automata_tools.Automata import IAutomataExecutor
+from src.automata_tools.CompiledDFA import CompiledDFA
+from src.automata_tools.constants import DEAD_STATE
 from customRuleTokenizer import ruleParser
 
 punctuations = [
@@ -16,17 +19,17 @@ punctuations = [
 ]
 
 
+# pads all punctuations in one pass of a precompiled pattern
+punctuationPattern = re.compile(f"[{''.join(re.escape(punctuation) for punctuation in punctuations)}]")
+sentenceTokenizer = Tokenizer(punctuations)
+
+
 def padPunctuations(shortString: str):
-    for punctuation in punctuations:
-        shortString = re.sub(f'[{punctuation}]', f' {punctuation} ',
-                             shortString)
-    return shortString
+    return punctuationPattern.sub(r' \g<0> ', shortString)
 
 
 def tokenizer(input: str):
-    inputWithPunctuationsPaddedWithSpace = padPunctuations(input)
-    tokens = inputWithPunctuationsPaddedWithSpace.split(' ')
-    return [item for item in tokens if item]
+    return sentenceTokenizer.tokenize(input)
 
 
 IAvailableTransitions = Dict[int, Set[str]]
@@ -37,85 +40,129 @@ SymbolPunctuation = 'SymbolPunctuation'
 SymbolWildcard = 'SymbolWildcard'
 
 
-def matchTokenInSet(token: Optional[str], acceptTokens: Set[str]):
+symbolOfWildcard = {'%': SymbolNumeric, '&': SymbolPunctuation, '$': SymbolWildcard}
+
+
+def matchTokenInSet(token: Optional[str], acceptTokens: Set[str], wildcard: Optional[str] = None):
+    """
+    wildcard is the class of token given by customRuleTokenClassifier, pass it if the token is matched against many sets
+    """
     if token == None:
         return None
     if token in acceptTokens:
         return SymbolWord
-    elif '%' in acceptTokens and token.replace('.', '', 1).isdigit():
-        return SymbolNumeric
-    elif '&' in acceptTokens and token in punctuations:
-        return SymbolPunctuation
-    elif '$' in acceptTokens and not token.replace('.', '', 1).isdigit() and token not in punctuations:
-        return SymbolWildcard
+    if wildcard is None:
+        wildcard = customRuleTokenClassifier.classify(token)
+    if wildcard in acceptTokens:
+        return symbolOfWildcard[wildcard]
     return None
 
 
-def tryConsumeNonWildCard(availableTransitions: IAvailableTransitions,
-                          currentToken: Optional[str], currentTokens: List[str]
-                          ) -> Optional[Tuple[int, Optional[str], List[str]]]:
-    # search available transition in the first pass
-    for nextState, pathSet in availableTransitions.items():
-        if matchTokenInSet(currentToken, pathSet) == SymbolWord:
-            nextToken = currentTokens.pop(0) if len(currentTokens) > 0 else None
-            return (nextState, nextToken, currentTokens)
-    return None
+def executor(tokens, startState, finalStates,
+             transitions: Dict[int, IAvailableTransitions]):
+    """
+    Backtracking executor, return True as soon as a final state is reached. At each state a token is consumed by a non wildcard matcher in rule first, and only if that can't lead to a final state, by a wildcard (non-greedy wild card).
 
+    Tokens are indexed instead of popped, and (state, position) that failed are remembered, so each is tried at most once, and time is linear to number of states × number of tokens instead of exponential in ambiguous rules like "($|&)* and you are BBB $*".
+    """
+    tokens = tuple(tokens)
+    finalStates = set(finalStates)
+    if startState in finalStates:
+        return True
+    triedPaths: Set[Tuple[int, int]] = set()
+    # depth first, and nextStates of a token are pushed in reversed order, so non wildcard matchers are tried first
+    pathsToTry: List[Tuple[int, int]] = [(startState, 0)]
+    while len(pathsToTry) != 0:
+        path = pathsToTry.pop()
+        if path in triedPaths:
+            continue
+        triedPaths.add(path)
+        currentState, position = path
+        if position == len(tokens):
+            continue  # sadly, no more token to reach a final state
+        currentToken = tokens[position]
+        wildcard = customRuleTokenClassifier.classify(currentToken)
+        nonWildcardStates: List[int] = []
+        wildcardStates: List[int] = []
+        for nextState, pathSet in transitions.get(currentState, {}).items():
+            symbol = matchTokenInSet(currentToken, pathSet, wildcard)
+            if symbol == SymbolWord:
+                nonWildcardStates.append(nextState)
+            elif symbol is not None:
+                wildcardStates.append(nextState)
+        for nextState in nonWildcardStates + wildcardStates:
+            if nextState in finalStates:
+                return True
+        for nextState in reversed(nonWildcardStates + wildcardStates):
+            pathsToTry.append((nextState, position + 1))
+    return False
 
-def tryConsumeWildCard(availableTransitions: IAvailableTransitions,
-                       currentToken: Optional[str], currentTokens: List[str]
-                       ) -> Optional[Tuple[int, Optional[str], List[str]]]:
-    # non-greedy wild card, we only use it when there is no other choice
-    for nextState, pathSet in availableTransitions.items():
-        if matchTokenInSet(currentToken, pathSet) == SymbolNumeric:
-            nextToken = currentTokens.pop(0) if len(currentTokens) > 0 else None
-            return (nextState, nextToken, currentTokens)
-        elif matchTokenInSet(currentToken, pathSet) == SymbolPunctuation:
-            nextToken = currentTokens.pop(0) if len(currentTokens) > 0 else None
-            return (nextState, nextToken, currentTokens)
-        elif matchTokenInSet(currentToken, pathSet) == SymbolWildcard:
-            nextToken = currentTokens.pop(0) if len(currentTokens) > 0 else None
-            return (nextState, nextToken, currentTokens)
-    return None
 
+def wildcardOfToken(token: str) -> str:
+    """
+    $ means words, % means numbers, & means punctuations
+    """
+    if token.replace('.', '', 1).isdigit():
+        return '%'
+    elif token in punctuations:
+        return '&'
+    return '$'
 
-def executor(tokens, startState, finalStates,
-             transitions: Dict[int, IAvailableTransitions]):
-    currentState: int = startState
-    currentToken: Optional[str] = tokens.pop(0)
-    while currentState not in finalStates:
-        availableTransitions = transitions[currentState]
-        # count if we have ambiguous situation, since wildcard can make DFA sometimes actually a NFA
-        availablePathCount = 0
-        for _, pathSet in availableTransitions.items():
-            if matchTokenInSet(currentToken, pathSet):
-                availablePathCount += 1
-        # try consume a non wildcard matcher in rule first
-        matchingResult = tryConsumeNonWildCard(transitions[currentState],
-                                               currentToken, tokens)
-        if matchingResult and matchingResult[0] in finalStates:
-            return True
 
-        if availablePathCount > 1 and matchingResult != None:
-            # it is ambiguous now
-            # try go on, and see if consume a non wildcard matcher is a right choice
-            # (currentState, currentToken, tokens) = matchingResult
-            if matchingResult[1] == None:
+customRuleTokenClassifier = TokenClassifier(['$', '%', '&'], wildcardOfToken)
+
+
+def compiledExecutor(automata: Automata, compiled: Optional[CompiledDFA] = None) -> IAutomataExecutor:
+    """
+    Build an executor that walks the compiled transition table of the DFA, classifying each token only once.
+
+    Wildcards make the DFA ambiguous when a token and its wildcard lead to different states, these are found at compile time, and only there we fall back to the backtracking executor, so it behaves the same as executor.
+
+    compiled can be a CompiledDFA loaded by CompiledDFA.load, it must be compiled from automata with customRuleTokenClassifier.
+    """
+    if compiled is None:
+        compiled = automata.compile(classifier=customRuleTokenClassifier)
+    table = compiled.table
+    ambiguous = compiled.ambiguous
+    isFinal = compiled.isFinal
+    stateIndex = {state: stateID for stateID, state in enumerate(compiled.states)}
+
+    def fastExecutor(tokens, startState, finalStates, transitions):
+        stateID = stateIndex[startState]
+        if isFinal[stateID]:
+            return True
+        for position, token in enumerate(tokens):
+            column = compiled.getColumn(token)
+            if ambiguous[stateID, column]:
+                return executor(tokens[position:], compiled.states[stateID], finalStates, transitions)
+            stateID = table.item(stateID, column)
+            if stateID == DEAD_STATE:
                 return False
-            initialStateToTry = matchingResult[0]
-            tokensToTry = [cast(str, matchingResult[1])] + matchingResult[2]
-            if executor(tokensToTry, initialStateToTry, finalStates,
-                        transitions):
+            if isFinal[stateID]:
                 return True
-            else:
-                matchingResult = None
-        if matchingResult == None:
-            matchingResult = tryConsumeWildCard(transitions[currentState],
-                                                currentToken, tokens)
-            if matchingResult == None:
-                return False  # sadly, no available transition for current token
-        (currentState, currentToken, tokens) = matchingResult
-    return True
+        return False
+
+    return fastExecutor
+
+
+def minDFAFromDSL(rule: str) -> Automata:
+    """
+    Build the minimized DFA of a rule, can be used as the buildFunction of RuleCache
+    """
+    return NFAtoDFA(NFAFromDSL().buildNFA(rule))
+
+
+def multiRuleDFAFromDSL(rules: Dict[str, str], maxStates: int = 10000) -> MultiRuleDFA:
+    """
+    Build one DFA for { ruleName: rule }, so we can get all matching rules in one pass over the tokens
+    """
+    automataOfRules = {
+        ruleName: minDFAFromDSL(rule)
+        for ruleName, rule in rules.items()
+    }
+    multiRuleDFA = MultiRuleDFA(automataOfRules, customRuleTokenClassifier, maxStates=maxStates)
+    multiRuleDFA.setTokenizer(tokenizer)
+    return multiRuleDFA
 
 
 class NFAFromDSL:
@@ -126,7 +173,7 @@ class NFAFromDSL:
     #: 存放 + * 等特殊符号的栈
     operatorStack: List[Union[str, Dict[str, str]]] = [] # ['(', { type: '<', payload: 'label' }]
     #: 存放子自动机的栈
-    automataStack: List[Automata] = []
+    automataStack: List[Union[Automata, AutomataFragment]] = []
 
     starOperator = '*'
     plusOperator = '+'
@@ -150,8 +197,12 @@ class NFAFromDSL:
         initOperator
     ] + binaryOperators + unaryOperators + openingBrackets + closingBrackets + angleBrackets
 
-    def __init__(self):
-        pass
+    def __init__(self, inPlace: bool = True):
+        """
+        inPlace: build with BuildAutomataInPlace, which takes linear time and gives the same NFA as BuildAutomata
+        """
+        self.inPlace = inPlace
+        self.builder: Union[BuildAutomataInPlace, BuildAutomata] = BuildAutomata()
 
     @staticmethod
     def displayNFA(nfa: Automata):
@@ -161,6 +212,7 @@ class NFAFromDSL:
         language = set()
         self.operatorStack = []
         self.automataStack = []
+        self.builder = BuildAutomataInPlace() if self.inPlace else BuildAutomata()
         previous = self.initOperator
         ruleTokens = ruleParser(rule)
         index = 0
@@ -173,7 +225,7 @@ class NFAFromDSL:
                         or previous in [self.closingBracket] +
                         self.unaryOperators): # previous is regular token or is not in (self.allOperators - ([self.closingBracket] + self.unaryOperators))
                     self.addOperatorToStack(self.concatOperator)
-                self.automataStack.append(BuildAutomata.characterStruct(token))
+                self.automataStack.append(self.builder.characterStruct(token))
             elif token == self.closingAngleBracket: # (?<label> xxx )
                 # to handle ( ? < label > , we get "label"
                 captureGroupLabel = ruleTokens[index - 1]
@@ -244,6 +296,8 @@ class NFAFromDSL:
             print(self.automataStack)
             raise BaseException("Regex could not be parsed successfully")
         nfa = self.automataStack.pop()
+        if isinstance(nfa, AutomataFragment):
+            nfa = cast(BuildAutomataInPlace, self.builder).build(nfa)
         nfa.language = language
         return nfa
 
@@ -269,21 +323,20 @@ class NFAFromDSL:
                 f"Error processing operator {operator}. Stack is empty")
         if operator == self.starOperator:
             a = self.automataStack.pop()
-            self.automataStack.append(BuildAutomata.starStruct(a))
+            self.automataStack.append(self.builder.starStruct(a))
         elif operator == self.questionOperator:
             a = self.automataStack.pop()
-            self.automataStack.append(BuildAutomata.skipStruct(a))
+            self.automataStack.append(self.builder.skipStruct(a))
         elif operator == self.plusOperator:
             a = self.automataStack.pop()
-            moreA = BuildAutomata.starStruct(a)
-            self.automataStack.append(BuildAutomata.concatenationStruct(a, moreA))
+            self.automataStack.append(self.builder.plusStruct(a))
         elif operator == self.closingBrace: # '}'
             if payload == None:
                 raise BaseException(
                     f"Error processing operator {operator}. payload is None")
             repeatRangeStart, repeatRangeEnd = payload
             automataToRepeat = self.automataStack.pop()
-            repeatedAutomata = BuildAutomata.repeatRangeStruct(
+            repeatedAutomata = self.builder.repeatRangeStruct(
                 automataToRepeat, int(repeatRangeStart), int(repeatRangeEnd))
             self.automataStack.append(repeatedAutomata)
         elif operator in self.binaryOperators:
@@ -294,6 +347,6 @@ class NFAFromDSL:
             a = self.automataStack.pop()
             b = self.automataStack.pop()
             if operator == self.orOperator:
-                self.automataStack.append(BuildAutomata.unionStruct(b, a))
+                self.automataStack.append(self.builder.unionStruct(b, a))
             elif operator == self.concatOperator:
-                self.automataStack.append(BuildAutomata.concatenationStruct(b, a))
+                self.automataStack.append(self.builder.concatenationStruct(b, a))
@@ -1,5 +1,8 @@
 from automata_tools.Automata import Automata
-from typing import Dict
+from automata_tools.SparseTransitionTensor import SparseTransitionTensor
+from automata_tools.TokenClassifier import TokenClassifier
+from automata_tools.constants import UNKNOWN_TOKEN
+from typing import Dict, List, Tuple
 import numpy as np
 
 def is_number(token):
@@ -13,7 +16,20 @@ punctuations = {
 def is_punctuations(token):
     return token in punctuations
 
-def dfa_to_tensor(automata, word2idx: Dict[str, int]):
+def wildcard_of_word(token):
+    if token.startswith(UNKNOWN_TOKEN):
+        # bucket of unknown words from WFA.from_vocabulary, named after their wildcard
+        return token[len(UNKNOWN_TOKEN):] or None
+    if is_number(token):
+        return '%'
+    if is_punctuations(token):
+        return '&'
+    return '$'
+
+# words are classified once, and stay in its cache for the WFA of other rules on the same vocabulary
+word_classifier = TokenClassifier(['$', '%', '&'], wildcard_of_word)
+
+def dfa_to_word_edges(automata, word2idx: Dict[str, int]):
     """
     Parameters
     ----------
@@ -22,7 +38,7 @@ def dfa_to_tensor(automata, word2idx: Dict[str, int]):
 
     Returns
     -------
-    tensor: tensor for language
+    word_edges: {word index: [(from state idx, to state idx), ...]}
     state2idx: state to idx
     wildcard_mat: matrix for wildcard
     language: set for language
@@ -33,11 +49,14 @@ def dfa_to_tensor(automata, word2idx: Dict[str, int]):
         state: idx for idx, state in enumerate(all_states)
     }
 
-    number_indexes = {word: idx for word, idx in word2idx.items() if is_number(word)}
-    punctuations_indexes = {word: idx for word, idx in word2idx.items() if is_punctuations(word)}
+    wildcard_indexes = word_classifier.getWildcardIndexes(word2idx)
+    number_wildcard_index = word_classifier.wildcards.index('%')
+    punctuations_wildcard_index = word_classifier.wildcards.index('&')
+    number_indexes = {word: idx for word, idx in word2idx.items() if wildcard_indexes[idx] == number_wildcard_index}
+    punctuations_indexes = {word: idx for word, idx in word2idx.items() if wildcard_indexes[idx] == punctuations_wildcard_index}
 
     max_states = len(automata['states'])
-    tensor = np.zeros((len(word2idx), max_states, max_states))
+    word_edges: Dict[int, List[Tuple[int, int]]] = {}
 
     language = set([])
     language.update(number_indexes.keys())
@@ -47,18 +66,55 @@ def dfa_to_tensor(automata, word2idx: Dict[str, int]):
 
     for from_state, to in automata['transitions'].items():
         for to_state, to_edges in to.items():
+            edge_of_states = (state2idx[from_state], state2idx[to_state])
             for edge in to_edges:
                 if edge == '&': # punctuations
-                    tensor[list(punctuations_indexes.values()), state2idx[from_state], state2idx[to_state]] = 1
+                    for word_idx in punctuations_indexes.values():
+                        word_edges.setdefault(word_idx, []).append(edge_of_states)
                 elif edge == '%': # digits
-                    tensor[list(number_indexes.values()), state2idx[from_state], state2idx[to_state]] = 1
+                    for word_idx in number_indexes.values():
+                        word_edges.setdefault(word_idx, []).append(edge_of_states)
                 elif edge == "$":
-                    wildcard_matrix[state2idx[from_state], state2idx[to_state]] = 1
+                    wildcard_matrix[edge_of_states] = 1
                 else:
                     if edge in word2idx:
-                        tensor[word2idx[edge], state2idx[from_state], state2idx[to_state]] = 1
+                        word_edges.setdefault(word2idx[edge], []).append(edge_of_states)
                         language.add(edge)
                     else:
                         print(f'OutOfVocabulary word: {edge} in rule')
 
-    return tensor, state2idx, wildcard_matrix, list(language)
+    return word_edges, state2idx, wildcard_matrix, list(language)
+
+
+def dfa_to_tensor(automata, word2idx: Dict[str, int]):
+    """
+    Parameters
+    ----------
+    automata: Automata.to_dict()
+    word2idx
+
+    Returns
+    -------
+    tensor: dense V×S×S tensor for language
+    state2idx: state to idx
+    wildcard_mat: matrix for wildcard
+    language: set for language
+    """
+    word_edges, state2idx, wildcard_matrix, language = dfa_to_word_edges(automata, word2idx)
+    max_states = len(state2idx)
+    tensor = np.zeros((len(word2idx), max_states, max_states))
+    for word_idx, edges in word_edges.items():
+        from_states, to_states = zip(*edges)
+        tensor[word_idx, list(from_states), list(to_states)] = 1
+
+    return tensor, state2idx, wildcard_matrix, language
+
+
+def dfa_to_sparse_tensor(automata, word2idx: Dict[str, int]):
+    """
+    Same as dfa_to_tensor, but the tensor is a SparseTransitionTensor, whose memory scales with the number of edges instead of V·S²
+    """
+    word_edges, state2idx, wildcard_matrix, language = dfa_to_word_edges(automata, word2idx)
+    tensor = SparseTransitionTensor.fromEdges(len(word2idx), len(state2idx), word_edges)
+
+    return tensor, state2idx, wildcard_matrix, language
@@ -0,0 +1,12 @@
+Feature: Execute NFA with bitsets
+  In order to run big rules whose DFA is too large to build,
+  I want to execute the NFA keeping its active states in a bitset
+  So each token only costs a few bitwise operations
+
+  Scenario: Bit parallel NFA gives same results as the DFA
+    Given the NFA of rule "(aaa|bbb)* aaa (aaa|bbb) (aaa|bbb) ccc? $*"
+      Then bit parallel NFA matches sentence "bbb aaa bbb bbb"
+      And bit parallel NFA matches sentence "aaa bbb aaa aaa ccc"
+      And bit parallel NFA matches sentence "aaa aaa bbb ddd eee"
+      But bit parallel NFA won't match sentence "bbb bbb aaa bbb"
+      And bit parallel NFA won't match sentence "aaa bbb aaa , eee"
@@ -0,0 +1,27 @@
+Feature: Compile DFA into array backed transition table
+  In order to step on a token with only one index lookup,
+  I want to compile DFA into a dense next state table
+  So existing builders can still work on the automata converted back from the table
+
+  Scenario: Compiled DFA keeps the automata
+    Given the rule "ggg (aaa | bbb) ccc"
+      Then its compiled DFA converts back to the same automata
+      And its compiled DFA matches tokens "ggg aaa ccc"
+      But its compiled DFA won't match tokens "ggg aaa bbb ccc"
+    Given the rule "$* aaa{2,4} bbb $*"
+      Then its compiled DFA converts back to the same automata
+      And its compiled DFA matches tokens "Ouch aaa aaa bbb cool"
+      But its compiled DFA won't match tokens "Ouch aaa bbb cool"
+
+  Scenario: Tokens in the alphabet fall back to the default token
+    Given the rule "$* aaa{2,4} bbb $*"
+      Then its compiled DFA matches tokens "Ouch aaa aaa bbb aaa"
+      And its compiled DFA matches tokens "bbb aaa aaa bbb"
+      But its compiled DFA won't match tokens "bbb aaa bbb aaa"
+
+  Scenario: Tokens are classified once
+    Given a token classifier that counts its calls
+      When it classifies "aaa 3.14 , aaa 3.14 , bbb" 3 times
+      Then it is called 4 times
+      And word indexes of "aaa 3.14 , bbb" are classified as "$ % & $"
+      And it classifies the same after pickling
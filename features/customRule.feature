@@ -23,6 +23,7 @@ Feature: Write Custom Rule
       And it matches sentence "Wow, I think app is really, a big thing."
     Given the rule "($ * ( thanks & | thanks ) I think (&|$)*)"
       Then it matches sentence "ha ha thanks. I think punctuations are cool!"
+      And sentence "ha ha thanks.I  think (punctuations) are“cool”!" is tokenized into "ha ha thanks . I think ( punctuations ) are“cool” !"
 
   Scenario: Find text with repeated words
     Given the rule "$* aaa{2,4} bbb $*"
@@ -31,6 +32,14 @@ Feature: Write Custom Rule
       Then it matches sentence "Ouch aaa aaa aaa aaa bbb cool!"
       But it won't match sentence "Ouch aaa bbb cool!"
       And it won't match sentence "Ouch bbb cool!"
+      And in place builder gives the same NFA
+    Given the rule "$* xxx aaa{1,3} bbb{0,2} ccc $*"
+      Then it matches sentence "so xxx aaa ccc cool"
+      And it matches sentence "so xxx aaa aaa aaa bbb bbb ccc cool"
+      But it won't match sentence "so xxx ccc cool"
+      And it won't match sentence "so xxx aaa aaa aaa aaa ccc cool"
+      And it won't match sentence "so xxx aaa bbb bbb bbb ccc cool"
+      And in place builder gives the same NFA
     Given the rule "$* aaa+ bbb $*"
       Then it matches sentence "Ouch aaa bbb cool!"
       Then it matches sentence "Ouch aaa aaa bbb cool!"
@@ -38,6 +47,9 @@ Feature: Write Custom Rule
       Then it matches sentence "Ouch aaa aaa aaa aaa bbb cool!"
       And it won't match sentence "Ouch bbb cool!"
       And it won't match sentence "Ouch aaa"
+      And batched WFA gives same results on these sentences
+      And word indexes from the tokenizer give same results on these sentences
+      And in place builder gives the same NFA
     Given the rule "what (is|does it?|did) it? (do|did) &"
       Then it matches sentence "what did it do?"
       Then it matches sentence "what does it did?"
@@ -45,6 +57,7 @@ Feature: Write Custom Rule
       Then it matches sentence "what is it did."
       And it won't match sentence "what does it it it do?"
       And it won't match sentence "what is it it did?"
+      And in place builder gives the same NFA
 
   Scenario: Find text with none greedy behavior
     Given the rule "($|&)* and you are BBB $*"
@@ -59,6 +72,21 @@ Feature: Write Custom Rule
       And it matches sentence "I may have my little three with me"
       But it won't match sentence "I may have with me"
 
+  Scenario: Wildcard is tried when the non wildcard matcher leads nowhere
+    Given the rule "ccc ddd | $ eee"
+      Then it matches sentence "ccc eee"
+      And it matches sentence "ccc ddd"
+      And it matches sentence "bbb eee"
+      But it won't match sentence "ccc fff"
+    Given the rule "ccc ddd | $"
+      Then it matches sentence "ccc"
+      And it matches sentence "ccc ddd"
+
+  Scenario: Ambiguous wildcards don't blow up on long sentences
+    Given the rule "$* aaa $* aaa $* aaa $* bbb"
+      Then it won't match "aaa" repeated 300 times then "ccc"
+      And it matches "aaa" repeated 300 times then "bbb"
+
   Scenario: Labeling some part of sequence using the capture group
     Given the rule "I may (?<predicate>have (her|you)) with me"
       Then it matches sentence "I may have you with me"
@@ -67,3 +95,11 @@ Feature: Write Custom Rule
       But it won't match sentence "I may have her you with me"
       And it capture "have her" in sentence "I may have her with me"
       And it capture "have you" in sentence "I may have you with me"
+      And in place builder gives the same NFA
+
+  Scenario: Extracting several capture groups
+    Given the rule "(?<subject>$+) may (?<predicate>have (her|you)) with me $*"
+      Then it captures "subject=I, predicate=have you" in sentence "I may have you with me"
+      And it captures "subject=Wow and I, predicate=have her" in sentence "Wow and I may have her with me today"
+      And it captures nothing in sentence "I may have them with me"
+      And in place builder gives the same NFA
@@ -0,0 +1,19 @@
+Feature: Build DFA states on the fly
+  In order to run rules whose full DFA is too large to build,
+  I want DFA states to be built only when an input reaches them, in a bounded cache
+  So memory stays bounded, and warm inputs still run at DFA speed
+
+  Scenario: Lazy DFA gives same results as the DFA
+    Given the NFA of rule "(aaa|bbb)* aaa (aaa|bbb) (aaa|bbb) (aaa|bbb) (aaa|bbb) (aaa|bbb)"
+      Then lazy DFA matches sentence "bbb aaa bbb bbb aaa aaa bbb"
+      And lazy DFA matches sentence "aaa bbb aaa aaa aaa bbb aaa bbb"
+      But lazy DFA won't match sentence "aaa bbb aaa bbb bbb"
+      And lazy DFA won't match sentence "aaa aaa bbb aaa bbb bbb bbb aaa"
+
+  Scenario: Lazy DFA with a small cache flushes it, then falls back to NFA
+    Given the NFA of rule "$* aaa (bbb|ccc) $*"
+      And a lazy DFA of at most 3 states
+      Then lazy DFA matches sentence "xxx aaa ccc yyy aaa zzz"
+      And lazy DFA won't match sentence "xxx aaa yyy aaa aaa ddd"
+      And lazy DFA is flushed and has fallen back to NFA
+      And lazy DFA has at most 3 states
@@ -0,0 +1,24 @@
+Feature: Match a large corpus in parallel
+  In order to label a large corpus with all my rules,
+  I want to build each rule once and share it with a pool of worker processes
+  So matching scales to all cores
+
+  Scenario: Match sentences in chunks across worker processes
+    Given the rules
+      | name     | rule                         |
+      | aaabbb   | $* aaa bbb $*                |
+      | group    | ggg (aaa \| bbb) ccc         |
+      | wildcard | I may have ($+\|you) with me |
+    When I match the corpus with 2 workers and chunk size 2
+      """
+      oh my aaa bbb is not a ccc
+      ggg bbb ccc aaa bbb
+      I may have my little three with me
+      it costs many dollars
+      ggg aaa ccc
+      """
+    Then line 1 matches rules "aaabbb"
+      And line 2 matches rules "aaabbb, group"
+      And line 3 matches rules "wildcard"
+      And line 4 matches no rule
+      And line 5 matches rules "group"
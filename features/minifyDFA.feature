@@ -8,3 +8,14 @@ Feature: Minify DFA state on given DFA
       Then it matches sentence "a what a bbb"
       And it matches sentence "ccc what bbb"
       But it won't match sentence "what is the abbreviated expression for the national bureau of investigation ?"
+      And hopcroft and table filling minimize it to the same DFA
+
+  Scenario: ε closures are cached until the automata changes
+    Given the NFA of rule "((aaa?)* | bbb*)+ ccc | ddd?"
+      Then ε closures of all states are same as searching from each state
+      And ε closures are recomputed after adding an ε transition
+
+  Scenario: NFA is simplified before subset construction
+    Given the NFA of rule "( aaa | bbb ) {0,3} ccc ( ddd ? | eee * ) $ *"
+      Then simplified NFA has no ε transition and fewer states and edges
+      And simplified NFA gives the same minimized DFA
@@ -0,0 +1,30 @@
+Feature: Match many rules in one pass
+  In order to evaluate hundreds of rules against every sentence,
+  I want to build all rules into one DFA whose states know which rules they accept
+  So one pass over the tokens returns every rule that matches
+
+  Scenario: Find all matching rules
+    Given the rules
+      | name     | rule                         |
+      | aaabbb   | $* aaa bbb $*                |
+      | group    | ggg (aaa \| bbb) ccc         |
+      | wildcard | I may have ($+\|you) with me |
+      | number   | it costs % dollars           |
+    Then sentence "oh my aaa bbb is not a ccc" matches rules "aaabbb"
+      And sentence "ggg bbb ccc aaa bbb" matches rules "aaabbb, group"
+      And sentence "I may have my little three with me" matches rules "wildcard"
+      And sentence "it costs 35 dollars" matches rules "number"
+      But sentence "it costs many dollars" matches no rule
+
+  Scenario: DFA states of many rules are kept in a bounded cache
+    Given the rules in a DFA of at most 3 states
+      | name     | rule                 |
+      | aaabbb   | $* aaa bbb $*        |
+      | aaaccc   | $* aaa $? ccc $*     |
+      | group    | ggg (aaa \| bbb) ccc |
+    Then sentence "xxx aaa bbb yyy" matches rules "aaabbb"
+      And sentence "ggg aaa ccc aaa bbb" matches rules "aaabbb, aaaccc, group"
+      And sentence "xxx aaa yyy ccc aaa zzz" matches rules "aaaccc"
+      And sentence "xxx aaa yyy bbb" matches no rule
+      And multi rule DFA is flushed and has fallen back to NFA
+      And multi rule DFA has at most 3 states
@@ -0,0 +1,50 @@
+Feature: Cache automata built from rules
+  In order to start my service quickly,
+  As a NLP tool developer
+  I want automata built from my rules to be cached in memory and on disk
+  So each rule is only built once, even across restarts
+
+  Scenario: Load rule from memory, then from disk after restart
+    Given a rule cache in a temporary directory
+      And the rule "$* aaa (bbb|ccc) $*" from the cache
+      Then the cache has 1 build, 0 memory hit and 0 disk hit
+    When I get the rule "$* aaa (bbb|ccc) $*" from the cache
+      Then the cache has 1 build, 1 memory hit and 0 disk hit
+    When the rule cache restarts
+      And I get the rule "$* aaa (bbb|ccc) $*" from the cache
+      Then the cache has 0 build, 0 memory hit and 1 disk hit
+      And it is the same DFA as built from the rule
+      And it matches sentence "oh my aaa ccc is here"
+      But it won't match sentence "oh my aaa is here"
+      And cached WFA gives same results on these sentences
+      And compiled DFA from the cache gives same results on these sentences
+    When the rule cache restarts
+      And I invalidate the rule "$* aaa (bbb|ccc) $*" in the cache
+      And I get the rule "$* aaa (bbb|ccc) $*" from the cache
+      Then the cache has 1 build, 0 memory hit and 0 disk hit
+
+  Scenario: Cache keeps capture groups
+    Given a rule cache in a temporary directory
+      And the rule "I may (?<predicate>have (her|you)) with me" from the cache
+    When the rule cache restarts
+      And I get the rule "I may (?<predicate>have (her|you)) with me" from the cache
+      Then the cache has 0 build, 0 memory hit and 1 disk hit
+      And it is the same DFA as built from the rule
+
+  Scenario: Broken entry on disk is built again
+    Given a rule cache in a temporary directory
+      And the rule "$* aaa (bbb|ccc) $*" from the cache
+    When the rule cache restarts
+      And the cached file of rule "$* aaa (bbb|ccc) $*" is truncated to 100 bytes
+      And I get the compiled rule "$* aaa (bbb|ccc) $*" from the cache
+      Then the cache has 1 build, 0 memory hit and 0 disk hit
+      And compiled DFA matches sentence "oh my aaa ccc is here"
+      But compiled DFA won't match sentence "oh my aaa is here"
+    When the rule cache restarts
+      And the cached file of rule "$* aaa (bbb|ccc) $*" is truncated to 0 bytes
+      And I get the rule "$* aaa (bbb|ccc) $*" from the cache
+      Then the cache has 1 build, 0 memory hit and 0 disk hit
+      And it is the same DFA as built from the rule
+    When the rule cache restarts
+      And I get the compiled rule "$* aaa (bbb|ccc) $*" from the cache
+      Then the cache has 0 build, 0 memory hit and 1 disk hit
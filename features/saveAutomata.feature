@@ -0,0 +1,18 @@
+Feature: Save automata into a binary file
+  In order to ship automata between processes,
+  I want to save automata into a compact binary file
+  So worker processes can load it with mmap and share it in the page cache
+
+  Scenario: Saved DFA loads back to the same automata and compiled table
+    Given the rule "I may (?<predicate>have (her|you)) with me"
+      Then it loads back the same automata from file
+      And its compiled DFA loaded from file matches sentence "I may have her with me"
+      But its compiled DFA loaded from file won't match sentence "I may have with me"
+    Given the rule "$* aaa{2,4} bbb $*"
+      Then it loads back the same automata from file
+      And its compiled DFA loaded from file matches sentence "Ouch aaa aaa bbb cool"
+      But its compiled DFA loaded from file won't match sentence "Ouch aaa bbb cool"
+
+  Scenario: Saved NFA has no compiled table
+    Given the NFA of rule "ggg (aaa | bbb)+ ccc"
+      Then it loads back the same automata from file
@@ -1,39 +1,507 @@
-from behave import given, then
+import io
+import json
+import os
+import pickle
+import shutil
+import tempfile
+from behave import given, when, then
+import numpy as np
 
-from examples.NFAfromCustomRule import NFAFromDSL, executor, tokenizer
-from examples.customRuleDFAToTensor import dfa_to_tensor
+from examples.NFAfromCustomRule import NFAFromDSL, executor, compiledExecutor, customRuleTokenClassifier, wildcardOfToken, minDFAFromDSL, multiRuleDFAFromDSL, tokenizer, sentenceTokenizer, padPunctuations, punctuations
+from examples.customRuleDFAToTensor import dfa_to_tensor, dfa_to_sparse_tensor
 from examples.customRuleTokenizer import ruleParser
-from automata_tools import DFAtoMinimizedDFA, NFAtoDFA, WFA, get_word_to_index
+from scripts.cli import matchCorpus
+from automata_tools import Automata, CaptureMatcher, CompiledDFA, DFAtoMinimizedDFA, NFAtoDFA, NFAtoDFAGroupStable, NFAtoSimplifiedNFA, getAutomataSize, WFA, RuleCache, StreamMatcher, LazyDFA, BitParallelNFA, TokenClassifier, Tokenizer, VocabularyBuilder, get_word_to_index
+from automata_tools.constants import EPSILON
 
 @given('the rule "{rule}"')
 def getRule(context, rule):
     nfa = NFAFromDSL().buildNFA(rule)
-    minDFA = NFAtoDFA(nfa)
+    useMinDFA(context, rule, NFAtoDFA(nfa))
+
+@given('the NFA of rule "{rule}"')
+def getNFAOfRule(context, rule):
+    context.minDFA = NFAFromDSL().buildNFA(rule)
+    context.rule = rule
+
+def useMinDFA(context, rule, minDFA):
     minDFA.setExecuter(executor)
     minDFA.setTokenizer(tokenizer)
     context.minDFA = minDFA
+    context.compiledExecutor = compiledExecutor(minDFA)
     context.rule = rule
+    context.sentences = []
+    context.wfas = [WFA.from_vocabulary(minDFA, ruleParser(rule), dfaToTensor, customRuleTokenClassifier) for dfaToTensor in [dfa_to_tensor, dfa_to_sparse_tensor]]
+
+def canonicalTransitions(dfa):
+    """number states in BFS order from start state, so isomorphic DFA will have same transitions"""
+    stateOrder = {dfa.startstate: 0}
+    queue = [dfa.startstate]
+    edges = []
+    while queue:
+        fromState = queue.pop(0)
+        for token, toState in sorted((token, toState) for toState, tokens in dfa.transitions.get(fromState, {}).items() for token in tokens):
+            if toState not in stateOrder:
+                stateOrder[toState] = len(stateOrder)
+                queue.append(toState)
+            edges.append((stateOrder[fromState], token, stateOrder[toState]))
+    return edges, sorted(stateOrder[state] for state in dfa.finalStates)
+
+@then('hopcroft and table filling minimize it to the same DFA')
+def sameMinimizedDFA(context):
+    dfa = NFAtoDFA(NFAFromDSL().buildNFA(context.rule), minify=False)
+    hopcroftDFA = DFAtoMinimizedDFA(dfa, 'hopcroft')
+    tableDFA = DFAtoMinimizedDFA(dfa, 'table')
+    assert len(hopcroftDFA.states) == len(tableDFA.states)
+    assert canonicalTransitions(hopcroftDFA) == canonicalTransitions(tableDFA)
+
+@then('in place builder gives the same NFA')
+def sameNFAInPlace(context):
+    nfa = NFAFromDSL(inPlace=False).buildNFA(context.rule)
+    inPlaceNFA = NFAFromDSL(inPlace=True).buildNFA(context.rule)
+    assert inPlaceNFA.to_dict() == nfa.to_dict()
+    assert inPlaceNFA.groups == nfa.groups
+
+@then('ε closures of all states are same as searching from each state')
+def sameEClosures(context):
+    nfa = context.minDFA
+    for state in nfa.states:
+        closure = {state}
+        statesToSearch = [state]
+        while len(statesToSearch) != 0:
+            for toState, transitionTokens in nfa.transitions.get(statesToSearch.pop(), {}).items():
+                if EPSILON in transitionTokens and toState not in closure:
+                    closure.add(toState)
+                    statesToSearch.append(toState)
+        assert nfa.getEClosures()[state] == closure
+        assert nfa.getEClosure(state) == closure
+    assert nfa.getEClosures() is nfa.getEClosures()
+
+@then('ε closures are recomputed after adding an ε transition')
+def eClosuresInvalidated(context):
+    nfa = context.minDFA
+    finalState = nfa.finalStates[0]
+    assert nfa.startstate not in nfa.getEClosure(finalState)
+    nfa.addTransition(finalState, nfa.startstate, EPSILON)
+    assert nfa.startstate in nfa.getEClosure(finalState)
+
+@then('simplified NFA has no ε transition and fewer states and edges')
+def simplifiedNFAIsSmaller(context):
+    stats = dict()
+    simplifiedNFA = NFAtoSimplifiedNFA(context.minDFA, stats)
+    assert all(EPSILON not in transitionTokens for toStates in simplifiedNFA.transitions.values() for transitionTokens in toStates.values())
+    assert (stats['statesBefore'], stats['edgesBefore']) == getAutomataSize(context.minDFA)
+    assert (stats['statesAfter'], stats['edgesAfter']) == getAutomataSize(simplifiedNFA)
+    assert stats['statesAfter'] < stats['statesBefore'] and stats['edgesAfter'] < stats['edgesBefore']
+
+@then('simplified NFA gives the same minimized DFA')
+def simplifiedNFASameDFA(context):
+    dfa = NFAtoDFA(context.minDFA)
+    assert canonicalTransitions(NFAtoDFA(context.minDFA, simplify=True)) == canonicalTransitions(dfa)
+    assert canonicalTransitions(NFAtoDFA(NFAtoSimplifiedNFA(context.minDFA))) == canonicalTransitions(dfa)
 
 @then('it matches sentence "{text}"')
 def matchSentence(context, text):
+    context.sentences.append((text, True))
     assert context.minDFA.execute(text) is True
-    # construct a fast WFA
-    _, wordToIndex = get_word_to_index([ruleParser(context.rule), tokenizer(text)])
-    context.wfa = WFA(context.minDFA, wordToIndex, dfa_to_tensor)
-    assert context.wfa.execute(text) is True 
+    assert context.compiledExecutor(tokenizer(text), context.minDFA.startstate, context.minDFA.finalStates, context.minDFA.transitions) is True
+    # WFA built once for the rule, words of the sentence are unknown to it
+    for wfa in context.wfas:
+        assert wfa.execute(text) is True
 
 @then('it won\'t match sentence "{text}"')
 def notMatchSentence(context, text):
+    context.sentences.append((text, False))
     assert context.minDFA.execute(text) is not True
-    # construct a fast WFA
-    _, wordToIndex = get_word_to_index([ruleParser(context.rule), tokenizer(text)])
-    context.wfa = WFA(context.minDFA, wordToIndex, dfa_to_tensor)
-    assert context.wfa.execute(text) is not True 
+    assert context.compiledExecutor(tokenizer(text), context.minDFA.startstate, context.minDFA.finalStates, context.minDFA.transitions) is not True
+    # WFA built once for the rule, words of the sentence are unknown to it
+    for wfa in context.wfas:
+        assert wfa.execute(text) is not True
+
+@then('it matches "{text}" repeated {times:d} times then "{ending}"')
+def matchRepeatedSentence(context, text, times, ending):
+    assert context.minDFA.execute(' '.join([text] * times + [ending])) is True
+
+@then('it won\'t match "{text}" repeated {times:d} times then "{ending}"')
+def notMatchRepeatedSentence(context, text, times, ending):
+    assert context.minDFA.execute(' '.join([text] * times + [ending])) is not True
+
+@then('batched WFA gives same results on these sentences')
+def batchedWFA(context):
+    texts = [text for text, _ in context.sentences]
+    _, wordToIndex = get_word_to_index([ruleParser(context.rule)] + [tokenizer(text) for text in texts])
+    wfa = WFA(context.minDFA, wordToIndex, dfa_to_tensor)
+    matches = wfa.execute_batch(texts)
+    assert matches.tolist() == [expected for _, expected in context.sentences]
+    assert matches.tolist() == [wfa.execute(text) for text in texts]
+    assert matches.tolist() == [wfa.execute_active(text) for text in texts]
+    sparseWFA = WFA(context.minDFA, wordToIndex, dfa_to_sparse_tensor)
+    assert sparseWFA.execute_batch(texts).tolist() == matches.tolist()
+    assert [sparseWFA.execute_active(text) for text in texts] == matches.tolist()
+    for vocabularyWFA in context.wfas:
+        assert vocabularyWFA.execute_batch(texts).tolist() == matches.tolist()
+        assert [vocabularyWFA.execute_active(text) for text in texts] == matches.tolist()
+
+@given('a vocabulary of at least {minFrequency:d} occurrences and at most {maxSize:d} words, counted {chunkSize:d} sentences at a time from "{texts}"')
+def buildVocabulary(context, minFrequency, maxSize, chunkSize, texts):
+    context.vocabularyTexts = [text.split(' ') for text in texts.split(', ')]
+    context.vocabularyBuilder = VocabularyBuilder(minFrequency, maxSize, chunkSize).addAll(iter(context.vocabularyTexts))
+
+@then('its words are "{words}"')
+def vocabularyWords(context, words):
+    assert context.vocabularyBuilder.getWordToIndex() == {word: index for index, word in enumerate(words.split(' '))}
+
+@then('it loads back the same words from file')
+def loadVocabulary(context):
+    temporaryDirectory = tempfile.mkdtemp()
+    context.add_cleanup(shutil.rmtree, temporaryDirectory, ignore_errors=True)
+    path = os.path.join(temporaryDirectory, 'vocabulary.jsonl')
+    context.vocabularyBuilder.save(path)
+    assert VocabularyBuilder.load(path).getWordToIndex() == context.vocabularyBuilder.getWordToIndex()
+
+@then('it gives the same words when spilled to disk every {maxMemoryWords:d} words')
+def spillVocabulary(context, maxMemoryWords):
+    vocabularyBuilder = context.vocabularyBuilder
+    spilledBuilder = VocabularyBuilder(vocabularyBuilder.minFrequency, vocabularyBuilder.maxSize, 1, maxMemoryWords)
+    spilledBuilder.addAll(context.vocabularyTexts)
+    assert len(spilledBuilder.runPaths) > 1
+    assert spilledBuilder.getWordToIndex() == vocabularyBuilder.getWordToIndex()
+
+@then('WFA built from the vocabulary has buckets of unknown words')
+def unknownWordBuckets(context):
+    wfa = context.wfas[0]
+    assert set(wfa.unknownIndexes) == {'$', '%', '&', ''}
+    assert [wfa.getWordIndex(word) for word in ['zzz', '42', '?']] == [wfa.unknownIndexes[wildcard] for wildcard in ['$', '%', '&']]
+    assert wfa.getWordIndex('aaa') == wfa.word2index['aaa']
+    # a real token that looks like a bucket is a word of its own
+    vocabularyWFA = WFA.from_vocabulary(context.minDFA, ['Unknown-%', 'Unknown'], dfa_to_tensor, customRuleTokenClassifier)
+    assert vocabularyWFA.unknownIndexes['%'] != vocabularyWFA.word2index['Unknown-%']
+    assert vocabularyWFA.execute_batch(['aaa 42 , Unknown-% bbb', 'aaa Unknown-% , zzz bbb']).tolist() == [True, False]
+
+@then('word indexes from the tokenizer give same results on these sentences')
+def wordIndexesFromTokenizer(context):
+    texts = [text for text, _ in context.sentences]
+    _, wordToIndex = get_word_to_index([ruleParser(context.rule)] + [tokenizer(text) for text in texts])
+    wordIndexes = sentenceTokenizer.tokenizeToWordIndexes(texts, wordToIndex)
+    assert all(indexes.dtype == np.int32 for indexes in wordIndexes)
+    wfa = WFA(context.minDFA, wordToIndex, dfa_to_tensor)
+    assert wfa.execute_batch(wordIndexes).tolist() == [expected for _, expected in context.sentences]
+    compiledDFA = context.minDFA.compile(classifier=customRuleTokenClassifier)
+    columnsOfWordIndexes = compiledDFA.getColumnsOfWordIndexes(wordToIndex)
+    for text, indexes in zip(texts, wordIndexes):
+        assert compiledDFA.executeColumns(columnsOfWordIndexes[indexes]) is compiledDFA.execute(tokenizer(text))
+
+@then('sentence "{text}" is tokenized into "{tokens}"')
+def tokenizeSentence(context, text, tokens):
+    assert tokenizer(text) == tokens.split(' ')
+    assert Tokenizer(punctuations)(text) == [token for token in padPunctuations(text).split(' ') if token]
 
 @then('it capture "{content}" in sentence "{text}"')
-def captureGroupInSentence(context, text):
+def captureGroupInSentence(context, content, text):
     assert context.minDFA.execute(text) is True
-    # construct a fast WFA
-    _, wordToIndex = get_word_to_index([ruleParser(context.rule), tokenizer(text)])
-    context.wfa = WFA(context.minDFA, wordToIndex, dfa_to_tensor)
-    assert context.wfa.execute(text) is True 
\ No newline at end of file
+    nfa = NFAFromDSL().buildNFA(context.rule)
+    for automata in [nfa, NFAtoDFAGroupStable(nfa)]:
+        captures = CaptureMatcher(automata, classifier=customRuleTokenClassifier).capture(tokenizer(text))
+        assert [' '.join(groupTokens) for groupTokens in captures.values()] == [content]
+    # WFA built once for the rule, words of the sentence are unknown to it
+    for wfa in context.wfas:
+        assert wfa.execute(text) is True
+
+@given('a token classifier that counts its calls')
+def countingClassifier(context):
+    context.classifiedTokens = []
+    def countedWildcardOfToken(token):
+        context.classifiedTokens.append(token)
+        return wildcardOfToken(token)
+    context.classifier = TokenClassifier(['$', '%', '&'], countedWildcardOfToken)
+
+@when('it classifies "{text}" {times:d} times')
+def classifyTokens(context, text, times):
+    for _ in range(times):
+        assert [context.classifier.classify(token) for token in text.split(' ')] == [wildcardOfToken(token) for token in text.split(' ')]
+
+@then('it is called {count:d} times')
+def classifierCallCount(context, count):
+    assert len(context.classifiedTokens) == count
+
+@then('word indexes of "{text}" are classified as "{wildcards}"')
+def classifyWordIndexes(context, text, wildcards):
+    _, wordToIndex = get_word_to_index([text.split(' ')])
+    wildcardIndexes = context.classifier.getWildcardIndexes(wordToIndex)
+    assert [context.classifier.wildcards[wildcardIndexes[wordToIndex[token]]] for token in text.split(' ')] == wildcards.split(' ')
+
+@then('it classifies the same after pickling')
+def pickleClassifier(context):
+    classifier = pickle.loads(pickle.dumps(customRuleTokenClassifier))
+    assert [classifier.classify(token) for token in ['aaa', '3.14', ',']] == ['$', '%', '&']
+
+@then('its compiled DFA converts back to the same automata')
+def compiledDFARoundTrip(context):
+    automata = context.minDFA.compile('$').to_automata()
+    assert automata.to_dict() == context.minDFA.to_dict()
+
+@then('its compiled DFA matches tokens "{text}"')
+def compiledDFAMatchTokens(context, text):
+    assert context.minDFA.compile('$').execute(text.split(' ')) is True
+    # same as the backtracking executor, and the other executors that take defaultToken
+    assert context.minDFA.execute(text) is True
+    assert LazyDFA(context.minDFA, '$').execute(text.split(' ')) is True
+
+@then('its compiled DFA won\'t match tokens "{text}"')
+def compiledDFANotMatchTokens(context, text):
+    assert context.minDFA.compile('$').execute(text.split(' ')) is not True
+    assert context.minDFA.execute(text) is not True
+    assert LazyDFA(context.minDFA, '$').execute(text.split(' ')) is not True
+
+@given('the rules')
+def getRules(context):
+    context.rules = [(row['name'], row['rule']) for row in context.table]
+    context.multiRuleDFA = multiRuleDFAFromDSL(dict(context.rules))
+
+@given('the rules in a DFA of at most {maxStates:d} states')
+def getRulesInBoundedDFA(context, maxStates):
+    context.rules = [(row['name'], row['rule']) for row in context.table]
+    context.multiRuleDFA = multiRuleDFAFromDSL(dict(context.rules), maxStates)
+
+@then('multi rule DFA is flushed and has fallen back to NFA')
+def multiRuleDFAFlushed(context):
+    assert context.multiRuleDFA.stats['flushes'] > 0
+    assert context.multiRuleDFA.stats['nfaFallbacks'] > 0
+
+@then('multi rule DFA has at most {maxStates:d} states')
+def multiRuleDFAStateLength(context, maxStates):
+    assert context.multiRuleDFA.getStateLength() <= maxStates
+
+@then('sentence "{text}" matches rules "{ruleNames}"')
+def matchRules(context, text, ruleNames):
+    expectedRuleNames = [ruleName.strip() for ruleName in ruleNames.split(',') if ruleName.strip()]
+    assert context.multiRuleDFA.match(text) == expectedRuleNames
+
+@then('sentence "{text}" matches no rule')
+def matchNoRule(context, text):
+    assert context.multiRuleDFA.match(text) == []
+
+@given('a rule cache in a temporary directory')
+def getRuleCache(context):
+    context.cacheDirectory = tempfile.mkdtemp()
+    context.add_cleanup(shutil.rmtree, context.cacheDirectory, ignore_errors=True)
+    context.ruleCache = RuleCache(minDFAFromDSL, context.cacheDirectory, classifier=customRuleTokenClassifier)
+
+@when('the rule cache restarts')
+def restartRuleCache(context):
+    context.ruleCache = RuleCache(minDFAFromDSL, context.cacheDirectory, classifier=customRuleTokenClassifier)
+
+@when('I invalidate the rule "{rule}" in the cache')
+def invalidateRule(context, rule):
+    context.ruleCache.invalidate(rule)
+
+@when('the cached file of rule "{rule}" is truncated to {size:d} bytes')
+def truncateCachedRule(context, rule, size):
+    with open(context.ruleCache.getEntryPath(rule), 'r+b') as file:
+        file.truncate(size)
+
+@when('I get the compiled rule "{rule}" from the cache')
+def getCompiledRuleFromCache(context, rule):
+    context.rule = rule
+    context.compiledDFA = context.ruleCache.getCompiled(rule)
+
+@then('compiled DFA matches sentence "{text}"')
+def compiledDFAMatches(context, text):
+    assert context.compiledDFA.execute(tokenizer(text))
+
+@then('compiled DFA won\'t match sentence "{text}"')
+def compiledDFAWontMatch(context, text):
+    assert not context.compiledDFA.execute(tokenizer(text))
+
+@given('the rule "{rule}" from the cache')
+@when('I get the rule "{rule}" from the cache')
+def getRuleFromCache(context, rule):
+    useMinDFA(context, rule, context.ruleCache.get(rule))
+
+@then('the cache has {build:d} build, {memory:d} memory hit and {disk:d} disk hit')
+def ruleCacheStats(context, build, memory, disk):
+    assert context.ruleCache.stats == {'build': build, 'memory': memory, 'disk': disk}
+
+@then('it is the same DFA as built from the rule')
+def sameDFAAsBuilt(context):
+    minDFA = minDFAFromDSL(context.rule)
+    assert context.minDFA.to_dict() == minDFA.to_dict()
+    assert context.minDFA.groups == minDFA.groups
+
+@then('compiled DFA from the cache gives same results on these sentences')
+def cachedCompiledDFA(context):
+    compiledDFA = context.ruleCache.getCompiled(context.rule)
+    assert not compiledDFA.table.flags.owndata
+    for text, expected in context.sentences:
+        assert compiledDFA.execute(tokenizer(text)) is expected
+
+@then('cached WFA gives same results on these sentences')
+def cachedWFA(context):
+    texts = [text for text, _ in context.sentences]
+    _, wordToIndex = get_word_to_index([ruleParser(context.rule)] + [tokenizer(text) for text in texts])
+    for dfaToTensor in [dfa_to_tensor, dfa_to_sparse_tensor]:
+        # first one builds the tensor, second one loads it from disk
+        for loadedFromDisk in [False, True]:
+            wfa = context.ruleCache.getWFA(context.rule, wordToIndex, dfaToTensor)
+            wfa.setTokenizer(tokenizer)
+            if loadedFromDisk and not wfa.sparse:
+                # tensor is used right from the mmap, not copied
+                assert isinstance(wfa.wfaTensor, np.memmap)
+            assert wfa.execute_batch(texts).tolist() == [expected for _, expected in context.sentences]
+
+def saveToTemporaryFile(context, automata):
+    temporaryDirectory = tempfile.mkdtemp()
+    context.add_cleanup(shutil.rmtree, temporaryDirectory, ignore_errors=True)
+    path = os.path.join(temporaryDirectory, 'rule.automata')
+    automata.save(path, classifier=customRuleTokenClassifier)
+    return path
+
+@then('it loads back the same automata from file')
+def loadAutomataFromFile(context):
+    path = saveToTemporaryFile(context, context.minDFA)
+    for mmap in [True, False]:
+        automata = Automata.load(path, mmap)
+        assert automata.to_dict() == dict(context.minDFA.to_dict(), finalStates=sorted(context.minDFA.finalStates))
+        assert automata.groups == context.minDFA.groups
+    if not context.minDFA.isDFA():
+        try:
+            CompiledDFA.load(path, customRuleTokenClassifier)
+            assert False, 'NFA should not have compiled table'
+        except BaseException as error:
+            assert 'no compiled table' in str(error)
+
+@then('its compiled DFA loaded from file matches sentence "{text}"')
+def compiledDFAFromFileMatches(context, text):
+    compiledDFA = CompiledDFA.load(saveToTemporaryFile(context, context.minDFA), customRuleTokenClassifier)
+    assert not compiledDFA.table.flags.owndata
+    assert compiledDFA.execute(tokenizer(text)) is True
+
+@then('its compiled DFA loaded from file won\'t match sentence "{text}"')
+def compiledDFAFromFileNotMatches(context, text):
+    compiledDFA = CompiledDFA.load(saveToTemporaryFile(context, context.minDFA), customRuleTokenClassifier)
+    assert compiledDFA.execute(tokenizer(text)) is not True
+
+@when('I match the corpus with {workers:d} workers and chunk size {chunkSize:d}')
+def matchCorpusInParallel(context, workers, chunkSize):
+    output = io.StringIO()
+    sentences = [(lineNumber, text, None) for lineNumber, text in enumerate(context.text.split('\n'), 1)]
+    assert matchCorpus(context.rules, iter(sentences), output, workers, chunkSize) == len(sentences)
+    context.results = {result['line']: result['rules'] for result in map(json.loads, output.getvalue().splitlines())}
+
+@then('line {lineNumber:d} matches rules "{ruleNames}"')
+def lineMatchesRules(context, lineNumber, ruleNames):
+    assert context.results[lineNumber] == [ruleName.strip() for ruleName in ruleNames.split(',')]
+
+@then('line {lineNumber:d} matches no rule')
+def lineMatchesNoRule(context, lineNumber):
+    assert context.results[lineNumber] == []
+
+def streamMatchPositions(context, text, anchored):
+    streamMatcher = StreamMatcher(context.minDFA, classifier=customRuleTokenClassifier, anchored=anchored)
+    # feed from a generator, so the matcher never sees the whole input
+    return list(streamMatcher.matches(token for token in tokenizer(text)))
+
+@then('feeding "{text}" matches at tokens "{positions}"')
+def streamMatches(context, text, positions):
+    assert streamMatchPositions(context, text, True) == [int(position) for position in positions.split(',')]
+
+@then('feeding "{text}" matches at no token')
+def streamNotMatches(context, text):
+    assert streamMatchPositions(context, text, True) == []
+
+@then('feeding "{text}" anywhere matches at tokens "{positions}"')
+def unanchoredStreamMatches(context, text, positions):
+    assert streamMatchPositions(context, text, False) == [int(position) for position in positions.split(',')]
+
+@then('feeding "{text}" anywhere matches at no token')
+def unanchoredStreamNotMatches(context, text):
+    assert streamMatchPositions(context, text, False) == []
+
+def searchSpans(context, text, mode):
+    streamMatcher = StreamMatcher(context.minDFA, classifier=customRuleTokenClassifier)
+    return [f"{start}-{end}" for start, end in streamMatcher.finditer(tokenizer(text), mode)]
+
+@then('searching "{text}" finds spans "{spans}"')
+def searchFindsSpans(context, text, spans):
+    assert searchSpans(context, text, 'longest') == [span.strip() for span in spans.split(',')]
+
+@then('searching "{text}" for the first match finds spans "{spans}"')
+def searchFindsFirstSpans(context, text, spans):
+    assert searchSpans(context, text, 'first') == [span.strip() for span in spans.split(',')]
+
+@then('searching "{text}" finds no span')
+def searchFindsNoSpan(context, text):
+    assert searchSpans(context, text, 'longest') == []
+
+class CountingMoves(dict):
+    def get(self, *args):
+        self.calls += 1
+        return super().get(*args)
+
+@then('searching "{text}" repeated {times:d} times finds {count:d} spans, moving from each token a bounded number of times')
+def searchRepeatedLinearly(context, text, times, count):
+    streamMatcher = StreamMatcher(context.minDFA, classifier=customRuleTokenClassifier)
+    streamMatcher.closedMoves = CountingMoves(streamMatcher.closedMoves)
+    streamMatcher.closedMoves.calls = 0
+    tokens = tokenizer(' '.join([text] * times))
+    assert len(list(streamMatcher.finditer(tokens))) == count
+    # rescanning after every match would take times² / 2 moves
+    assert streamMatcher.closedMoves.calls <= 4 * len(tokens)
+
+@then('it captures "{captures}" in sentence "{text}"')
+def captureGroupsInSentence(context, captures, text):
+    nfa = NFAFromDSL().buildNFA(context.rule)
+    expected = dict(capture.strip().split('=') for capture in captures.split(','))
+    for automata in [nfa, NFAtoDFAGroupStable(nfa)]:
+        groups = CaptureMatcher(automata, classifier=customRuleTokenClassifier).capture(tokenizer(text))
+        assert {groupName: ' '.join(groupTokens) for groupName, groupTokens in groups.items()} == expected
+
+@then('it captures nothing in sentence "{text}"')
+def captureNothingInSentence(context, text):
+    nfa = NFAFromDSL().buildNFA(context.rule)
+    for automata in [nfa, NFAtoDFAGroupStable(nfa)]:
+        assert CaptureMatcher(automata, classifier=customRuleTokenClassifier).capture(tokenizer(text)) is None
+
+@given('a lazy DFA of at most {maxStates:d} states')
+def getLazyDFA(context, maxStates):
+    context.lazyDFA = LazyDFA(context.minDFA, classifier=customRuleTokenClassifier, maxStates=maxStates)
+    context.lazyDFA.setTokenizer(tokenizer)
+
+def lazyDFAExecute(context, text):
+    if 'lazyDFA' not in context:
+        getLazyDFA(context, 10000)
+    result = context.lazyDFA.execute(text)
+    streamMatcher = StreamMatcher(context.minDFA, classifier=customRuleTokenClassifier)
+    assert result == (list(streamMatcher.matches(tokenizer(text)))[-1:] == [len(tokenizer(text)) - 1])
+    return result
+
+@then('lazy DFA matches sentence "{text}"')
+def lazyDFAMatchSentence(context, text):
+    assert lazyDFAExecute(context, text) is True
+
+@then('lazy DFA won\'t match sentence "{text}"')
+def lazyDFANotMatchSentence(context, text):
+    assert lazyDFAExecute(context, text) is False
+
+@then('lazy DFA is flushed and has fallen back to NFA')
+def lazyDFAFlushed(context):
+    assert context.lazyDFA.stats['flushes'] > 0
+    assert context.lazyDFA.stats['nfaFallbacks'] > 0
+
+@then('lazy DFA has at most {maxStates:d} states')
+def lazyDFAStateLength(context, maxStates):
+    assert context.lazyDFA.getStateLength() <= maxStates
+
+def bitParallelNFAExecute(context, text):
+    results = [BitParallelNFA(automata, classifier=customRuleTokenClassifier, sparse=sparse).execute(tokenizer(text))
+               for automata in [context.minDFA, NFAtoDFA(context.minDFA)] for sparse in [False, True]]
+    assert len(set(results)) == 1
+    return results[0]
+
+@then('bit parallel NFA matches sentence "{text}"')
+def bitParallelNFAMatchSentence(context, text):
+    assert bitParallelNFAExecute(context, text) is True
+
+@then('bit parallel NFA won\'t match sentence "{text}"')
+def bitParallelNFANotMatchSentence(context, text):
+    assert bitParallelNFAExecute(context, text) is False
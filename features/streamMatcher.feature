@@ -0,0 +1,32 @@
+Feature: Match a stream of tokens
+  In order to match live transcripts and logs being tailed,
+  I want to feed tokens to a matcher one at a time
+  So I know a rule matches as soon as the token that completes it arrives
+
+  Scenario: Anchored stream reports the token where the rule matches
+    Given the rule "I may have ($+|you) with me"
+      Then feeding "I may have you with me" matches at tokens "5"
+      And feeding "I may have my little three with me and you" matches at tokens "7"
+      And feeding "I may not have you with me" matches at no token
+
+  Scenario: Unanchored stream reports every match in a long stream
+    Given the NFA of rule "aaa (bbb|ccc)+"
+      Then feeding "xxx aaa bbb ccc yyy aaa ccc" anywhere matches at tokens "2, 3, 6"
+      And feeding "aaa , bbb 35 aaa" anywhere matches at no token
+
+  Scenario: Search all match spans in a document
+    Given the NFA of rule "aaa (bbb|ccc)+"
+      Then searching "xxx aaa bbb ccc yyy aaa ccc" finds spans "1-4, 5-7"
+      And searching "xxx aaa bbb ccc yyy aaa ccc" for the first match finds spans "1-3, 5-7"
+      And searching "aaa , bbb 35 aaa" finds no span
+
+  Scenario: Search prefers the leftmost match
+    Given the rule "bbb ccc | aaa bbb ccc ddd"
+      Then searching "aaa bbb ccc eee" finds spans "1-3"
+      And searching "aaa bbb ccc ddd bbb ccc" finds spans "0-4, 4-6"
+
+  Scenario: Search doesn't rescan tokens after a longest match
+    Given the NFA of rule "aaa | aaa $* zzz"
+      Then searching "aaa aaa aaa" finds spans "0-1, 1-2, 2-3"
+      And searching "aaa aaa xxx zzz aaa" finds spans "0-4, 4-5"
+      And searching "aaa" repeated 2000 times finds 2000 spans, moving from each token a bounded number of times
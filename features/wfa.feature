@@ -8,3 +8,17 @@ Feature: Minify DFA state on given DFA
       Then it matches sentence "what judith rossner novel was made into a film starring diane keaton ?"
       But it won't match sentence "what is grenada 's main commodity export ?"
       And it won't match sentence "what is it that walks on four legs , then on two legs , then on three ?"
+      And batched WFA gives same results on these sentences
+
+  Scenario: Unknown words go through their wildcard
+    Given the rule "aaa % & $ bbb"
+      Then it matches sentence "aaa 42 , zzz bbb"
+      And it won't match sentence "aaa zzz , 42 bbb"
+      And it won't match sentence "aaa 42 zzz , bbb"
+      And WFA built from the vocabulary has buckets of unknown words
+
+  Scenario: Vocabulary is counted from a stream of sentences
+    Given a vocabulary of at least 2 occurrences and at most 3 words, counted 2 sentences at a time from "bbb aaa, ccc ddd, aaa ccc, eee ccc, bbb eee aaa"
+      Then its words are "aaa ccc bbb"
+      And it loads back the same words from file
+      And it gives the same words when spilled to disk every 2 words
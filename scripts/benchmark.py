@@ -0,0 +1,441 @@
+import sys
+import os
+_project_root = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.append(_project_root)
+
+import argparse
+import random
+import re
+import shutil
+import tempfile
+import time
+from collections import Counter
+
+from examples.NFAfromCustomRule import NFAFromDSL, punctuations, sentenceTokenizer, tokenizer, executor, compiledExecutor, customRuleTokenClassifier, minDFAFromDSL, multiRuleDFAFromDSL
+from examples.customRuleDFAToTensor import dfa_to_tensor, dfa_to_sparse_tensor
+from examples.customRuleTokenizer import ruleParser
+from src.automata_tools import BitParallelNFA, CaptureMatcher, LazyDFA, NFAtoDFA, NFAtoDFAGroupStable, NFAtoSimplifiedNFA, DFAtoMinimizedDFA, WFA, RuleCache, StreamMatcher, VocabularyBuilder, get_word_to_index
+from src.automata_tools.Automata import Automata
+from src.automata_tools.CompiledDFA import CompiledDFA
+
+# the rule in features/wfa.feature
+questionTypeRule = "(($ * name & * $ ? a $*)|($ * ( which | what ) $* ( team | group | groups | teams ) $*)|($ * what & * $ ? kind $*)|($ * ( composed | made ) & * $ ? ( from | through | using | by | of ) $*)|($ * what $* called $*)|($ * novel $*)|($ * ( thing | instance | object ) $*)|($ * fear & * $ ? of $*)|($ * ( which | what ) & * $ ? ( play | game | movie | book ) $*)|($ * ( which | what ) $* ( organization | trust | company ) $*))"
+
+
+def timeIt(function, *args, **kwargs):
+    t = time.time()
+    result = function(*args, **kwargs)
+    return result, time.time() - t
+
+
+def benchmarkNFAtoDFA():
+    """
+    "(aaa|bbb)* aaa (aaa|bbb){n}" needs 2^(n+1) DFA states, since DFA has to remember the last n+1 tokens
+    """
+    for repeatTimes in [6, 8, 10, 12]:
+        rule = f"( aaa | bbb ) * aaa ( aaa | bbb ) {{{repeatTimes},{repeatTimes}}}"
+        nfa = NFAFromDSL().buildNFA(rule)
+        dfa, duration = timeIt(NFAtoDFA, nfa, False)
+        print(f"NFAtoDFA  nfa states: {len(nfa.states):>5}  dfa states: {len(dfa.states):>6}  time: {duration:.4f}s")
+    # ε closures of all states are computed at once and cached on the NFA, until it is changed
+    for alternativeCount in [50, 200, 400]:
+        nfa = NFAFromDSL().buildNFA(intentRule(alternativeCount))
+        _, closureDuration = timeIt(nfa.getEClosures)
+        _, cachedDuration = timeIt(nfa.getEClosures)
+        dfa, duration = timeIt(NFAtoDFA, nfa, False)
+        print(f"NFAtoDFA  nfa states: {len(nfa.states):>5}  dfa states: {len(dfa.states):>6}  time: {duration:.4f}s  ε closures: {closureDuration:.4f}s  cached: {cachedDuration:.6f}s")
+
+
+def benchmarkSimplifyNFA():
+    """
+    state/edge counts of NFA before and after NFAtoSimplifiedNFA, size of DFA from subset construction (before minify) on each, and NFAtoDFA time without and with simplify=True
+    """
+    rules = [('questionType', questionTypeRule), ('repeatRange', "( aaa | bbb ) {0,10} ccc")] + [(f"intent{alternativeCount}", intentRule(alternativeCount)) for alternativeCount in [50, 200]]
+    for name, rule in rules:
+        stats = dict()
+        simplifiedNFA, simplifyDuration = timeIt(NFAtoSimplifiedNFA, NFAFromDSL().buildNFA(rule), stats)
+        dfa, subsetDuration = timeIt(NFAtoDFA, NFAFromDSL().buildNFA(rule), False)
+        simplifiedDFA, simplifiedSubsetDuration = timeIt(NFAtoDFA, simplifiedNFA, False)
+        _, minDuration = timeIt(NFAtoDFA, NFAFromDSL().buildNFA(rule))
+        _, simplifiedMinDuration = timeIt(NFAtoDFA, NFAFromDSL().buildNFA(rule), True, True)
+        print(f"{name:>12}  nfa states: {stats['statesBefore']:>5} -> {stats['statesAfter']:>5}  edges: {stats['edgesBefore']:>5} -> {stats['edgesAfter']:>5}  simplify: {simplifyDuration:.4f}s")
+        print(f"{'':>12}  dfa states: {len(dfa.states):>5} -> {len(simplifiedDFA.states):>5}  subset construction: {subsetDuration:.4f}s -> {simplifiedSubsetDuration:.4f}s  NFAtoDFA with minify: {minDuration:.4f}s -> {simplifiedMinDuration:.4f}s")
+
+
+def benchmarkLazyDFA():
+    """
+    "(aaa|bbb)* aaa (aaa|bbb){20}" needs 2^21 DFA states, too many to build, so build only states reached by the corpus, in a bounded cache
+    """
+    rule = "( aaa | bbb ) * aaa ( aaa | bbb ) {20,20}"
+    nfa = NFAFromDSL().buildNFA(rule)
+    randomGenerator = random.Random(0)
+    corpus = [[randomGenerator.choice(['aaa', 'bbb']) for _ in range(randomGenerator.randint(20, 40))] for _ in range(2000)]
+    streamMatcher = StreamMatcher(nfa)
+
+    def simulate(tokens):
+        streamMatcher.reset()
+        for token in tokens:
+            streamMatcher.feed(token)
+        return streamMatcher.isFinal
+
+    nfaResult, nfaDuration = timeIt(lambda: [simulate(tokens) for tokens in corpus])
+    print(f"NFA simulation  nfa states: {len(nfa.states)}  {len(corpus) / nfaDuration:>8.0f} sentences/s")
+    for maxStates in [1000, 100000]:
+        lazyDFA = LazyDFA(nfa, maxStates=maxStates)
+        for runName in ['cold', 'warm']:
+            lazyResult, lazyDuration = timeIt(lambda: [lazyDFA.execute(tokens) for tokens in corpus])
+            assert lazyResult == nfaResult
+            print(f"LazyDFA  max states: {maxStates:>6}  {runName}  {len(corpus) / lazyDuration:>8.0f} sentences/s  states: {lazyDFA.getStateLength():>6}  {lazyDFA.stats}")
+
+
+def benchmarkBitParallelNFA():
+    """
+    execute NFA without NFAtoDFA, set of states in StreamMatcher vs. bitset of positions
+    """
+    for rule in [questionTypeRule, intentRule(50), intentRule(400)]:
+        nfa = NFAFromDSL().buildNFA(rule)
+        corpus = [tokenizer(text) for text in randomCorpus(rule, 2000)]
+        streamMatcher = StreamMatcher(nfa, classifier=customRuleTokenClassifier)
+
+        def simulate(tokens):
+            streamMatcher.reset()
+            for token in tokens:
+                streamMatcher.feed(token)
+            return streamMatcher.isFinal
+
+        setResult, setDuration = timeIt(lambda: [simulate(tokens) for tokens in corpus])
+        bitParallelNFA, buildDuration = timeIt(BitParallelNFA, nfa, None, customRuleTokenClassifier)
+        bitResult, bitDuration = timeIt(lambda: [bitParallelNFA.execute(tokens) for tokens in corpus])
+        assert bitResult == setResult
+        print(f"NFA  states: {len(nfa.states):>5}  positions: {len(bitParallelNFA.positions):>5}  sparse: {bitParallelNFA.sparse!s:>5}  build: {buildDuration:.4f}s")
+        print(f"  StreamMatcher: {len(corpus) / setDuration:>8.0f} sentences/s  BitParallelNFA: {len(corpus) / bitDuration:>8.0f} sentences/s")
+
+
+def benchmarkBuildNFA():
+    """
+    BuildAutomata copies sub-automata in every struct, so it is quadratic on long rules
+    """
+    for tokenCount in [100, 200, 400, 800]:
+        rule = ' '.join(f"w{chr(ord('a') + index % 26)}{chr(ord('a') + index // 26 % 26)}" for index in range(tokenCount))
+        _, copyDuration = timeIt(NFAFromDSL(inPlace=False).buildNFA, rule)
+        _, inPlaceDuration = timeIt(NFAFromDSL(inPlace=True).buildNFA, rule)
+        print(f"buildNFA  tokens: {tokenCount:>4}  BuildAutomata: {copyDuration:.4f}s  BuildAutomataInPlace: {inPlaceDuration:.4f}s")
+    # a{n,m} is linear to m, it used to be a union of a{k} for every k in the range
+    for repeatTimes in [10, 50, 200]:
+        rule = f"( aaa | bbb ) {{0,{repeatTimes}}}"
+        _, copyDuration = timeIt(NFAFromDSL(inPlace=False).buildNFA, rule)
+        nfa, inPlaceDuration = timeIt(NFAFromDSL(inPlace=True).buildNFA, rule)
+        print(f"buildNFA  {rule}  nfa states: {len(nfa.states):>5}  BuildAutomata: {copyDuration:.4f}s  BuildAutomataInPlace: {inPlaceDuration:.4f}s")
+
+
+def intentRule(alternativeCount: int) -> str:
+    """
+    "( $ * word1 $ ? word2 $* ) | ( $ * word2 $ ? word3 $* ) | ..." looks like our intent rules
+    """
+    words = ['w' + ''.join(chr(ord('a') + int(digit)) for digit in str(index)) for index in range(alternativeCount)]
+    return '|'.join(f"( $ * {word} $ ? {words[(index + 1) % alternativeCount]} $* )" for index, word in enumerate(words))
+
+
+def benchmarkMinimizeDFA():
+    for alternativeCount in [10, 20, 40, 100, 200]:
+        dfa = NFAtoDFA(NFAFromDSL().buildNFA(intentRule(alternativeCount)), False)
+        minDFA, hopcroftDuration = timeIt(DFAtoMinimizedDFA, dfa, 'hopcroft')
+        # table filling takes minutes on larger DFA
+        tableDuration = f"{timeIt(DFAtoMinimizedDFA, dfa, 'table')[1]:.4f}s" if alternativeCount <= 40 else 'skipped'
+        print(f"DFAtoMinimizedDFA  alternatives: {alternativeCount:>4}  dfa states: {len(dfa.states):>5} -> {len(minDFA.states):>5}  table: {tableDuration}  hopcroft: {hopcroftDuration:.4f}s")
+
+
+def randomCorpus(rule: str, sentenceCount: int, seed: int = 0):
+    """
+    sentences made of words in the rule and some random words and punctuations, with 5 to 20 tokens
+    """
+    randomGenerator = random.Random(seed)
+    words = [token for token in ruleParser(rule) if token.isalpha()]
+    words += [f"word{chr(ord('a') + index)}" for index in range(26)] + [',', '?', '3.14']
+    return [' '.join(randomGenerator.choice(words) for _ in range(randomGenerator.randint(5, 20))) for _ in range(sentenceCount)]
+
+
+def benchmarkWFABatch():
+    minDFA = NFAtoDFA(NFAFromDSL().buildNFA(questionTypeRule))
+    minDFA.setTokenizer(tokenizer)
+    corpus = randomCorpus(questionTypeRule, 5000)
+    _, wordToIndex = get_word_to_index([ruleParser(questionTypeRule)] + [tokenizer(text) for text in corpus])
+    wfa = WFA(minDFA, wordToIndex, dfa_to_tensor)
+    # tokenizing takes most of the time, so we also compare on index arrays
+    corpusWordIndexes = [wfa.getWordIndexes(text) for text in corpus]
+    print(f"WFA  states: {wfa.getStateLength()}  sentences: {len(corpus)}")
+    for inputName, inputs in [('texts', corpus), ('index arrays', corpusWordIndexes)]:
+        loopResult, loopDuration = timeIt(lambda: [wfa.execute(inputWords) for inputWords in inputs])
+        batchResult, batchDuration = timeIt(wfa.execute_batch, inputs)
+        assert loopResult == batchResult.tolist()
+        print(f"{inputName:>12}  WFA.execute loop: {len(inputs) / loopDuration:>8.0f} sentences/s  WFA.execute_batch: {len(inputs) / batchDuration:>8.0f} sentences/s")
+
+
+def benchmarkWFAFromVocabulary():
+    """
+    a WFA built for the word index of each request, like the tests did, vs. one WFA built from the vocabulary of the rule, where unknown words go through their wildcard
+    """
+    minDFA = NFAtoDFA(NFAFromDSL().buildNFA(questionTypeRule))
+    minDFA.setTokenizer(tokenizer)
+    corpus = randomCorpus(questionTypeRule, 200)
+
+    def wfaOfEachSentence():
+        return [WFA(minDFA, get_word_to_index([ruleParser(questionTypeRule), tokenizer(text)])[1], dfa_to_tensor).execute(text) for text in corpus]
+    eachResult, eachDuration = timeIt(wfaOfEachSentence)
+    vocabularyWFA, buildDuration = timeIt(WFA.from_vocabulary, minDFA, ruleParser(questionTypeRule), dfa_to_tensor, customRuleTokenClassifier)
+    vocabularyResult, vocabularyDuration = timeIt(lambda: [vocabularyWFA.execute(text) for text in corpus])
+    assert eachResult == vocabularyResult
+    print(f"WFA  states: {vocabularyWFA.getStateLength()}  vocabulary: {len(vocabularyWFA.word2index)}  from_vocabulary build: {buildDuration:.4f}s")
+    print(f"  WFA of each sentence: {len(corpus) / eachDuration:>8.0f} sentences/s  WFA.from_vocabulary: {len(corpus) / vocabularyDuration:>8.0f} sentences/s")
+
+
+def benchmarkVocabulary():
+    """
+    get_word_to_index used to do Counter += Counter(text), which copies all counts so far for every text
+    """
+    def addCounters(texts):
+        vocab = Counter()
+        for text in texts:
+            vocab += Counter(text)
+        return list(vocab.keys())
+
+    for sentenceCount in [1000, 5000, 10000]:
+        # vocabulary grows with the corpus, like names and numbers in real text
+        corpus = [tokenizer(text) + [f"name{index}"] for index, text in enumerate(randomCorpus(questionTypeRule, sentenceCount))]
+        oldWords, oldDuration = timeIt(addCounters, corpus)
+        (_, wordToIndex), updateDuration = timeIt(get_word_to_index, corpus)
+        assert oldWords == list(wordToIndex)
+        streamWordToIndex, streamDuration = timeIt(lambda: VocabularyBuilder(minFrequency=2).addAll(iter(corpus)).getWordToIndex())
+        # at most 1000 distinct words in memory, the rest is spilled to disk
+        spilledWordToIndex, spilledDuration = timeIt(lambda: VocabularyBuilder(minFrequency=2, maxMemoryWords=1000).addAll(iter(corpus)).getWordToIndex())
+        assert spilledWordToIndex == streamWordToIndex
+        print(f"vocabulary  sentences: {sentenceCount:>6}  Counter +=: {oldDuration:.4f}s  Counter.update: {updateDuration:.4f}s  VocabularyBuilder: {streamDuration:.4f}s  spilled every 1000 words: {spilledDuration:.4f}s")
+
+
+def benchmarkSparseWFA():
+    corpus = randomCorpus(questionTypeRule, 1000)
+    for rule, vocabularySize in [(questionTypeRule, 50000), (intentRule(150), 50000)]:
+        minDFA = NFAtoDFA(NFAFromDSL().buildNFA(rule))
+        minDFA.setTokenizer(tokenizer)
+        vocabulary = [ruleParser(rule)] + [tokenizer(text) for text in corpus] + [[f"word{index}" for index in range(vocabularySize)]]
+        _, wordToIndex = get_word_to_index(vocabulary)
+        stateCount = len(minDFA.states)
+        denseBytes = len(wordToIndex) * stateCount * stateCount * 8
+        sparseWFA, sparseBuildDuration = timeIt(WFA, minDFA, wordToIndex, dfa_to_sparse_tensor)
+        sparseBytes = sparseWFA.wfaTensor.nbytes + sparseWFA.wildcardMatrix.nbytes
+        print(f"WFA  states: {stateCount}  vocabulary: {len(wordToIndex)}")
+        print(f"  sparse  tensor: {sparseBytes / 2**20:>10.2f} MB  build: {sparseBuildDuration:.4f}s  execute: {len(corpus) / timeIt(lambda: [sparseWFA.execute(text) for text in corpus])[1]:>8.0f} sentences/s")
+        if denseBytes > 2**30:
+            print(f"  dense   tensor: {denseBytes / 2**20:>10.2f} MB  skipped")
+            continue
+        denseWFA, denseBuildDuration = timeIt(WFA, minDFA, wordToIndex, dfa_to_tensor)
+        print(f"  dense   tensor: {denseWFA.wfaTensor.nbytes / 2**20:>10.2f} MB  build: {denseBuildDuration:.4f}s  execute: {len(corpus) / timeIt(lambda: [denseWFA.execute(text) for text in corpus])[1]:>8.0f} sentences/s")
+
+
+def benchmarkActiveWFA():
+    corpus = randomCorpus(questionTypeRule, 1000)
+    for rule in [intentRule(250), intentRule(500)]:
+        minDFA = NFAtoDFA(NFAFromDSL().buildNFA(rule))
+        minDFA.setTokenizer(tokenizer)
+        _, wordToIndex = get_word_to_index([ruleParser(rule)] + [tokenizer(text) for text in corpus])
+        stateCount = len(minDFA.states)
+        print(f"WFA  states: {stateCount}  vocabulary: {len(wordToIndex)}")
+        wfas = [('sparse', WFA(minDFA, wordToIndex, dfa_to_sparse_tensor))]
+        if len(wordToIndex) * stateCount * stateCount * 8 <= 2**30:
+            wfas.append(('dense', WFA(minDFA, wordToIndex, dfa_to_tensor)))
+        for name, wfa in wfas:
+            expected, executeDuration = timeIt(lambda: [wfa.execute(text) for text in corpus])
+            matches, activeDuration = timeIt(lambda: [wfa.execute_active(text) for text in corpus])
+            assert matches == expected
+            print(f"  {name:<6}  execute: {len(corpus) / executeDuration:>8.0f} sentences/s  execute_active: {len(corpus) / activeDuration:>8.0f} sentences/s")
+
+
+def benchmarkCompiledExecutor():
+    for rule in [questionTypeRule, intentRule(100)]:
+        minDFA = NFAtoDFA(NFAFromDSL().buildNFA(rule))
+        corpus = [tokenizer(text) for text in randomCorpus(rule, 5000)]
+        fastExecutor, compileDuration = timeIt(compiledExecutor, minDFA)
+        args = (minDFA.startstate, minDFA.finalStates, minDFA.transitions)
+        backtrackingResult, backtrackingDuration = timeIt(lambda: [executor(list(tokens), *args) for tokens in corpus])
+        compiledResult, compiledDuration = timeIt(lambda: [fastExecutor(list(tokens), *args) for tokens in corpus])
+        assert backtrackingResult == compiledResult
+        print(f"DFA  states: {len(minDFA.states)}  compile: {compileDuration:.4f}s")
+        print(f"  executor: {len(corpus) / backtrackingDuration:>8.0f} sentences/s  compiledExecutor: {len(corpus) / compiledDuration:>8.0f} sentences/s")
+
+
+def benchmarkTokenizer():
+    """
+    one re.sub pass for each punctuation vs. one pass of a precompiled pattern, and tokenizing straight into word indexes for compiled DFA
+    """
+    def padEachPunctuation(text: str):
+        for punctuation in punctuations:
+            text = re.sub(f'[{punctuation}]', f' {punctuation} ', text)
+        return [token for token in text.split(' ') if token]
+
+    corpus = randomCorpus(questionTypeRule, 20000)
+    paddedResult, paddedDuration = timeIt(lambda: [padEachPunctuation(text) for text in corpus])
+    tokenizerResult, tokenizerDuration = timeIt(lambda: [tokenizer(text) for text in corpus])
+    assert paddedResult == tokenizerResult
+    print(f"tokenize  re.sub per punctuation: {len(corpus) / paddedDuration:>8.0f} sentences/s  Tokenizer: {len(corpus) / tokenizerDuration:>8.0f} sentences/s")
+    compiledDFA = NFAtoDFA(NFAFromDSL().buildNFA(questionTypeRule)).compile(classifier=customRuleTokenClassifier)
+    _, wordToIndex = get_word_to_index([ruleParser(questionTypeRule)] + tokenizerResult)
+    tokenResult, tokenDuration = timeIt(lambda: [compiledDFA.execute(tokenizer(text)) for text in corpus])
+
+    def executeWordIndexes():
+        columnsOfWordIndexes = compiledDFA.getColumnsOfWordIndexes(wordToIndex)
+        return [compiledDFA.executeColumns(columnsOfWordIndexes[indexes]) for indexes in sentenceTokenizer.tokenizeToWordIndexes(corpus, wordToIndex)]
+    indexResult, indexDuration = timeIt(executeWordIndexes)
+    assert tokenResult == indexResult
+    print(f"compiled DFA  tokenize and execute: {len(corpus) / tokenDuration:>8.0f} sentences/s  word indexes and executeColumns: {len(corpus) / indexDuration:>8.0f} sentences/s")
+
+
+def benchmarkAmbiguousExecutor():
+    """
+    every "aaa" can be matched by the non wildcard matcher or by "$", without remembering failed (state, position) it takes exponential time
+    """
+    minDFA = NFAtoDFA(NFAFromDSL().buildNFA("$* aaa $* aaa $* aaa $* bbb"))
+    args = (minDFA.startstate, minDFA.finalStates, minDFA.transitions)
+    for tokenCount in [100, 1000, 10000]:
+        tokens = ['aaa'] * tokenCount + ['ccc']
+        result, duration = timeIt(executor, tokens, *args)
+        print(f"executor  tokens: {tokenCount:>6}  matched: {result}  time: {duration:.4f}s")
+
+
+def benchmarkMultiRule():
+    for ruleCount in [10, 50, 200]:
+        # every rule is one alternative of the intent rule
+        rules = {f"rule{index}": f"( {alternative} )" for index, alternative in enumerate(intentRule(ruleCount).split('|'))}
+        corpus = randomCorpus(' '.join(rules.values()), 1000)
+        minDFAs = []
+        for rule in rules.values():
+            minDFA = NFAtoDFA(NFAFromDSL().buildNFA(rule))
+            minDFA.setExecuter(executor)
+            minDFA.setTokenizer(tokenizer)
+            minDFAs.append(minDFA)
+        multiRuleDFA, buildDuration = timeIt(multiRuleDFAFromDSL, rules)
+        separateResult, separateDuration = timeIt(lambda: [[ruleName for ruleName, minDFA in zip(rules, minDFAs) if minDFA.execute(text)] for text in corpus])
+        combinedResult, combinedDuration = timeIt(lambda: [multiRuleDFA.match(text) for text in corpus])
+        # DFA transitions are determinized on the first pass, second pass only looks them up
+        _, warmDuration = timeIt(lambda: [multiRuleDFA.match(text) for text in corpus])
+        agreement = sum(separate == combined for separate, combined in zip(separateResult, combinedResult)) / len(corpus)
+        print(f"rules: {ruleCount:>4}  build: {buildDuration:.4f}s  same result: {agreement:.1%}  DFA states determinized: {multiRuleDFA.getStateLength()}")
+        print(f"  separate Automata.execute: {len(corpus) / separateDuration:>8.0f} sentences/s  MultiRuleDFA.match: {len(corpus) / combinedDuration:>8.0f} sentences/s  second pass: {len(corpus) / warmDuration:>8.0f} sentences/s")
+
+
+def benchmarkRuleCache():
+    rules = [questionTypeRule] + [intentRule(alternativeCount) for alternativeCount in range(10, 110, 10)]
+    cacheDirectory = tempfile.mkdtemp()
+    try:
+        _, buildDuration = timeIt(lambda: [RuleCache(minDFAFromDSL, cacheDirectory).get(rule) for rule in rules])
+        ruleCache = RuleCache(minDFAFromDSL, cacheDirectory)
+        _, diskDuration = timeIt(lambda: [ruleCache.get(rule) for rule in rules])
+        _, memoryDuration = timeIt(lambda: [ruleCache.get(rule) for rule in rules])
+        print(f"RuleCache  rules: {len(rules)}  build: {buildDuration:.4f}s  load from disk: {diskDuration:.4f}s  load from memory: {memoryDuration:.6f}s")
+        minDFA = NFAtoDFA(NFAFromDSL().buildNFA(intentRule(200)))
+        path = os.path.join(cacheDirectory, 'intent.automata')
+        _, saveDuration = timeIt(minDFA.save, path, '$')
+        _, automataDuration = timeIt(Automata.load, path)
+        _, compiledDuration = timeIt(CompiledDFA.load, path)
+        print(f"Automata.save  states: {len(minDFA.states)}  file: {os.path.getsize(path) / 2**10:.1f} KB  save: {saveDuration:.4f}s  Automata.load: {automataDuration:.4f}s  CompiledDFA.load: {compiledDuration:.4f}s")
+    finally:
+        shutil.rmtree(cacheDirectory)
+
+
+def benchmarkStreamMatcher():
+    """
+    one long stream of 10 to 100 times the corpus, matched anywhere, memory doesn't grow with the stream
+    """
+    corpus = randomCorpus(questionTypeRule, 1000)
+    minDFA = NFAtoDFA(NFAFromDSL().buildNFA(questionTypeRule))
+    for repeatTimes in [10, 100]:
+        streamMatcher = StreamMatcher(minDFA, classifier=customRuleTokenClassifier, anchored=False)
+        stream = (token for _ in range(repeatTimes) for text in corpus for token in tokenizer(text))
+        matchCount, duration = timeIt(lambda: sum(1 for _ in streamMatcher.matches(stream)))
+        print(f"StreamMatcher  tokens: {streamMatcher.position:>8}  matches: {matchCount:>7}  {streamMatcher.position / duration:>8.0f} tokens/s  states kept: {len(streamMatcher.states)}")
+
+
+def benchmarkFinditer():
+    """
+    find all spans in one long document, one pass of finditer vs. running the anchored matcher from every token
+    """
+    rule = "( which | what ) & * $ ? ( play | game | movie | book | kind )"
+    nfa = NFAFromDSL().buildNFA(rule)
+    for sentenceCount in [100, 1000]:
+        document = [token for text in randomCorpus(questionTypeRule, sentenceCount) for token in tokenizer(text)]
+        streamMatcher = StreamMatcher(nfa, classifier=customRuleTokenClassifier)
+        spans, duration = timeIt(lambda: list(streamMatcher.finditer(document)))
+
+        def fromEveryToken():
+            slidingSpans = []
+            start = 0
+            while start < len(document):
+                streamMatcher.reset()
+                ends = [start + end + 1 for end in streamMatcher.matches(document[start:])]
+                if len(ends) != 0:
+                    slidingSpans.append((start, max(ends)))
+                    start = max(ends)
+                else:
+                    start += 1
+            return slidingSpans
+
+        slidingSpans, slidingDuration = timeIt(fromEveryToken)
+        assert spans == slidingSpans
+        print(f"finditer  tokens: {len(document):>7}  spans: {len(spans):>5}  finditer: {len(document) / duration:>8.0f} tokens/s  from every token: {len(document) / slidingDuration:>8.0f} tokens/s")
+    # a longest match "aaa" that could still grow into "aaa ... zzz" until the end of the document, used to be rescanned after every match
+    streamMatcher = StreamMatcher(NFAFromDSL().buildNFA("aaa | aaa $* zzz"), classifier=customRuleTokenClassifier)
+    for tokenCount in [1000, 4000, 16000]:
+        spans, duration = timeIt(lambda: list(streamMatcher.finditer(['aaa'] * tokenCount)))
+        assert len(spans) == tokenCount
+        print(f"finditer  tokens: {tokenCount:>7}  spans: {len(spans):>5}  finditer on \"aaa | aaa $* zzz\": {duration:.4f}s")
+
+
+def benchmarkCaptureMatcher():
+    """
+    extract groups from the corpus, on the NFA and on the automata from NFAtoDFAGroupStable
+    """
+    rule = "$* (?<question>( which | what )) & * $ ? (?<object>( play | game | movie | book | kind )) $*"
+    corpus = [tokenizer(text) for text in randomCorpus(questionTypeRule, 10000)]
+    nfa = NFAFromDSL().buildNFA(rule)
+    for name, automata in [('NFA', nfa), ('NFAtoDFAGroupStable', NFAtoDFAGroupStable(nfa))]:
+        captureMatcher = CaptureMatcher(automata, classifier=customRuleTokenClassifier)
+        captures, duration = timeIt(lambda: [captureMatcher.match(tokens) for tokens in corpus])
+        matchCount = sum(1 for groups in captures if groups is not None)
+        print(f"CaptureMatcher {name:>20}  states: {len(automata.states):>3}  matches: {matchCount:>5}  {len(corpus) / duration:>8.0f} sentences/s")
+
+
+BENCHMARKS = {
+    'buildNFA': benchmarkBuildNFA,
+    'NFAtoDFA': benchmarkNFAtoDFA,
+    'simplifyNFA': benchmarkSimplifyNFA,
+    'lazyDFA': benchmarkLazyDFA,
+    'bitParallelNFA': benchmarkBitParallelNFA,
+    'minimizeDFA': benchmarkMinimizeDFA,
+    'WFABatch': benchmarkWFABatch,
+    'WFAFromVocabulary': benchmarkWFAFromVocabulary,
+    'sparseWFA': benchmarkSparseWFA,
+    'activeWFA': benchmarkActiveWFA,
+    'vocabulary': benchmarkVocabulary,
+    'compiledExecutor': benchmarkCompiledExecutor,
+    'tokenizer': benchmarkTokenizer,
+    'ambiguousExecutor': benchmarkAmbiguousExecutor,
+    'multiRule': benchmarkMultiRule,
+    'ruleCache': benchmarkRuleCache,
+    'streamMatcher': benchmarkStreamMatcher,
+    'finditer': benchmarkFinditer,
+    'captureMatcher': benchmarkCaptureMatcher,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks of automata-tools')
+    parser.add_argument('names', nargs='*', help=f"benchmarks to run, one of {list(BENCHMARKS.keys())}, run all if not provided")
+    args = parser.parse_args()
+    for name in args.names or BENCHMARKS.keys():
+        if name not in BENCHMARKS:
+            parser.error(f"unknown benchmark {name}")
+        print(f"\n# {name}")
+        BENCHMARKS[name]()
+
+
+if __name__ == '__main__':
+    main()
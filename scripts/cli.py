@@ -3,14 +3,30 @@ import os
 _project_root = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
 sys.path.append(_project_root)
 
+import argparse
+import json
+import shutil
+import tempfile
 import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from itertools import islice
+from typing import Iterator, List, Optional, Tuple, TextIO
 
-from examples.NFAfromCustomRule import NFAFromDSL, executor, tokenizer
+from examples.NFAfromCustomRule import NFAFromDSL, executor, compiledExecutor, customRuleTokenClassifier, minDFAFromDSL, tokenizer
 from examples.customRuleDFAToTensor import dfa_to_tensor
 from examples.customRuleTokenizer import ruleParser
-from src.automata_tools import DFAtoMinimizedDFA, NFAtoDFA, NFAtoDFAGroupStable, WFA, get_word_to_index, drawGraph, isInstalled
+from src.automata_tools import CaptureMatcher, DFAtoMinimizedDFA, NFAtoDFA, NFAtoDFAGroupStable, WFA, RuleCache, get_word_to_index, drawGraph, isInstalled
+from src.automata_tools.Automata import Automata
+from src.automata_tools.CompiledDFA import CompiledDFA
 
-def main():
+# (line number, sentence, the json object of the line if corpus is JSONL)
+ISentence = Tuple[int, str, Optional[dict]]
+
+#: rules loaded in each worker process by initWorker, [(rule name, automata, executor)]
+_workerRules: list = []
+
+
+def demo():
     rule = "$* I may (?<SPAM>finally{0,3} have (her|you)) with me"
     textInput = "I may have you with me"
     nfa = NFAFromDSL().buildNFA(rule)
@@ -25,15 +41,156 @@ def main():
         drawGraph(nfa, "nfa")
         drawGraph(minDFA, "mdfa")
     print(minDFA.execute(textInput))
+    print(CaptureMatcher(minDFA, classifier=customRuleTokenClassifier).capture(tokenizer(textInput)))
     _, wordToIndex = get_word_to_index([ruleParser(rule), tokenizer(textInput)])
     wfa = WFA(minDFA, wordToIndex, dfa_to_tensor)
     print(wfa.execute(textInput))
 
 
-if __name__ == '__main__':
+def readRules(rulesPath: str) -> List[Tuple[str, str]]:
+    """
+    One rule per line, as "name<TAB>rule" or just "rule" (named by its line number), empty lines and lines starting with # are skipped
+    """
+    rules = []
+    with open(rulesPath, encoding='utf-8') as rulesFile:
+        for lineNumber, line in enumerate(rulesFile, 1):
+            line = line.rstrip('\n')
+            if not line.strip() or line.startswith('#'):
+                continue
+            if '\t' in line:
+                ruleName, rule = line.split('\t', 1)
+            else:
+                ruleName, rule = f"rule{lineNumber}", line
+            rules.append((ruleName, rule.strip()))
+    return rules
+
+
+def readCorpus(corpusFile: TextIO, textField: Optional[str]) -> Iterator[ISentence]:
+    """
+    One sentence per line, or if textField is given, one json object per line with the sentence in textField
+    """
+    for lineNumber, line in enumerate(corpusFile, 1):
+        line = line.rstrip('\n')
+        if textField is None:
+            yield (lineNumber, line, None)
+        elif line.strip():
+            record = json.loads(line)
+            yield (lineNumber, record[textField], record)
+
+
+def initWorker(rulePaths: List[Tuple[str, str]]):
+    """
+    Load automata saved by the main process, compiled tables are mmapped, so all workers share the same pages
+    """
+    global _workerRules
+    _workerRules = []
+    for ruleName, path in rulePaths:
+        automata = Automata.load(path)
+        compiled = CompiledDFA.load(path, customRuleTokenClassifier)
+        _workerRules.append((ruleName, automata, compiledExecutor(automata, compiled)))
+
+
+def matchChunk(chunk: List[ISentence]) -> List[str]:
+    """
+    Match sentences with all rules in a worker, return json lines of the result
+    """
+    outputLines = []
+    for lineNumber, text, record in chunk:
+        tokens = tokenizer(text)
+        matchedRules = [ruleName for ruleName, automata, ruleExecutor in _workerRules
+                        if ruleExecutor(list(tokens), automata.startstate, automata.finalStates, automata.transitions)]
+        result = dict(record) if record is not None else {'text': text}
+        result.update({'line': lineNumber, 'rules': matchedRules})
+        outputLines.append(json.dumps(result, ensure_ascii=False))
+    return outputLines
+
+
+def chunked(sentences: Iterator[ISentence], chunkSize: int) -> Iterator[List[ISentence]]:
+    while True:
+        chunk = list(islice(sentences, chunkSize))
+        if len(chunk) == 0:
+            return
+        yield chunk
+
+
+def matchCorpus(rules: List[Tuple[str, str]],
+                sentences: Iterator[ISentence],
+                output: TextIO,
+                workers: Optional[int] = None,
+                chunkSize: int = 1000,
+                cacheDirectory: Optional[str] = None) -> int:
+    """
+    Build each rule once in this process and save it to cacheDirectory, then match sentences in chunks across a process pool. Results are written to output as json lines as soon as their chunk finishes, so they are not in the order of the corpus, use the "line" field to sort them. Returns number of sentences matched.
+    """
+    workers = workers or os.cpu_count() or 1
+    temporaryDirectory = tempfile.mkdtemp() if cacheDirectory is None else None
+    try:
+        ruleCache = RuleCache(minDFAFromDSL, cacheDirectory or temporaryDirectory, classifier=customRuleTokenClassifier)
+        rulePaths = []
+        for ruleName, rule in rules:
+            ruleCache.get(rule)
+            rulePaths.append((ruleName, ruleCache.getEntryPath(rule)))
+        sentenceCount = 0
+        chunks = chunked(sentences, chunkSize)
+        with ProcessPoolExecutor(max_workers=workers, initializer=initWorker, initargs=(rulePaths,)) as pool:
+            # only keep a few chunks in flight, so we don't read the whole corpus into memory
+            pending = set()
+            for chunk in chunks:
+                sentenceCount += len(chunk)
+                pending.add(pool.submit(matchChunk, chunk))
+                if len(pending) >= workers * 2:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        output.write('\n'.join(future.result()) + '\n')
+            for future in pending:
+                output.write('\n'.join(future.result()) + '\n')
+        return sentenceCount
+    finally:
+        if temporaryDirectory is not None:
+            shutil.rmtree(temporaryDirectory, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Match rules on a corpus, or run a small demo if no command is given')
+    subparsers = parser.add_subparsers(dest='command')
+    matchParser = subparsers.add_parser('match', help='match every sentence of a corpus with every rule, in parallel')
+    matchParser.add_argument('rules', help='rule file, one "name<TAB>rule" or "rule" per line')
+    matchParser.add_argument('corpus', help='corpus file, one sentence per line, or JSONL with --text-field, "-" for stdin')
+    matchParser.add_argument('-o', '--output', help='write json lines of results here instead of stdout')
+    matchParser.add_argument('--text-field', help='corpus is JSONL, and sentence is in this field')
+    matchParser.add_argument('--workers', type=int, default=None, help='number of worker processes, default to number of cores')
+    matchParser.add_argument('--chunk-size', type=int, default=1000, help='number of sentences sent to a worker at once')
+    matchParser.add_argument('--cache-directory', help='keep compiled rules here between runs, see RuleCache')
+    args = parser.parse_args()
+    if args.command != 'match':
+        demo()
+        return
+
     t = time.time()
+    rules = readRules(args.rules)
+    corpusFile = sys.stdin if args.corpus == '-' else open(args.corpus, encoding='utf-8')
+    output = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
     try:
+        sentenceCount = matchCorpus(rules, readCorpus(corpusFile, args.text_field), output, args.workers, args.chunk_size, args.cache_directory)
+    except BrokenPipeError:
+        # output is piped into something like head, which has exited
+        return
+    finally:
+        if corpusFile is not sys.stdin:
+            corpusFile.close()
+        if output is not sys.stdout:
+            output.close()
+    duration = time.time() - t
+    print(f"rules: {len(rules)}  sentences: {sentenceCount}  time: {duration:.2f}s  {sentenceCount / duration:.0f} sentences/s", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
         main()
-    except BaseException as e:
-        print("\nFailure:", e)
-    print("\nExecution time: ", time.time() - t, "seconds")
+    else:
+        t = time.time()
+        try:
+            main()
+        except BaseException as e:
+            print("\nFailure:", e)
+        print("\nExecution time: ", time.time() - t, "seconds")
@@ -1,11 +1,17 @@
-from typing import Set, Dict, Optional, List, Callable, Union
+from typing import Set, Dict, FrozenSet, Optional, List, Callable, Union, TYPE_CHECKING
 from pydash import flatten, uniq
 
 from automata_tools.constants import EPSILON
 
+if TYPE_CHECKING:
+    from automata_tools.CompiledDFA import CompiledDFA
+    from automata_tools.TokenClassifier import TokenClassifier
+
 IAutomataTransitions = Dict[int, Dict[int, Set[str]]]
 IAutomataExecutor = Callable[[List[str], int, List[int], IAutomataTransitions],
                              bool]
+# { state: { token: states reachable by the token } }
+IAutomataMoves = Dict[int, Dict[str, FrozenSet[int]]]
 
 
 class GroupMetadata:
@@ -51,6 +57,10 @@ class Automata:
         self.startstate: Optional[int] = None
         self.finalStates: List[int] = []
         self.transitions: IAutomataTransitions = dict()
+        # ε closures and moves computed from transitions, dropped on every mutation, see invalidateCache
+        self.eClosures: Optional[Dict[int, FrozenSet[int]]] = None
+        self.moves: Optional[IAutomataMoves] = None
+        self.closedMoves: Optional[IAutomataMoves] = None
 
         defaultExecuter: IAutomataExecutor = lambda tokens, startState, finalStates, transitions: True
         self.executer = defaultExecuter
@@ -103,6 +113,40 @@ class Automata:
         """
         self.groups = uniq(self.groups + flatten([groups]))
 
+    def compile(self, defaultToken: Optional[str] = None, classifier: Optional['TokenClassifier'] = None) -> 'CompiledDFA':
+        """
+        Compile this DFA into a CompiledDFA, which uses dense state IDs and an array backed transition table. Tokens that are not in the alphabet will use transitions on defaultToken, or on the wildcard given by the classifier.
+        """
+        from automata_tools.CompiledDFA import CompiledDFA
+        return CompiledDFA.fromAutomata(self, defaultToken, classifier)
+
+    def save(self, path: str, defaultToken: Optional[str] = None, classifier: Optional['TokenClassifier'] = None):
+        """
+        Save into a versioned binary file, see AutomataFile. If this is a DFA, its compiled table (with defaultToken or classifier, same as compile) is saved too, so it can be loaded by CompiledDFA.load without copying.
+        """
+        from automata_tools.AutomataFile import AutomataFile
+        AutomataFile.fromAutomata(self, self.compile(defaultToken, classifier) if self.isDFA() else None).save(path)
+
+    @staticmethod
+    def load(path: str, mmap: bool = True) -> 'Automata':
+        """
+        Load an automata saved by save, executer and tokenizer are not saved, set them again after loading
+        """
+        from automata_tools.AutomataFile import AutomataFile
+        return AutomataFile.load(path, mmap).toAutomata()
+
+    def isDFA(self) -> bool:
+        """
+        No ε transition, and no multiple transitions on same token from a state
+        """
+        for toStates in self.transitions.values():
+            tokensOfState: Set[str] = set()
+            for transitionTokens in toStates.values():
+                if EPSILON in transitionTokens or not tokensOfState.isdisjoint(transitionTokens):
+                    return False
+                tokensOfState.update(transitionTokens)
+        return True
+
     def to_dict(self):
         return {
             'states': self.states,
@@ -115,6 +159,7 @@ class Automata:
     def setStartState(self, state: int):
         self.startstate = state
         self.states.add(state)
+        self.invalidateCache()
 
     def addfinalStates(self, state: Union[int, List[int]]):
         if isinstance(state, int):
@@ -127,6 +172,7 @@ class Automata:
                       token: Union[str, Set[str]]):
         if isinstance(token, str):
             token = set([token])
+        self.invalidateCache()
         self.states.add(fromState)
         self.states.add(toState)
         if fromState in self.transitions:
@@ -143,37 +189,126 @@ class Automata:
             for state in toStates:
                 self.addTransition(fromState, state, toStates[state])
 
+    def invalidateCache(self):
+        """
+        Drop ε closures and moves computed from transitions, it is called by addTransition and setStartState, call it if you change states or transitions directly
+        """
+        self.eClosures = None
+        self.moves = None
+        self.closedMoves = None
+
+    def getMoves(self) -> IAutomataMoves:
+        """
+        States reachable from each state by each token (including ε), indexed once and cached until next mutation
+        """
+        if self.moves is None:
+            moves: Dict[int, Dict[str, Set[int]]] = dict()
+            for fromState, toStates in self.transitions.items():
+                movesOfState = moves.setdefault(fromState, dict())
+                for toState, transitionTokens in toStates.items():
+                    for token in transitionTokens:
+                        movesOfState.setdefault(token, set()).add(toState)
+            self.moves = {fromState: {token: frozenset(reachable) for token, reachable in movesOfState.items()} for fromState, movesOfState in moves.items()}
+        return self.moves
+
     def getReachableStates(self, states: Union[int, List[int]], token: str):
         """
         获取某个状态给定一个字符可以到达的所有状态，在 NFA 中会有多个，DFA 中应该只有一个，以 Set[int] 的形式返回
         """
         if isinstance(states, int):
             states = [states]
+        moves = self.getMoves()
         transitionsOfCurrentState: Set[int] = set()
         for state in states:
-            if state in self.transitions:
-                for aTransitionOfCurrentState in self.transitions[state]:
-                    if token in self.transitions[state][
-                            aTransitionOfCurrentState]:
-                        transitionsOfCurrentState.add(
-                            aTransitionOfCurrentState)
+            transitionsOfCurrentState.update(moves.get(state, {}).get(token, ()))
         return transitionsOfCurrentState
 
     def getEClosure(self, findstate):
         """
         只通过ε可以到达的状态，即ε闭包
         """
-        allstates = set()
-        states = set([findstate])
-        while len(states) != 0:
-            state = states.pop()
-            allstates.add(state)
-            if state in self.transitions:
-                for tns in self.transitions[state]:
-                    if EPSILON in self.transitions[state][
-                            tns] and tns not in allstates:
-                        states.add(tns)
-        return allstates
+        return set(self.getEClosures().get(findstate, (findstate, )))
+
+    def getEClosures(self) -> Dict[int, FrozenSet[int]]:
+        """
+        ε closure of every state, computed all at once and cached until next mutation.
+
+        States on an ε cycle have the same closure, so we find strongly connected components of ε transitions (Tarjan's algorithm, without recursion), they come out in reverse topological order, so the closure of a component is its states plus closures of components it has ε transitions to, which are already done. States in a component share one frozenset.
+        """
+        if self.eClosures is not None:
+            return self.eClosures
+        moves = self.getMoves()
+        epsilonMoves = {state: movesOfState[EPSILON] for state, movesOfState in moves.items() if EPSILON in movesOfState}
+        eClosures: Dict[int, FrozenSet[int]] = dict()
+        index: Dict[int, int] = dict()
+        lowLink: Dict[int, int] = dict()
+        componentStack: List[int] = []
+        onComponentStack: Set[int] = set()
+        for root in self.states:
+            if root in index:
+                continue
+            # (state, iterator of its ε targets)
+            callStack = [(root, iter(epsilonMoves.get(root, ())))]
+            index[root] = lowLink[root] = len(index)
+            componentStack.append(root)
+            onComponentStack.add(root)
+            while len(callStack) != 0:
+                state, targets = callStack[-1]
+                descended = False
+                for target in targets:
+                    if target not in index:
+                        index[target] = lowLink[target] = len(index)
+                        componentStack.append(target)
+                        onComponentStack.add(target)
+                        callStack.append((target, iter(epsilonMoves.get(target, ()))))
+                        descended = True
+                        break
+                    elif target in onComponentStack:
+                        lowLink[state] = min(lowLink[state], index[target])
+                if descended:
+                    continue
+                callStack.pop()
+                if len(callStack) != 0:
+                    parent = callStack[-1][0]
+                    lowLink[parent] = min(lowLink[parent], lowLink[state])
+                if lowLink[state] == index[state]:
+                    component: List[int] = []
+                    while True:
+                        member = componentStack.pop()
+                        onComponentStack.discard(member)
+                        component.append(member)
+                        if member == state:
+                            break
+                    closure: Set[int] = set(component)
+                    for member in component:
+                        for target in epsilonMoves.get(member, ()):
+                            if target not in closure:
+                                closure.update(eClosures[target])
+                    frozenClosure = frozenset(closure)
+                    for member in component:
+                        eClosures[member] = frozenClosure
+        self.eClosures = eClosures
+        return eClosures
+
+    def getClosedMoves(self) -> IAutomataMoves:
+        """
+        States reachable from each state by each token (except ε) followed by ε transitions, that is one step of NFA simulation, cached until next mutation
+        """
+        if self.closedMoves is None:
+            eClosures = self.getEClosures()
+            closedMoves: IAutomataMoves = dict()
+            for fromState, movesOfState in self.getMoves().items():
+                closedMovesOfState: Dict[str, FrozenSet[int]] = dict()
+                for token, reachable in movesOfState.items():
+                    if token == EPSILON:
+                        continue
+                    if len(reachable) == 1:
+                        closedMovesOfState[token] = eClosures[next(iter(reachable))]
+                    else:
+                        closedMovesOfState[token] = frozenset(state for toState in reachable for state in eClosures[toState])
+                closedMoves[fromState] = closedMovesOfState
+            self.closedMoves = closedMoves
+        return self.closedMoves
 
     def display(self):
         print("states:", self.states)
@@ -265,7 +400,7 @@ class Automata:
                         transitionTokens = toStates[toState]
                         language = language.union(transitionTokens)
                         subAutomata.addTransition(fromState, toState, transitionTokens)
-            language.remove(EPSILON)
+            language.discard(EPSILON)
             subAutomata.setLanguage(language)
             subAutomata, _ = subAutomata.withNewStateNumber(1)
             splitAutomata.append(subAutomata)
@@ -0,0 +1,183 @@
+from typing import Any, Dict, List, Optional, Tuple, TYPE_CHECKING
+import json
+import mmap as mmapModule
+import os
+import struct
+import numpy as np
+
+from automata_tools.Automata import Automata, GroupMetadata
+from automata_tools.constants import EPSILON, LIBRARY_VERSION
+
+if TYPE_CHECKING:
+    from automata_tools.CompiledDFA import CompiledDFA
+    from automata_tools.TokenClassifier import TokenClassifier
+
+MAGIC = b'AUTOMATA'
+# bump this when the layout changes, files written by a newer format can't be loaded
+FORMAT_VERSION = 1
+# arrays start at multiples of this, so they can be viewed in place from the mmap
+ALIGNMENT = 64
+INT32_MAX = np.iinfo(np.int32).max
+
+
+class AutomataFileError(BaseException):
+    """
+    The file is not an automata file, is truncated or broken, or is written by a newer format
+    """
+
+
+class AutomataFile:
+    """
+    Versioned binary file of an automata, written by Automata.save and read by Automata.load and CompiledDFA.load.
+
+    Layout: 8 bytes magic, uint32 format version, uint32 header length, a json header, then arrays each aligned to 64 bytes, their offsets, dtypes and shapes are in the header. Tokens are interned into the alphabet in the header, states are dense IDs (index in the sorted "states" array of original state numbers), so arrays are:
+
+    - states: int32 (S,) original state numbers
+    - transitions: int32 (E, 3) of (from state ID, to state ID, token ID)
+    - finalBitmap: uint8 (⌈S/8⌉,) packed bits of final states
+    - groupStates: int32, state numbers of all groups concatenated, length of each group is in the header
+
+    If the automata is a DFA, the table of its CompiledDFA is also stored (table int32 (S, columns), fallback and ambiguous uint8 (S, columns)), so CompiledDFA.load can use them right from the mmap without copying, and many processes loading the same file share it in the page cache.
+    """
+
+    header: Dict[str, Any]
+    arrays: Dict[str, np.ndarray]
+
+    def __init__(self, header: Dict[str, Any], arrays: Dict[str, np.ndarray]):
+        self.header = header
+        self.arrays = arrays
+
+    @staticmethod
+    def fromAutomata(automata: Automata, compiled: Optional['CompiledDFA'] = None) -> 'AutomataFile':
+        if not isinstance(automata.startstate, int):
+            raise BaseException(
+                "startstate is not a interger, please init this automata properly"
+            )
+        states = sorted(automata.states)
+        if len(states) != 0 and (states[0] < -INT32_MAX or states[-1] > INT32_MAX):
+            raise BaseException("State numbers must fit in int32")
+        stateIndex = {state: stateID for stateID, state in enumerate(states)}
+        alphabet = sorted(set(token for toStates in automata.transitions.values() for transitionTokens in toStates.values() for token in transitionTokens))
+        tokenIndex = {token: tokenID for tokenID, token in enumerate(alphabet)}
+        edges = [(stateIndex[fromState], stateIndex[toState], tokenIndex[token])
+                 for fromState, toStates in automata.transitions.items()
+                 for toState, transitionTokens in toStates.items()
+                 for token in sorted(transitionTokens)]
+        isFinal = np.zeros(len(states), dtype=np.bool_)
+        for finalState in automata.finalStates:
+            isFinal[stateIndex[finalState]] = True
+        arrays = {
+            'states': np.array(states, dtype=np.int32),
+            'transitions': np.array(edges, dtype=np.int32).reshape(len(edges), 3),
+            'finalBitmap': np.packbits(isFinal),
+            'groupStates': np.array([state for group in automata.groups for state in group.stateNumbers], dtype=np.int32),
+        }
+        header: Dict[str, Any] = {
+            'libraryVersion': LIBRARY_VERSION,
+            'alphabet': alphabet,
+            'language': sorted(automata.language),
+            'startState': stateIndex[automata.startstate],
+            'groups': [[group.groupName, len(group.stateNumbers)] for group in automata.groups],
+            'compiled': None,
+        }
+        if compiled is not None:
+            arrays['table'] = np.ascontiguousarray(compiled.table, dtype=np.int32)
+            arrays['fallback'] = np.ascontiguousarray(compiled.fallback, dtype=np.uint8)
+            arrays['ambiguous'] = np.ascontiguousarray(compiled.ambiguous, dtype=np.uint8)
+            header['compiled'] = {
+                'alphabet': compiled.alphabet,
+                'wildcards': compiled.wildcards,
+                'defaultToken': compiled.defaultToken,
+                'hasClassifier': compiled.classifier is not None,
+            }
+        return AutomataFile(header, arrays)
+
+    def save(self, path: str):
+        arrayInfo: Dict[str, Tuple[int, str, List[int]]] = dict()
+        offset = 0
+        for arrayName, array in self.arrays.items():
+            arrayInfo[arrayName] = (offset, array.dtype.str, list(array.shape))
+            offset = alignUp(offset + array.nbytes)
+        headerBytes = json.dumps(dict(self.header, arrays=arrayInfo), ensure_ascii=False).encode('utf-8')
+        dataStart = alignUp(len(MAGIC) + 8 + len(headerBytes))
+        with open(path, 'wb') as automataFile:
+            automataFile.write(MAGIC + struct.pack('<II', FORMAT_VERSION, len(headerBytes)) + headerBytes)
+            for arrayName, array in self.arrays.items():
+                automataFile.write(b'\0' * (dataStart + arrayInfo[arrayName][0] - automataFile.tell()))
+                automataFile.write(np.ascontiguousarray(array).tobytes())
+
+    @staticmethod
+    def load(path: str, mmap: bool = True) -> 'AutomataFile':
+        """
+        Arrays are read-only views into the mmap of the file if mmap, otherwise into bytes read from the file
+        """
+        with open(path, 'rb') as automataFile:
+            if mmap and os.fstat(automataFile.fileno()).st_size != 0:
+                buffer: Any = mmapModule.mmap(automataFile.fileno(), 0, access=mmapModule.ACCESS_READ)
+            else:
+                buffer = automataFile.read()
+        if bytes(buffer[:len(MAGIC)]) != MAGIC:
+            raise AutomataFileError(f"{path} is not an automata file")
+        try:
+            formatVersion, headerLength = struct.unpack('<II', buffer[len(MAGIC):len(MAGIC) + 8])
+            if formatVersion > FORMAT_VERSION:
+                raise AutomataFileError(f"{path} has format version {formatVersion}, but this version of automata-tools only supports up to {FORMAT_VERSION}")
+            headerStart = len(MAGIC) + 8
+            header = json.loads(bytes(buffer[headerStart:headerStart + headerLength]).decode('utf-8'))
+            dataStart = alignUp(headerStart + headerLength)
+            arrays = dict()
+            for arrayName, (offset, dtype, shape) in header.pop('arrays').items():
+                count = int(np.prod(shape))
+                arrays[arrayName] = np.frombuffer(buffer, dtype=np.dtype(dtype), count=count, offset=dataStart + offset).reshape(shape)
+        except (struct.error, ValueError, KeyError, TypeError) as error:
+            # truncated file, or broken header
+            raise AutomataFileError(f"{path} is broken: {error!r}")
+        return AutomataFile(header, arrays)
+
+    def getIsFinal(self) -> np.ndarray:
+        return np.unpackbits(self.arrays['finalBitmap'], count=len(self.arrays['states'])).astype(np.bool_)
+
+    def getGroups(self) -> List[GroupMetadata]:
+        groups = []
+        groupStates = self.arrays['groupStates'].tolist()
+        groupStart = 0
+        for groupName, groupSize in self.header['groups']:
+            groups.append(GroupMetadata(groupStates[groupStart:groupStart + groupSize], groupName))
+            groupStart += groupSize
+        return groups
+
+    def toAutomata(self) -> Automata:
+        """
+        Build the dict based Automata, final states are in the order of state numbers
+        """
+        states = self.arrays['states'].tolist()
+        alphabet = self.header['alphabet']
+        automata = Automata(set(self.header['language']), self.getGroups())
+        automata.states.update(states)
+        automata.setStartState(states[self.header['startState']])
+        automata.addfinalStates([states[stateID] for stateID in np.flatnonzero(self.getIsFinal()).tolist()])
+        for fromStateID, toStateID, tokenID in self.arrays['transitions'].tolist():
+            automata.addTransition(states[fromStateID], states[toStateID], alphabet[tokenID])
+        return automata
+
+    def toCompiledDFA(self, classifier: Optional['TokenClassifier'] = None) -> 'CompiledDFA':
+        from automata_tools.CompiledDFA import CompiledDFA
+        compiledHeader = self.header['compiled']
+        if compiledHeader is None:
+            raise BaseException(f"This automata file has no compiled table, it is not a DFA or has {EPSILON} transition")
+        if compiledHeader['hasClassifier']:
+            if classifier is None or list(classifier.wildcards) != compiledHeader['wildcards']:
+                raise BaseException(f"This automata is compiled with a classifier, please pass a TokenClassifier with wildcards {compiledHeader['wildcards']}")
+        else:
+            classifier = None
+        return CompiledDFA(self.arrays['states'].tolist(), compiledHeader['alphabet'],
+                           compiledHeader['wildcards'], self.arrays['table'],
+                           self.header['startState'], self.getIsFinal(),
+                           self.arrays['fallback'].view(np.bool_),
+                           self.arrays['ambiguous'].view(np.bool_),
+                           compiledHeader['defaultToken'], classifier,
+                           set(self.header['language']), self.getGroups())
+
+
+def alignUp(offset: int) -> int:
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
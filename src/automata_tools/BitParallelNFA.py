@@ -0,0 +1,142 @@
+from typing import Dict, List, Optional, Tuple, Union, Callable
+import numpy as np
+
+from automata_tools.Automata import Automata
+from automata_tools.TokenClassifier import TokenClassifier
+from automata_tools.TokenColumns import getWildcardOfToken
+from automata_tools.constants import EPSILON
+
+# automata with more positions than this use numpy arrays of follow positions, a table of python int masks takes positions² / 2 bytes
+MAX_INT_POSITIONS = 1024
+BLOCK_BITS = 8
+
+
+class BitParallelNFA:
+    """
+    Execute an NFA without determinizing it, keeping the set of active states as a bitset, so each token costs a few bitwise operations instead of set unions.
+
+    The NFA is turned into a Glushkov style automata: a position is a non ε transition (label, to state), and we remember which positions were taken last. Position 0 is the start. The positions that can follow a position are those leaving the ε closure of its target state, they don't depend on the token, so a step is follow(active) & positions labeled by the token or its wildcard (defaultToken, or the one given by classifier).
+
+    follow(active) is precomputed for every 8 bit block of positions and every value of the block, so a step is one lookup and OR for each non empty block of the python int. Large automata (more than MAX_INT_POSITIONS positions) keep follow sets sparse instead, as numpy arrays in CSR layout, and the active positions as an array, so memory is linear to the number of follow edges instead of positions².
+
+    All tokens must be consumed to match, same as an anchored StreamMatcher.
+    """
+
+    positions: List[Tuple[str, int]]  # position -> (label, to state), position 0 is (ε, start state)
+    sparse: bool
+    tokenizer: Callable[[str], List[str]]
+
+    def __init__(self,
+                 automata: Automata,
+                 defaultToken: Optional[str] = None,
+                 classifier: Optional[TokenClassifier] = None,
+                 sparse: Optional[bool] = None):
+        if not isinstance(automata.startstate, int):
+            raise BaseException(
+                "startstate is not a interger, please init this automata properly"
+            )
+        self.defaultToken = defaultToken
+        self.classifier = classifier
+        self.tokenizer = lambda input: input.split(' ')
+        # transitions on same label into same state have the same followers, so they are one position
+        self.positions = [(EPSILON, automata.startstate)]
+        positionIndex: Dict[Tuple[str, int], int] = dict()
+        positionsFromState: Dict[int, List[int]] = dict()
+        for fromState, toStates in automata.transitions.items():
+            for toState, transitionTokens in toStates.items():
+                for token in sorted(transitionTokens):
+                    if token == EPSILON:
+                        continue
+                    position = positionIndex.get((token, toState))
+                    if position is None:
+                        position = len(self.positions)
+                        positionIndex[(token, toState)] = position
+                        self.positions.append((token, toState))
+                    positionsFromState.setdefault(fromState, []).append(position)
+        finalStates = set(automata.finalStates)
+        eClosure = automata.getEClosures()
+        follow: List[List[int]] = []
+        isFinal: List[bool] = []
+        for _, toState in self.positions:
+            follow.append(sorted(set(position for state in eClosure[toState] for position in positionsFromState.get(state, ()))))
+            isFinal.append(not finalStates.isdisjoint(eClosure[toState]))
+        positionsOfLabel: Dict[str, List[int]] = dict()
+        for position, (label, _) in enumerate(self.positions):
+            if position != 0:
+                positionsOfLabel.setdefault(label, []).append(position)
+
+        self.sparse = sparse if sparse is not None else len(self.positions) > MAX_INT_POSITIONS
+        if self.sparse:
+            # followers of position p are followPositions[followIndptr[p]:followIndptr[p + 1]]
+            self.followIndptr = np.zeros(len(follow) + 1, dtype=np.int64)
+            np.cumsum([len(followers) for followers in follow], out=self.followIndptr[1:])
+            self.followPositions = np.array([position for followers in follow for position in followers], dtype=np.int32)
+            labelIDs = {label: labelID for labelID, label in enumerate(positionsOfLabel)}
+            self.labelIDs = labelIDs
+            # -1 for position 0, no token leads to it
+            self.labelIDOfPosition = np.array([-1] + [labelIDs[label] for label, _ in self.positions[1:]], dtype=np.int32)
+            self.isFinalPosition = np.array(isFinal, dtype=np.bool_)
+        else:
+            followMasks = [toMask(followers) for followers in follow]
+            self.byteLength = (len(self.positions) + BLOCK_BITS - 1) // BLOCK_BITS
+            # followTable[block][value] is the OR of follow masks of positions whose bits are set in the value of the block
+            self.followTable: List[List[int]] = []
+            for block in range(self.byteLength):
+                table = [0] * (1 << BLOCK_BITS)
+                for value in range(1, 1 << BLOCK_BITS):
+                    lowestBit = (value & -value).bit_length() - 1
+                    position = block * BLOCK_BITS + lowestBit
+                    table[value] = table[value & (value - 1)] | (followMasks[position] if position < len(followMasks) else 0)
+                self.followTable.append(table)
+            self.labelMasks = {label: toMask(labelPositions) for label, labelPositions in positionsOfLabel.items()}
+            self.finalMask = toMask([position for position, final in enumerate(isFinal) if final])
+
+    def setTokenizer(self, tokenizerFunction: Callable[[str], List[str]]):
+        self.tokenizer = tokenizerFunction
+
+    def execute(self, input: Union[str, List[str]]) -> bool:
+        """
+        test whether all tokens of input can let automata go from initial state to final state
+        """
+        tokens = self.tokenizer(input) if isinstance(input, str) else input
+        if self.sparse:
+            return self.executeSparse(tokens)
+        followTable = self.followTable
+        labelMasks = self.labelMasks
+        byteLength = self.byteLength
+        active = 1
+        for token in tokens:
+            reachable = 0
+            for block, value in enumerate(active.to_bytes(byteLength, 'little')):
+                if value:
+                    reachable |= followTable[block][value]
+            wildcard = getWildcardOfToken(token, self.defaultToken, self.classifier)
+            active = reachable & (labelMasks.get(token, 0) | labelMasks.get(wildcard, 0))  # type: ignore
+            if active == 0:
+                return False
+        return active & self.finalMask != 0
+
+    def executeSparse(self, tokens: List[str]) -> bool:
+        followIndptr = self.followIndptr
+        followPositions = self.followPositions
+        labelIDOfPosition = self.labelIDOfPosition
+        active = np.zeros(1, dtype=np.int32)
+        for token in tokens:
+            starts = followIndptr[active]
+            followCounts = followIndptr[active + 1] - starts
+            # concatenation of follow sets of active positions
+            edgeOffsets = np.arange(followCounts.sum()) - np.repeat(np.cumsum(followCounts) - followCounts, followCounts)
+            reachable = followPositions[np.repeat(starts, followCounts) + edgeOffsets]
+            wildcard = getWildcardOfToken(token, self.defaultToken, self.classifier)
+            reachableLabels = labelIDOfPosition[reachable]
+            active = np.unique(reachable[(reachableLabels == self.labelIDs.get(token, -2)) | (reachableLabels == self.labelIDs.get(wildcard, -2))])  # type: ignore
+            if len(active) == 0:
+                return False
+        return bool(self.isFinalPosition[active].any())
+
+
+def toMask(positions: List[int]) -> int:
+    mask = 0
+    for position in positions:
+        mask |= 1 << position
+    return mask
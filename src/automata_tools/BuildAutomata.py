@@ -1,4 +1,4 @@
-from typing import cast, Optional
+from typing import cast
 
 from automata_tools.Automata import Automata
 from automata_tools.constants import EPSILON
@@ -114,6 +114,14 @@ class BuildAutomata:
         questionMark.addTransitionsByDict(inputAutomata.transitions)
         return questionMark
 
+    @staticmethod
+    def plusStruct(inputAutomata: Automata):
+        """
+        a+ is a a*
+        """
+        return BuildAutomata.concatenationStruct(
+            inputAutomata, BuildAutomata.starStruct(inputAutomata))
+
     @staticmethod
     def repeatStruct(automataToRepeat: Automata, repeatTimes: int) -> Automata:
         """
@@ -125,36 +133,45 @@ class BuildAutomata:
         """
         if repeatTimes <= 1:
             return BuildAutomata.skipStruct(automataToRepeat)
-        [repeatedAutomata, _] = automataToRepeat.withNewStateNumber(0)
-        for times in range(repeatTimes):
-            if times >= 1:
-                repeatedAutomata = BuildAutomata.concatenationStruct(
-                    repeatedAutomata, automataToRepeat)
-
-        return repeatedAutomata
+        return BuildAutomata.repeatRangeStruct(automataToRepeat, repeatTimes, repeatTimes)
 
     @staticmethod
     def repeatRangeStruct(automataToRepeat: Automata,
                           repeatTimesRangeStart: int,
                           repeatTimesRangeEnd: int) -> Automata:
         """
-        Repeat given token for several different times, given a{2,3}, the automata will be: 
+        Repeat given token for several different times, a{n,m} is n required copies followed by m - n optional copies, each optional copy can be skipped to the final state, so the size is linear to m. Given a{1,3}, the automata will be:
         WITH automataToRepeat = (0)-[a]->(1)
-        CREATE (0)-[a]->(1)-[a]->(4)
-        CREATE (0)-[a]->(2)-[a]->(3)-[a]->(4)
+        CREATE (1)-[a]->(2)-[ε]->(3)-[a]->(4)-[ε]->(5)-[a]->(6)-[ε]->(7)
+        CREATE (3)-[ε]->(7)
+        CREATE (5)-[ε]->(7)
         """
-        rangeRepeatedAutomata: Optional[Automata] = None
-
-        for repeatTimes in range(repeatTimesRangeStart,
-                                 repeatTimesRangeEnd + 1):
-            repeatedAutomata = BuildAutomata.repeatStruct(
-                automataToRepeat, repeatTimes)
-            if rangeRepeatedAutomata is None:
-                rangeRepeatedAutomata = repeatedAutomata
-            else:
-                rangeRepeatedAutomata = BuildAutomata.unionStruct(
-                    cast(Automata, rangeRepeatedAutomata), repeatedAutomata)
-
-        if rangeRepeatedAutomata is None:
-            [rangeRepeatedAutomata, _] = automataToRepeat.withNewStateNumber(0)
-        return cast(Automata, rangeRepeatedAutomata)
+        if repeatTimesRangeEnd < repeatTimesRangeStart:
+            [automataToRepeat, _] = automataToRepeat.withNewStateNumber(0)
+            return automataToRepeat
+        rangeRepeatedAutomata = Automata(automataToRepeat.language)
+        if repeatTimesRangeEnd == 0:
+            rangeRepeatedAutomata.setStartState(1)
+            rangeRepeatedAutomata.addfinalStates(2)
+            rangeRepeatedAutomata.addTransition(1, 2, EPSILON)
+            return rangeRepeatedAutomata
+        nextState = 1
+        copies = []
+        for _ in range(repeatTimesRangeEnd):
+            [copiedAutomata, nextState] = automataToRepeat.withNewStateNumber(nextState)
+            copies.append(copiedAutomata)
+        rangeRepeatedAutomata.setStartState(cast(int, copies[0].startstate))
+        for copiedAutomata, nextAutomata in zip(copies, copies[1:]):
+            rangeRepeatedAutomata.addTransition(copiedAutomata.finalStates[0], cast(int, nextAutomata.startstate), EPSILON)
+        if repeatTimesRangeStart == repeatTimesRangeEnd:
+            rangeRepeatedAutomata.addfinalStates(copies[-1].finalStates[0])
+        else:
+            finalState = nextState
+            rangeRepeatedAutomata.addfinalStates(finalState)
+            rangeRepeatedAutomata.addTransition(copies[-1].finalStates[0], finalState, EPSILON)
+            for copiedAutomata in copies[repeatTimesRangeStart:]:
+                rangeRepeatedAutomata.addTransition(cast(int, copiedAutomata.startstate), finalState, EPSILON)
+        for copiedAutomata in copies:
+            rangeRepeatedAutomata.addTransitionsByDict(copiedAutomata.transitions)
+            rangeRepeatedAutomata.addGroups(copiedAutomata.groups)
+        return rangeRepeatedAutomata
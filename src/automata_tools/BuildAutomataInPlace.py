@@ -0,0 +1,171 @@
+from typing import Dict, List, Tuple, Union
+
+from automata_tools.Automata import Automata, GroupMetadata
+from automata_tools.constants import EPSILON
+
+# nested tuples of states, so concatenating the state order of two fragments is O(1)
+IStateOrder = Union[int, tuple]
+
+
+def flattenStateOrder(stateOrder: IStateOrder) -> List[int]:
+    """
+    Flatten nested tuples of states without recursion, long rules can nest deeper than the recursion limit
+    """
+    states: List[int] = []
+    stack = [stateOrder]
+    while len(stack) != 0:
+        item = stack.pop()
+        if isinstance(item, tuple):
+            stack.extend(reversed(item))
+        else:
+            states.append(item)
+    return states
+
+
+class AutomataFragment:
+    """
+    A sub-automata under construction in BuildAutomataInPlace, its transitions live in the shared automata of the builder
+    """
+
+    startState: int
+    finalState: int
+    stateOrder: IStateOrder
+    groups: List[Tuple[str, IStateOrder]]
+
+    def __init__(self, startState: int, finalState: int,
+                 stateOrder: IStateOrder,
+                 groups: List[Tuple[str, IStateOrder]]):
+        self.startState = startState
+        self.finalState = finalState
+        self.stateOrder = stateOrder
+        self.groups = groups
+
+    def setAsGroup(self, groupName: str):
+        """
+        Same as Automata.setAsGroup, annotate all states of this fragment as a "(xxxx)" group
+        """
+        self.groups = self.groups + [(groupName, self.stateOrder)]
+
+
+class BuildAutomataInPlace:
+    """
+    Thompson construction in linear time, has same methods as BuildAutomata, but works on AutomataFragment.
+
+    BuildAutomata renumbers and copies both sub-automata in every combinator, so a rule with k concatenated tokens takes O(k²). Here all states come from one counter and all transitions are added to one shared automata in place, each combinator only adds its own states and ε transitions. States are renumbered once in build, into the same layout BuildAutomata gives (start state first, then sub-automata from left to right, then final state), so group metadata and splitNFA keep working.
+
+    A fragment is consumed when passed to a combinator, use copyStruct if it is needed twice.
+    """
+
+    def __init__(self):
+        self.automata = Automata()
+        self.stateCounter = 0
+
+    def newState(self) -> int:
+        self.stateCounter += 1
+        return self.stateCounter
+
+    def characterStruct(self, transitionToken: str) -> AutomataFragment:
+        startState = self.newState()
+        finalState = self.newState()
+        self.automata.addTransition(startState, finalState, transitionToken)
+        return AutomataFragment(startState, finalState, (startState, finalState), [])
+
+    def unionStruct(self, a: AutomataFragment, b: AutomataFragment) -> AutomataFragment:
+        startState = self.newState()
+        finalState = self.newState()
+        self.automata.addTransition(startState, a.startState, EPSILON)
+        self.automata.addTransition(startState, b.startState, EPSILON)
+        self.automata.addTransition(a.finalState, finalState, EPSILON)
+        self.automata.addTransition(b.finalState, finalState, EPSILON)
+        return AutomataFragment(startState, finalState, (startState, a.stateOrder, b.stateOrder, finalState), a.groups + b.groups)
+
+    def concatenationStruct(self, leftAutomata: AutomataFragment, rightAutomata: AutomataFragment, edge: str = EPSILON) -> AutomataFragment:
+        self.automata.addTransition(leftAutomata.finalState, rightAutomata.startState, edge)
+        return AutomataFragment(leftAutomata.startState, rightAutomata.finalState, (leftAutomata.stateOrder, rightAutomata.stateOrder), leftAutomata.groups + rightAutomata.groups)
+
+    def starStruct(self, inputAutomata: AutomataFragment) -> AutomataFragment:
+        star = self.skipStruct(inputAutomata)
+        self.automata.addTransition(inputAutomata.finalState, inputAutomata.startState, EPSILON)
+        return star
+
+    def skipStruct(self, inputAutomata: AutomataFragment) -> AutomataFragment:
+        startState = self.newState()
+        finalState = self.newState()
+        self.automata.addTransition(startState, inputAutomata.startState, EPSILON)
+        self.automata.addTransition(startState, finalState, EPSILON)
+        self.automata.addTransition(inputAutomata.finalState, finalState, EPSILON)
+        return AutomataFragment(startState, finalState, (startState, inputAutomata.stateOrder, finalState), inputAutomata.groups)
+
+    def plusStruct(self, inputAutomata: AutomataFragment) -> AutomataFragment:
+        """
+        a+ is a a*
+        """
+        return self.concatenationStruct(inputAutomata, self.starStruct(self.copyStruct(inputAutomata)))
+
+    def copyStruct(self, inputAutomata: AutomataFragment) -> AutomataFragment:
+        """
+        Copy states and transitions of a fragment with new states, takes time linear to the size of the fragment
+        """
+        transitions = self.automata.transitions
+        translations: Dict[int, int] = {state: self.newState() for state in flattenStateOrder(inputAutomata.stateOrder)}
+        for fromState, newFromState in translations.items():
+            for toState, transitionTokens in transitions.get(fromState, {}).items():
+                self.automata.addTransition(newFromState, translations[toState], set(transitionTokens))
+        groups = [(groupName, tuple(translations[state] for state in flattenStateOrder(groupStateOrder)))
+                  for groupName, groupStateOrder in inputAutomata.groups]
+        return AutomataFragment(translations[inputAutomata.startState], translations[inputAutomata.finalState],
+                                tuple(translations.values()), groups)
+
+    def repeatStruct(self, automataToRepeat: AutomataFragment, repeatTimes: int) -> AutomataFragment:
+        """
+        Same as BuildAutomata.repeatStruct, if repeat 0 or 1 times, it actually returns a?
+        """
+        if repeatTimes <= 1:
+            return self.skipStruct(automataToRepeat)
+        return self.repeatRangeStruct(automataToRepeat, repeatTimes, repeatTimes)
+
+    def repeatRangeStruct(self, automataToRepeat: AutomataFragment,
+                          repeatTimesRangeStart: int,
+                          repeatTimesRangeEnd: int) -> AutomataFragment:
+        """
+        Same as BuildAutomata.repeatRangeStruct, required copies followed by optional copies that can be skipped to the final state
+        """
+        if repeatTimesRangeEnd < repeatTimesRangeStart:
+            return automataToRepeat
+        if repeatTimesRangeEnd == 0:
+            startState = self.newState()
+            finalState = self.newState()
+            self.automata.addTransition(startState, finalState, EPSILON)
+            return AutomataFragment(startState, finalState, (startState, finalState), [])
+        copies = [self.copyStruct(automataToRepeat) for _ in range(repeatTimesRangeEnd - 1)] + [automataToRepeat]
+        for copiedAutomata, nextAutomata in zip(copies, copies[1:]):
+            self.automata.addTransition(copiedAutomata.finalState, nextAutomata.startState, EPSILON)
+        stateOrder: IStateOrder = tuple(copiedAutomata.stateOrder for copiedAutomata in copies)
+        groups = [group for copiedAutomata in copies for group in copiedAutomata.groups]
+        if repeatTimesRangeStart == repeatTimesRangeEnd:
+            return AutomataFragment(copies[0].startState, copies[-1].finalState, stateOrder, groups)
+        finalState = self.newState()
+        self.automata.addTransition(copies[-1].finalState, finalState, EPSILON)
+        for copiedAutomata in copies[repeatTimesRangeStart:]:
+            self.automata.addTransition(copiedAutomata.startState, finalState, EPSILON)
+        return AutomataFragment(copies[0].startState, finalState, (stateOrder, finalState), groups)
+
+    def build(self, fragment: AutomataFragment) -> Automata:
+        """
+        Renumber states of the fragment from 1 into a standalone Automata, states not in the fragment (like the original of a copied fragment) are dropped
+        """
+        states = flattenStateOrder(fragment.stateOrder)
+        translations = {state: newState for newState, state in enumerate(states, 1)}
+        transitions = self.automata.transitions
+        automata = Automata()
+        automata.setStartState(translations[fragment.startState])
+        automata.addfinalStates(translations[fragment.finalState])
+        for state in states:
+            automata.states.add(translations[state])
+            for toState, transitionTokens in transitions.get(state, {}).items():
+                automata.addTransition(translations[state], translations[toState], transitionTokens)
+        automata.addGroups([
+            GroupMetadata([translations[state] for state in flattenStateOrder(groupStateOrder)], groupName)
+            for groupName, groupStateOrder in fragment.groups
+        ])
+        return automata
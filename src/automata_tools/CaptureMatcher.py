@@ -0,0 +1,113 @@
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from automata_tools.Automata import Automata
+from automata_tools.TokenClassifier import TokenClassifier
+from automata_tools.TokenColumns import getWildcardOfToken
+from automata_tools.constants import CAPTURE_END, CAPTURE_START, EPSILON
+
+# positions of start and end of each group, indexed by 2 * group index (+ 1 for end), None if not reached
+ICaptures = Tuple[Optional[int], ...]
+
+
+class CaptureMatcher:
+    """
+    Extract token spans of "(?<label> ...)" groups in one pass, without backtracking. Works on the automata from NFAtoDFAGroupStable, which has CaptureStart-label and CaptureEnd-label edges around each group. On an NFA without such edges, like the one built from a rule, group metadata is used instead: a group starts when its start state is entered, and ends when its final state is entered.
+
+    It is a Pike VM: capture edges (and ε) are followed without consuming a token, and record the position on the run that takes them. Runs are kept in priority order, and only the first run reaching a state is kept, so each token takes time linear to the size of the automata, no matter how ambiguous the rule is. A token goes through transitions on itself before transitions on its wildcard (defaultToken, or the one given by classifier), so literal tokens are preferred, like the executor.
+    """
+
+    groupNames: List[str]
+
+    def __init__(self,
+                 automata: Automata,
+                 defaultToken: Optional[str] = None,
+                 classifier: Optional[TokenClassifier] = None):
+        if not isinstance(automata.startstate, int):
+            raise BaseException(
+                "startstate is not a interger, please init this automata properly"
+            )
+        self.startState = automata.startstate
+        self.finalStates = frozenset(automata.finalStates)
+        self.defaultToken = defaultToken
+        self.classifier = classifier
+        self.groupNames = [group.groupName for group in automata.groups]
+        # state -> [(next state, slot in captures to record the position, or None for ε)]
+        self.freeMoves: Dict[int, List[Tuple[int, Optional[int]]]] = dict()
+        # state -> token -> next states
+        self.tokenMoves: Dict[int, Dict[str, List[int]]] = dict()
+        for fromState, toStates in automata.transitions.items():
+            for toState in sorted(toStates):
+                for token in sorted(toStates[toState]):
+                    if token == EPSILON:
+                        self.freeMoves.setdefault(fromState, []).append((toState, None))
+                    elif token.startswith(CAPTURE_START) or token.startswith(CAPTURE_END):
+                        isStart = token.startswith(CAPTURE_START)
+                        groupName = token[len(CAPTURE_START if isStart else CAPTURE_END):]
+                        if groupName not in self.groupNames:
+                            self.groupNames.append(groupName)
+                        slot = self.groupNames.index(groupName) * 2 + (0 if isStart else 1)
+                        self.freeMoves.setdefault(fromState, []).append((toState, slot))
+                    else:
+                        self.tokenMoves.setdefault(fromState, dict()).setdefault(token, []).append(toState)
+        # state -> slots to record the position when it is entered
+        self.stateSlots: Dict[int, List[int]] = dict()
+        if not any(slot is not None for moves in self.freeMoves.values() for _, slot in moves):
+            for index, group in enumerate(automata.groups):
+                self.stateSlots.setdefault(group.startState, []).append(index * 2)
+                self.stateSlots.setdefault(group.finalState, []).append(index * 2 + 1)
+
+    def addRun(self, runs: Dict[int, ICaptures], state: int, captures: ICaptures, position: int):
+        """
+        Add a run to state, and follow ε and capture edges from it, depth first so the priority is kept
+        """
+        stack = [(state, captures)]
+        while len(stack) != 0:
+            state, captures = stack.pop()
+            if state in runs:
+                continue
+            for slot in self.stateSlots.get(state, ()):
+                captures = captures[:slot] + (position, ) + captures[slot + 1:]
+            runs[state] = captures
+            for toState, slot in reversed(self.freeMoves.get(state, [])):
+                if slot is None:
+                    stack.append((toState, captures))
+                else:
+                    stack.append((toState, captures[:slot] + (position, ) + captures[slot + 1:]))
+
+    def match(self, tokens: Sequence[str]) -> Optional[Dict[str, Tuple[int, int]]]:
+        """
+        If all tokens match the automata, return {label: (start, end)} token offsets of each group that is reached, otherwise None
+        """
+        runs: Dict[int, ICaptures] = dict()
+        self.addRun(runs, self.startState, (None, ) * (len(self.groupNames) * 2), 0)
+        for position, token in enumerate(tokens):
+            wildcard = getWildcardOfToken(token, self.defaultToken, self.classifier)
+            labels = [token, wildcard] if wildcard is not None and wildcard != token else [token]
+            nextRuns: Dict[int, ICaptures] = dict()
+            for state, captures in runs.items():
+                movesOfState = self.tokenMoves.get(state)
+                if movesOfState is None:
+                    continue
+                for label in labels:
+                    for toState in movesOfState.get(label, ()):
+                        self.addRun(nextRuns, toState, captures, position + 1)
+            runs = nextRuns
+            if len(runs) == 0:
+                return None
+        for state, captures in runs.items():
+            if state in self.finalStates:
+                return {
+                    groupName: (captures[index * 2], captures[index * 2 + 1])
+                    for index, groupName in enumerate(self.groupNames)
+                    if captures[index * 2] is not None and captures[index * 2 + 1] is not None
+                }
+        return None
+
+    def capture(self, tokens: Sequence[str]) -> Optional[Dict[str, List[str]]]:
+        """
+        Same as match, but return tokens of each group
+        """
+        spans = self.match(tokens)
+        if spans is None:
+            return None
+        return {groupName: list(tokens[start:end]) for groupName, (start, end) in spans.items()}
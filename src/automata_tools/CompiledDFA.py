@@ -0,0 +1,171 @@
+from typing import Dict, List, Optional, Set, Union, Callable
+import numpy as np
+
+from automata_tools.Automata import Automata, GroupMetadata
+from automata_tools.TokenClassifier import TokenClassifier
+from automata_tools.TokenColumns import TokenColumns, getWildcards
+from automata_tools.constants import DEAD_STATE, EPSILON
+
+
+class CompiledDFA(TokenColumns):
+    """
+    DFA with dense state IDs, interned tokens and a contiguous int32 next state table, so stepping on a token is one index lookup.
+
+    Columns of the table are mapped from tokens by TokenColumns, the unknown column is all DEAD_STATE (-1, means there is no transition).
+
+    A token in the alphabet also falls back to its wildcard (defaultToken, or the one given by the classifier) in states where it has no transition of its own. Cells where both the token and its wildcard have transitions, but to different states, are marked in ambiguous, executors that prefer the token (like the backtracking executor) may need to try both.
+    """
+
+    states: List[int]  # dense state ID -> state number in the original Automata
+    table: np.ndarray
+    fallback: np.ndarray  # cells of alphabet columns filled by the transition of their wildcard
+    ambiguous: np.ndarray
+    isFinal: np.ndarray
+    startState: int
+    tokenizer: Callable[[str], List[str]]
+
+    def __init__(self,
+                 states: List[int],
+                 alphabet: List[str],
+                 wildcards: List[str],
+                 table: np.ndarray,
+                 startState: int,
+                 isFinal: np.ndarray,
+                 fallback: Optional[np.ndarray] = None,
+                 ambiguous: Optional[np.ndarray] = None,
+                 defaultToken: Optional[str] = None,
+                 classifier: Optional[TokenClassifier] = None,
+                 language: Optional[Set[str]] = None,
+                 groups: Optional[List[GroupMetadata]] = None):
+        TokenColumns.__init__(self, alphabet, wildcards, defaultToken, classifier)
+        self.states = states
+        self.table = table
+        self.startState = startState
+        self.isFinal = isFinal
+        self.fallback = fallback if fallback is not None else np.zeros(table.shape, dtype=np.bool_)
+        self.ambiguous = ambiguous if ambiguous is not None else np.zeros(table.shape, dtype=np.bool_)
+        self.language = language if language != None else set(alphabet)
+        self.groups = groups if groups != None else []
+        self.tokenizer = lambda input: input.split(' ')
+
+    @staticmethod
+    def fromAutomata(automata: Automata,
+                     defaultToken: Optional[str] = None,
+                     classifier: Optional[TokenClassifier] = None) -> 'CompiledDFA':
+        """
+        Build the table from a DFA, raise if there is an ε transition or multiple transitions on same token
+        """
+        if not isinstance(automata.startstate, int):
+            raise BaseException(
+                "startstate is not a interger, please init this automata properly"
+            )
+        states = sorted(automata.states)
+        stateIndex = {state: stateID for stateID, state in enumerate(states)}
+        tokens: Set[str] = set()
+        for toStates in automata.transitions.values():
+            for transitionTokens in toStates.values():
+                tokens.update(transitionTokens)
+        if EPSILON in tokens:
+            raise BaseException(f"Can't compile automata with {EPSILON} transition, use NFAtoDFA first")
+        wildcards = getWildcards(defaultToken, classifier)
+        columns = TokenColumns(TokenColumns.getAlphabet(tokens, wildcards), wildcards, defaultToken, classifier)
+        alphabet, tokenIndex, wildcardIndex = columns.alphabet, columns.tokenIndex, columns.wildcardIndex
+        table = np.full((len(states), len(alphabet) + len(wildcards) + 1), DEAD_STATE, dtype=np.int32)
+        for fromState, toStates in automata.transitions.items():
+            for toState, transitionTokens in toStates.items():
+                for token in transitionTokens:
+                    column = wildcardIndex[token] if token in wildcardIndex else tokenIndex[token]
+                    if table[stateIndex[fromState], column] != DEAD_STATE:
+                        raise BaseException(
+                            f"Multiple transitions on same token {token} detected in DFA"
+                        )
+                    table[stateIndex[fromState], column] = stateIndex[toState]
+        fallback = np.zeros(table.shape, dtype=np.bool_)
+        ambiguous = np.zeros(table.shape, dtype=np.bool_)
+        if len(wildcards) != 0:
+            for column, token in enumerate(alphabet):
+                wildcard = columns.getWildcard(token)
+                if wildcard not in wildcardIndex:
+                    continue
+                tokenTargets = table[:, column]
+                wildcardTargets = table[:, wildcardIndex[wildcard]]
+                ambiguous[:, column] = (tokenTargets != DEAD_STATE) & (wildcardTargets != DEAD_STATE) & (tokenTargets != wildcardTargets)
+                fallback[:, column] = (tokenTargets == DEAD_STATE) & (wildcardTargets != DEAD_STATE)
+                table[:, column] = np.where(fallback[:, column], wildcardTargets, tokenTargets)
+        isFinal = np.zeros(len(states), dtype=np.bool_)
+        for finalState in automata.finalStates:
+            isFinal[stateIndex[finalState]] = True
+        groups = [GroupMetadata(list(group.stateNumbers), group.groupName) for group in automata.groups]
+        compiled = CompiledDFA(states, alphabet, wildcards, table, stateIndex[automata.startstate], isFinal, fallback, ambiguous, defaultToken, classifier, set(automata.language), groups)
+        compiled.setTokenizer(automata.tokenizer)
+        return compiled
+
+    @staticmethod
+    def load(path: str, classifier: Optional[TokenClassifier] = None, mmap: bool = True) -> 'CompiledDFA':
+        """
+        Load the compiled table saved by Automata.save, arrays are views into the mmap of the file, so it takes no time and memory to copy them, and processes loading the same file share its pages. Pass the same classifier if it is saved with one.
+        """
+        from automata_tools.AutomataFile import AutomataFile
+        return AutomataFile.load(path, mmap).toCompiledDFA(classifier)
+
+    def to_automata(self) -> Automata:
+        """
+        Back to the dict based Automata, with the original state numbers, so existing builders can keep working on it
+        """
+        automata = Automata(set(self.language), [GroupMetadata(list(group.stateNumbers), group.groupName) for group in self.groups])
+        for state in self.states:
+            automata.states.add(state)
+        automata.setStartState(self.states[self.startState])
+        automata.addfinalStates([self.states[stateID] for stateID in np.flatnonzero(self.isFinal)])
+        columnTokens = list(self.alphabet) + list(self.wildcards)
+        fromStateIDs, columns = np.nonzero((self.table != DEAD_STATE) & ~self.fallback)
+        for fromStateID, column in zip(fromStateIDs.tolist(), columns.tolist()):
+            automata.addTransition(self.states[fromStateID], self.states[self.table.item(fromStateID, column)], columnTokens[column])
+        automata.setTokenizer(self.tokenizer)
+        return automata
+
+    def setTokenizer(self, tokenizerFunction: Callable[[str], List[str]]):
+        self.tokenizer = tokenizerFunction
+
+    def getColumns(self, tokens: List[str]) -> np.ndarray:
+        return np.array([self.getColumn(token) for token in tokens], dtype=np.int32)
+
+    def getColumnsOfWordIndexes(self, wordToIndex: Dict[str, int]) -> np.ndarray:
+        """
+        Column of each word index, each word in the vocabulary is classified only once, so columnsOfWordIndexes[wordIndexes] turns a sentence from Tokenizer.tokenizeToWordIndexes into columns
+        """
+        columnsOfWordIndexes = np.full(max(wordToIndex.values(), default=-1) + 1, self.unknownColumn, dtype=np.int32)
+        for word, wordIndex in wordToIndex.items():
+            columnsOfWordIndexes[wordIndex] = self.getColumn(word)
+        return columnsOfWordIndexes
+
+    def step(self, stateID: int, token: str) -> int:
+        """
+        Next dense state ID after consuming token, or DEAD_STATE
+        """
+        return self.table.item(stateID, self.getColumn(token))
+
+    def execute(self, input: Union[str, List[str]]) -> bool:
+        """
+        test whether all tokens of input can let automata go from initial state to final state, ambiguous cells take the transition of the token
+        """
+        tokens = self.tokenizer(input) if isinstance(input, str) else input
+        table = self.table
+        stateID = self.startState
+        for token in tokens:
+            stateID = table.item(stateID, self.getColumn(token))
+            if stateID == DEAD_STATE:
+                return False
+        return bool(self.isFinal[stateID])
+
+    def executeColumns(self, columns: np.ndarray) -> bool:
+        """
+        Same as execute, on tokens already classified into columns
+        """
+        table = self.table
+        stateID = self.startState
+        for column in columns.tolist():
+            stateID = table.item(stateID, column)
+            if stateID == DEAD_STATE:
+                return False
+        return bool(self.isFinal[stateID])
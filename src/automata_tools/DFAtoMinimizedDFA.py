@@ -1,9 +1,99 @@
+from typing import Dict, List, Set, Tuple
+
 from automata_tools.Automata import Automata
 
 TWO_STATE_GIVEN_THIS_TOKEN_CAN_REACH_SAME_STATE = 1
 
 
-def DFAtoMinimizedDFA(dfa: Automata) -> Automata:
+def DFAtoMinimizedDFA(dfa: Automata, algorithm: str = 'hopcroft') -> Automata:
+    """
+    Merge equivalent states of DFA. algorithm can be "hopcroft" (partition refinement, O(n·|Σ|·log n)) or "table" (the pairwise table filling, O(n²·|Σ|) pairs to check)
+    """
+    if algorithm == 'hopcroft':
+        return hopcroftMinimizedDFA(dfa)
+    elif algorithm == 'table':
+        return tableFillingMinimizedDFA(dfa)
+    raise BaseException(f"Unknown DFA minimization algorithm {algorithm}")
+
+
+def hopcroftMinimizedDFA(dfa: Automata) -> Automata:
+    """
+    Hopcroft partition refinement over an inverse transition index.
+
+    Missing transitions go to a virtual sink state, which is kept in its own block, so a state without transition on a token is never merged with a state that has one, same as tableFillingMinimizedDFA.
+    """
+    dfaStates = list(dfa.states)
+    dfaStateLength = len(dfaStates)
+    stateIndex = dict(zip(dfaStates, range(dfaStateLength)))
+    sink = dfaStateLength
+    language = sorted(dfa.language)
+    # inverseTransitions[token][toStateIndex] is the list of states that can go to toState by token
+    inverseTransitions: List[Dict[int, List[int]]] = []
+    for token in language:
+        inverseOfToken: Dict[int, List[int]] = dict()
+        for fromState in dfaStates:
+            reachableStates = dfa.getReachableStates(fromState, token)
+            if len(reachableStates) > 1:
+                raise BaseException(
+                    f"Multiple transitions on same token {token} detected in DFA"
+                )
+            toIndex = stateIndex[reachableStates.pop()] if len(reachableStates) == 1 else sink
+            inverseOfToken.setdefault(toIndex, []).append(stateIndex[fromState])
+        inverseOfToken.setdefault(sink, []).append(sink)
+        inverseTransitions.append(inverseOfToken)
+
+    finalStates = set(dfa.finalStates)
+    blocks: List[Set[int]] = [
+        block for block in [
+            {stateIndex[s] for s in dfaStates if s in finalStates},
+            {stateIndex[s] for s in dfaStates if s not in finalStates},
+            {sink},
+        ] if block
+    ]
+    blockOfState: List[int] = [0] * (dfaStateLength + 1)
+    for blockID, block in enumerate(blocks):
+        for state in block:
+            blockOfState[state] = blockID
+    waiting: Set[Tuple[int, int]] = {(blockID, tokenID) for blockID in range(len(blocks)) for tokenID in range(len(language))}
+    while len(waiting) != 0:
+        splitterBlockID, tokenID = waiting.pop()
+        inverseOfToken = inverseTransitions[tokenID]
+        # states that can go into the splitter block by this token, grouped by their current block
+        predecessorsByBlock: Dict[int, Set[int]] = dict()
+        for toState in blocks[splitterBlockID]:
+            for fromState in inverseOfToken.get(toState, []):
+                predecessorsByBlock.setdefault(blockOfState[fromState], set()).add(fromState)
+        for blockID, predecessors in predecessorsByBlock.items():
+            block = blocks[blockID]
+            if len(predecessors) == len(block):
+                continue
+            block.difference_update(predecessors)
+            newBlockID = len(blocks)
+            blocks.append(predecessors)
+            for state in predecessors:
+                blockOfState[state] = newBlockID
+            for otherTokenID in range(len(language)):
+                if (blockID, otherTokenID) in waiting:
+                    waiting.add((newBlockID, otherTokenID))
+                else:
+                    waiting.add((newBlockID if len(predecessors) <= len(block) else blockID, otherTokenID))
+
+    if len(blocks) - 1 == dfaStateLength:
+        return dfa
+    # name each equivalent class after its first state, same as tableFillingMinimizedDFA
+    equivalentStates: Dict[int, Set[int]] = dict()
+    partitionOfStates: Dict[int, int] = dict()
+    for block in blocks:
+        if sink in block:
+            continue
+        partition = min(block)
+        equivalentStates[partition] = {dfaStates[state] for state in block}
+        for state in block:
+            partitionOfStates[dfaStates[state]] = partition
+    return dfa.newBuildFromEquivalentStates(equivalentStates, partitionOfStates)
+
+
+def tableFillingMinimizedDFA(dfa: Automata) -> Automata:
     dfaStates = list(dfa.states)
     dfaStateLength = len(dfaStates)
     uncheckedState = dict()
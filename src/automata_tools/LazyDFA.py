@@ -0,0 +1,155 @@
+from typing import Dict, List, Optional, Set, Union, Callable, FrozenSet, Sequence
+
+from automata_tools.Automata import Automata
+from automata_tools.TokenClassifier import TokenClassifier
+from automata_tools.TokenColumns import TokenColumns, getWildcards
+from automata_tools.constants import DEAD_STATE, MIN_TOKENS_PER_STATE, UNKNOWN_STATE
+
+
+class LazyDFA(TokenColumns):
+    """
+    DFA built on the fly from an NFA while executing, like the DFA of RE2, so rules whose full DFA is exponentially large can still run at DFA speed on the inputs they actually see.
+
+    A DFA state is the set of NFA states (with their ε closure) the input can be in, it is created the first time an input reaches it, and its transitions are filled in the same way. At most maxStates DFA states are kept, when a new one doesn't fit, the cache is flushed and rebuilt from the current state. If the cache was already flushed, and fewer than MIN_TOKENS_PER_STATE tokens per state were executed since then, it doesn't pay off, so the rest of the input is run by NFA simulation (same as StreamMatcher) instead, memory is bounded either way.
+
+    A token goes through transitions on itself and on its wildcard (defaultToken, or the one given by classifier) at the same time, and all tokens must be consumed to match, same as an anchored StreamMatcher.
+    """
+
+    rows: List[List[int]]  # next state of each column, UNKNOWN_STATE if not determinized yet
+    isFinalOfState: List[bool]
+    startState: int
+    stats: Dict[str, int]
+    tokenizer: Callable[[str], List[str]]
+
+    def __init__(self,
+                 automata: Automata,
+                 defaultToken: Optional[str] = None,
+                 classifier: Optional[TokenClassifier] = None,
+                 maxStates: int = 10000):
+        if not isinstance(automata.startstate, int):
+            raise BaseException(
+                "startstate is not a interger, please init this automata properly"
+            )
+        if maxStates < 3:
+            raise BaseException("maxStates should be at least 3, to keep the start state, the current state and the next one")
+        self.maxStates = maxStates
+        self.tokenizer = lambda input: input.split(' ')
+
+        labels: Set[str] = set()
+        for toStates in automata.transitions.values():
+            for transitionTokens in toStates.values():
+                labels.update(transitionTokens)
+        wildcards = getWildcards(defaultToken, classifier)
+        TokenColumns.__init__(self, TokenColumns.getAlphabet(labels, wildcards), wildcards, defaultToken, classifier)
+        self.labelsOfColumn = self.getLabelsOfColumns()
+
+        self.closedMoves: Dict[int, Dict[str, FrozenSet[int]]] = automata.getClosedMoves()
+        self.finalStates = frozenset(automata.finalStates)
+        self.startNFAStates = automata.getEClosures()[automata.startstate]
+        self.stats = {'states': 0, 'flushes': 0, 'nfaFallbacks': 0}
+        self.flush()
+
+    def flush(self):
+        """
+        Drop all DFA states except the start state
+        """
+        self.dfaStates: Dict[FrozenSet[int], int] = dict()
+        self.nfaStatesOfState: List[FrozenSet[int]] = []
+        self.isFinalOfState = []
+        self.rows = []
+        # number of tokens executed since the last flush
+        self.tokensSinceFlush = 0
+        self.startState = self.getDFAState(self.startNFAStates)
+
+    def getDFAState(self, nfaStates: FrozenSet[int]) -> Optional[int]:
+        """
+        DFA state of the NFA states, None if it is not in the cache and the cache is full
+        """
+        stateID = self.dfaStates.get(nfaStates)
+        if stateID is not None:
+            return stateID
+        if len(self.rows) >= self.maxStates:
+            return None
+        stateID = len(self.rows)
+        self.dfaStates[nfaStates] = stateID
+        self.nfaStatesOfState.append(nfaStates)
+        self.isFinalOfState.append(not self.finalStates.isdisjoint(nfaStates))
+        self.rows.append([UNKNOWN_STATE] * len(self.labelsOfColumn) + [DEAD_STATE])
+        self.stats['states'] += 1
+        return stateID
+
+    def getStateLength(self) -> int:
+        """
+        Number of DFA states in the cache
+        """
+        return len(self.rows)
+
+    def setTokenizer(self, tokenizerFunction: Callable[[str], List[str]]):
+        self.tokenizer = tokenizerFunction
+
+    def moveNFAStates(self, nfaStates: FrozenSet[int], column: int) -> FrozenSet[int]:
+        reachableStates: Set[int] = set()
+        if column == self.unknownColumn:
+            return frozenset(reachableStates)
+        for nfaState in nfaStates:
+            movesOfState = self.closedMoves.get(nfaState)
+            if movesOfState is None:
+                continue
+            for label in self.labelsOfColumn[column]:
+                reachableStates.update(movesOfState.get(label, ()))
+        return frozenset(reachableStates)
+
+    def step(self, stateID: int, column: int) -> Optional[int]:
+        """
+        Next DFA state on a column, determinize it if it is the first time we go this way, None if the cache is full
+        """
+        nextStateID = self.rows[stateID][column]
+        if nextStateID != UNKNOWN_STATE:
+            return nextStateID
+        reachableStates = self.moveNFAStates(self.nfaStatesOfState[stateID], column)
+        nextStateID = self.getDFAState(reachableStates) if len(reachableStates) != 0 else DEAD_STATE
+        if nextStateID is not None:
+            self.rows[stateID][column] = nextStateID
+        return nextStateID
+
+    def execute(self, input: Union[str, List[str]]) -> bool:
+        """
+        test whether all tokens of input can let automata go from initial state to final state
+        """
+        tokens = self.tokenizer(input) if isinstance(input, str) else input
+        rows = self.rows
+        stateID = self.startState
+        for position, token in enumerate(tokens):
+            column = self.getColumn(token)
+            nextStateID = rows[stateID][column]
+            if nextStateID == UNKNOWN_STATE:
+                nextStateID = self.step(stateID, column)
+                if nextStateID is None:
+                    nfaStates = self.nfaStatesOfState[stateID]
+                    if self.tokensSinceFlush + position < self.maxStates * MIN_TOKENS_PER_STATE and self.stats['flushes'] != 0:
+                        self.stats['nfaFallbacks'] += 1
+                        self.tokensSinceFlush += position
+                        return self.simulate(nfaStates, tokens[position:])
+                    self.stats['flushes'] += 1
+                    self.flush()
+                    # tokens before the flush don't count for the new cache
+                    self.tokensSinceFlush = -position
+                    rows = self.rows
+                    stateID = self.getDFAState(nfaStates)
+                    nextStateID = self.step(stateID, column)
+            if nextStateID == DEAD_STATE:
+                self.tokensSinceFlush += position + 1
+                return False
+            stateID = nextStateID
+        self.tokensSinceFlush += len(tokens)
+        return self.isFinalOfState[stateID]
+
+    def simulate(self, nfaStates: FrozenSet[int], tokens: Sequence[str]) -> bool:
+        """
+        Run the NFA from nfaStates without building DFA states
+        """
+        for token in tokens:
+            nfaStates = self.moveNFAStates(nfaStates, self.getColumn(token))
+            if len(nfaStates) == 0:
+                return False
+        return not self.finalStates.isdisjoint(nfaStates)
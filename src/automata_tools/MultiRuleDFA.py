@@ -0,0 +1,204 @@
+from typing import Dict, List, Optional, Set, Union, Callable, FrozenSet, Sequence, Tuple
+import numpy as np
+
+from automata_tools.Automata import Automata
+from automata_tools.TokenClassifier import TokenClassifier
+from automata_tools.TokenColumns import TokenColumns, getWildcards
+from automata_tools.constants import DEAD_STATE, EPSILON, MIN_TOKENS_PER_STATE, UNKNOWN_STATE
+
+
+class MultiRuleDFA(TokenColumns):
+    """
+    Many rules determinized into one DFA, like RE2::Set or Aho-Corasick, so one pass over the tokens tells every rule that matches.
+
+    Each DFA state is a set of states of the union of all rule NFAs, and carries the IDs of rules whose final state is in the set. A token consumes transitions on itself and on its wildcard (given by classifier) at the same time, so there is no ambiguity left when executing.
+
+    Rules like "$* aaa $? bbb $*" can be half matched at the same time, the full DFA needs a state for each combination of them, so it is exponential in the number of rules. So DFA transitions are determinized on demand, the first time an input goes through them, and reused after that. Same as LazyDFA, at most maxStates DFA states are kept, the cache is flushed when a new one doesn't fit, and if it doesn't pay off (fewer than MIN_TOKENS_PER_STATE tokens per state since the last flush), the rest of the input is run by NFA simulation, so memory stays bounded in a long running process.
+
+    By default a rule matches as soon as its final state is reached, same as the backtracking executor, so a rule matches if it matches a prefix of the tokens. States of a matched rule are dropped from the DFA state, otherwise rules ending with "$*" keep all their states alive and multiply the number of DFA states. With fullMatch, a rule must match all tokens.
+    """
+
+    ruleNames: List[str]
+    rows: List[List[int]]  # next state of each column, UNKNOWN_STATE if not determinized yet
+    rulesOfState: List[FrozenSet[int]]
+    startState: int
+    stats: Dict[str, int]
+    tokenizer: Callable[[str], List[str]]
+
+    def __init__(self,
+                 automataOfRules: Dict[str, Automata],
+                 classifier: Optional[TokenClassifier] = None,
+                 fullMatch: bool = False,
+                 maxStates: int = 10000):
+        if maxStates < 3:
+            raise BaseException("maxStates should be at least 3, to keep the start state, the current state and the next one")
+        self.ruleNames = list(automataOfRules.keys())
+        self.fullMatch = fullMatch
+        self.maxStates = maxStates
+        self.tokenizer = lambda input: input.split(' ')
+
+        # union of all rule NFA, state 0 goes to start state of each rule by ε
+        union = Automata()
+        union.setStartState(0)
+        rulesOfNFAState: Dict[int, Set[int]] = dict()
+        ruleOfNFAState: Dict[int, int] = dict()
+        nextState = 1
+        for ruleID, ruleName in enumerate(self.ruleNames):
+            [renumbered, nextState] = automataOfRules[ruleName].withNewStateNumber(nextState)
+            union.addTransition(0, renumbered.startstate, EPSILON)
+            union.addTransitionsByDict(renumbered.transitions)
+            for state in renumbered.states:
+                union.states.add(state)
+                ruleOfNFAState[state] = ruleID
+            for finalState in renumbered.finalStates:
+                rulesOfNFAState.setdefault(finalState, set()).add(ruleID)
+
+        labels: Set[str] = set()
+        for toStates in union.transitions.values():
+            for transitionTokens in toStates.values():
+                labels.update(transitionTokens)
+        wildcards = getWildcards(classifier=classifier)
+        TokenColumns.__init__(self, TokenColumns.getAlphabet(labels, wildcards), wildcards, classifier=classifier)
+        self.labelsOfColumn = self.getLabelsOfColumns()
+
+        self.closedMoves: Dict[int, Dict[str, FrozenSet[int]]] = union.getClosedMoves()
+        self.rulesOfNFAState = rulesOfNFAState
+        self.ruleOfNFAState = ruleOfNFAState
+        self.startNFAStates = union.getEClosures()[0]
+        self.stats = {'states': 0, 'flushes': 0, 'nfaFallbacks': 0}
+        self.flush()
+
+    def flush(self):
+        """
+        Drop all DFA states except the start state
+        """
+        # DFA state is keyed by the NFA states to go on with, and the rules it accepts
+        self.dfaStates: Dict[Tuple[FrozenSet[int], FrozenSet[int]], int] = dict()
+        self.nfaStatesOfState: List[FrozenSet[int]] = []
+        self.rulesOfState = []
+        self.rows = []
+        # number of tokens executed since the last flush
+        self.tokensSinceFlush = 0
+        self.startState = self.getDFAState(*self.getStateKey(self.startNFAStates))  # type: ignore
+
+    def getStateKey(self, nfaStates: FrozenSet[int]) -> Tuple[FrozenSet[int], FrozenSet[int]]:
+        """
+        (NFA states to go on with, rules accepted) of the NFA states reached
+        """
+        matchedRules = frozenset(ruleID for nfaState in nfaStates for ruleID in self.rulesOfNFAState.get(nfaState, ()))
+        if not self.fullMatch and len(matchedRules) != 0:
+            nfaStates = frozenset(nfaState for nfaState in nfaStates if self.ruleOfNFAState.get(nfaState) not in matchedRules)
+        return nfaStates, matchedRules
+
+    def getDFAState(self, nfaStates: FrozenSet[int], matchedRules: FrozenSet[int]) -> Optional[int]:
+        """
+        DFA state of the key, None if it is not in the cache and the cache is full
+        """
+        key = (nfaStates, matchedRules)
+        stateID = self.dfaStates.get(key)
+        if stateID is not None:
+            return stateID
+        if len(self.rows) >= self.maxStates:
+            return None
+        stateID = len(self.rows)
+        self.dfaStates[key] = stateID
+        self.nfaStatesOfState.append(nfaStates)
+        self.rulesOfState.append(matchedRules)
+        self.rows.append([UNKNOWN_STATE] * len(self.labelsOfColumn) + [DEAD_STATE])
+        self.stats['states'] += 1
+        return stateID
+
+    def moveNFAStates(self, nfaStates: FrozenSet[int], column: int) -> FrozenSet[int]:
+        reachableStates: Set[int] = set()
+        if column == self.unknownColumn:
+            return frozenset(reachableStates)
+        for nfaState in nfaStates:
+            movesOfState = self.closedMoves.get(nfaState)
+            if movesOfState is None:
+                continue
+            for label in self.labelsOfColumn[column]:
+                reachableStates.update(movesOfState.get(label, ()))
+        return frozenset(reachableStates)
+
+    def step(self, stateID: int, column: int) -> Optional[int]:
+        """
+        Next DFA state on a column, determinize it if it is the first time we go this way, None if the cache is full
+        """
+        nextStateID = self.rows[stateID][column]
+        if nextStateID != UNKNOWN_STATE:
+            return nextStateID
+        reachableStates = self.moveNFAStates(self.nfaStatesOfState[stateID], column)
+        nextStateID = self.getDFAState(*self.getStateKey(reachableStates)) if len(reachableStates) != 0 else DEAD_STATE
+        if nextStateID is not None:
+            self.rows[stateID][column] = nextStateID
+        return nextStateID
+
+    def determinize(self) -> np.ndarray:
+        """
+        Determinize all reachable DFA states, and return the full next state table, may be exponentially large, raise if it has more than maxStates states
+        """
+        stateID = 0
+        while stateID < len(self.rows):
+            for column in range(len(self.labelsOfColumn)):
+                if self.step(stateID, column) is None:
+                    raise BaseException(f"Full DFA has more than {self.maxStates} states")
+            stateID += 1
+        return np.array(self.rows, dtype=np.int32).reshape(len(self.rows), len(self.labelsOfColumn) + 1)
+
+    def getStateLength(self) -> int:
+        """
+        Number of DFA states in the cache
+        """
+        return len(self.rulesOfState)
+
+    def setTokenizer(self, tokenizerFunction: Callable[[str], List[str]]):
+        self.tokenizer = tokenizerFunction
+
+    def match(self, input: Union[str, List[str]]) -> List[str]:
+        """
+        Names of all rules that match the input, in one pass
+        """
+        tokens = self.tokenizer(input) if isinstance(input, str) else input
+        stateID: Optional[int] = self.startState
+        matchedRules: Set[int] = set(self.rulesOfState[stateID])  # type: ignore
+        for position, token in enumerate(tokens):
+            column = self.getColumn(token)
+            nextStateID = self.step(stateID, column)  # type: ignore
+            if nextStateID is None:
+                nfaStates, rulesOfCurrentState = self.nfaStatesOfState[stateID], self.rulesOfState[stateID]  # type: ignore
+                if self.tokensSinceFlush + position < self.maxStates * MIN_TOKENS_PER_STATE and self.stats['flushes'] != 0:
+                    self.stats['nfaFallbacks'] += 1
+                    self.tokensSinceFlush += position
+                    return self.simulate(nfaStates, rulesOfCurrentState, tokens[position:], matchedRules)
+                self.stats['flushes'] += 1
+                self.flush()
+                # tokens before the flush don't count for the new cache
+                self.tokensSinceFlush = -position
+                stateID = self.getDFAState(nfaStates, rulesOfCurrentState)
+                nextStateID = self.step(stateID, column)  # type: ignore
+            if nextStateID == DEAD_STATE:
+                stateID = None
+                self.tokensSinceFlush += position + 1
+                break
+            stateID = nextStateID
+            matchedRules.update(self.rulesOfState[stateID])  # type: ignore
+        else:
+            self.tokensSinceFlush += len(tokens)
+        if self.fullMatch:
+            matchedRules = set(self.rulesOfState[stateID]) if stateID is not None else set()
+        return [self.ruleNames[ruleID] for ruleID in sorted(matchedRules)]
+
+    def simulate(self, nfaStates: FrozenSet[int], rulesOfState: FrozenSet[int], tokens: Sequence[str], matchedRules: Set[int]) -> List[str]:
+        """
+        Run the union NFA from nfaStates without building DFA states
+        """
+        for token in tokens:
+            reachableStates = self.moveNFAStates(nfaStates, self.getColumn(token))
+            if len(reachableStates) == 0:
+                rulesOfState = frozenset()
+                break
+            nfaStates, rulesOfState = self.getStateKey(reachableStates)
+            matchedRules.update(rulesOfState)
+        if self.fullMatch:
+            matchedRules = set(rulesOfState)
+        return [self.ruleNames[ruleID] for ruleID in sorted(matchedRules)]
@@ -1,47 +1,60 @@
-from typing import Dict, Set, List, Tuple
+from typing import Dict, Set, List, Tuple, FrozenSet, Union
 from math import floor
 
 from automata_tools.Automata import Automata, GroupMetadata
 from automata_tools.BuildAutomata import BuildAutomata
 from automata_tools.DFAtoMinimizedDFA import DFAtoMinimizedDFA
+from automata_tools.NFAtoSimplifiedNFA import NFAtoSimplifiedNFA
+from automata_tools.constants import CAPTURE_END, CAPTURE_START
 from automata_tools.utils import drawGraph
 
 
-def NFAtoDFA(nfa: Automata, minify: bool = True) -> Automata:
-    stateTranslator: Dict[Set[int]] = dict() # from new state to old states, 1 to many { 1: {1}, 2: {2, 3, 4, 6}, 3: {8, 9, 7}, 4: {8, 9, 5}, 5: {10, 11}, 6: {12} }
-    eClosure = dict()
+def NFAtoDFA(nfa: Automata, minify: Union[bool, str] = True, simplify: bool = False) -> Automata:
+    """
+    Subset construction. Each DFA state is a frozenset of NFA states, and is looked up in a hash map, so we don't need to scan all existing DFA states for every (state, token) pair.
+
+    minify can be True (use Hopcroft algorithm), False, or the name of algorithm used by DFAtoMinimizedDFA
+
+    If simplify, NFA is shrunk by NFAtoSimplifiedNFA first, so DFA states are sets of fewer NFA states, and there are fewer DFA states to minify. It is off by default, on rules built by the DSL it saves little or nothing once minify is counted, see the simplifyNFA benchmark
+    """
+    if simplify:
+        nfa = NFAtoSimplifiedNFA(nfa)
+    # ε closure of every NFA state, and states reachable by each token with their ε closure, computed once and cached on the NFA
+    eClosure = nfa.getEClosures()
+    closedMoves = nfa.getClosedMoves()
+    language = nfa.language
+    # from old states to new state, many to 1 { frozenset({1}): 1, frozenset({2, 3, 4, 6}): 2, ... }
+    stateTranslator: Dict[FrozenSet[int], int] = dict()
     newStateCounter = 1
-    state1 = nfa.getEClosure(nfa.startstate)
-    eClosure[nfa.startstate] = state1
+    state1 = eClosure[nfa.startstate]
     dfa = Automata(nfa.language)
     dfa.setStartState(newStateCounter)
-    states = [[state1, newStateCounter]]
-    stateTranslator[newStateCounter] = state1
+    states: List[Tuple[FrozenSet[int], int]] = [(state1, newStateCounter)]
+    stateTranslator[state1] = newStateCounter
     newStateCounter += 1
     while len(states) != 0:
-        [state, fromindex] = states.pop()
-        for char in sorted(dfa.language):
-            reachableStates = nfa.getReachableStates(state, char)
-            for reachableState in list(reachableStates)[:]:
-                if reachableState not in eClosure:
-                    eClosure[reachableState] = nfa.getEClosure(reachableState)
-                reachableStates = reachableStates.union(eClosure[reachableState])
-            if len(reachableStates) != 0:
-                if reachableStates not in stateTranslator.values():
-                    states.append([reachableStates, newStateCounter])
-                    stateTranslator[newStateCounter] = reachableStates
-                    toIndex = newStateCounter
-                    newStateCounter += 1
-                else:
-                    toIndex = [
-                        k for k, v in sorted(stateTranslator.items()) if v == reachableStates
-                    ][0]
-                dfa.addTransition(fromindex, toIndex, char)
-    for dfaState, correspondingNfaStates in sorted(stateTranslator.items()):
-        for finalState in nfa.finalStates:
-            if finalState in correspondingNfaStates:
-                dfa.addfinalStates(dfaState)
-    return DFAtoMinimizedDFA(dfa) if minify else dfa
+        (state, fromindex) = states.pop()
+        reachableStatesByToken: Dict[str, Set[int]] = dict()
+        for nfaState in state:
+            for char, reachable in closedMoves.get(nfaState, {}).items():
+                if char in language:
+                    reachableStatesByToken.setdefault(char, set()).update(reachable)
+        for char in sorted(reachableStatesByToken):
+            reachableStates = frozenset(reachableStatesByToken[char])
+            toIndex = stateTranslator.get(reachableStates)
+            if toIndex is None:
+                toIndex = newStateCounter
+                newStateCounter += 1
+                stateTranslator[reachableStates] = toIndex
+                states.append((reachableStates, toIndex))
+            dfa.addTransition(fromindex, toIndex, char)
+    finalStates = set(nfa.finalStates)
+    for correspondingNfaStates, dfaState in sorted(stateTranslator.items(), key=lambda item: item[1]):
+        if not finalStates.isdisjoint(correspondingNfaStates):
+            dfa.addfinalStates(dfaState)
+    if not minify:
+        return dfa
+    return DFAtoMinimizedDFA(dfa) if minify is True else DFAtoMinimizedDFA(dfa, minify)
 
 def NFAtoDFAGroupStable(nfa: Automata) -> Automata:
     """
@@ -51,20 +64,21 @@ def NFAtoDFAGroupStable(nfa: Automata) -> Automata:
     """
     if len(nfa.groups) == 0:
         return NFAtoDFA(nfa)
-    splitNFAAutomata: List[Automata] = nfa.splitNFA([nfa.groups[0].startState, nfa.groups[0].finalState])
+    groups = sorted(nfa.groups, key=lambda group: group.startState)
+    for group, nextGroup in zip(groups, groups[1:]):
+        if nextGroup.startState <= group.finalState:
+            raise BaseException(f"Capture group {nextGroup.groupName} is nested in {group.groupName}, only top level groups are supported")
+    # NFA between groups and NFA of each group, alternately, split at start and final state of each group
+    splitNFAAutomata: List[Automata] = nfa.splitNFA([state for group in groups for state in [group.startState, group.finalState]])
     concatenatedDFA = NFAtoDFA(splitNFAAutomata[0])
     for index, automataToConcat in enumerate(splitNFAAutomata):
         if index >= 1:
-            currentGroup = nfa.groups[floor((index - 1) / 2)]
-            startEndDescriptor = 'End' if (index + 1) % 2 else 'Start'
-            edgeName = f'Capture{startEndDescriptor}-{currentGroup.groupName}'
+            currentGroup = groups[floor((index - 1) / 2)]
+            isGroup = index % 2 == 1
+            edgeName = f'{CAPTURE_START if isGroup else CAPTURE_END}{currentGroup.groupName}'
             subDFA = NFAtoDFA(automataToConcat)
+            # restore group metadata, concatenationStruct renumbers it with the states
+            if isGroup:
+                subDFA.setAsGroup(currentGroup.groupName)
             concatenatedDFA = BuildAutomata.concatenationStruct(concatenatedDFA, subDFA, edgeName)
-    # restore group metadata
-    newGroups: List[GroupMetadata] = []
-    for groupIndex, group in enumerate(nfa.groups):
-        # when doing last NFAtoDFA(), we remove 1 ε before each group, and 1 ε after each group
-        offsetOfGroupStart = groupIndex * 2
-        offsetOfGroupEnd = offsetOfGroupStart + 1
-
-    return concatenatedDFA
\ No newline at end of file
+    return concatenatedDFA
@@ -0,0 +1,136 @@
+from typing import Dict, FrozenSet, List, Optional, Set, Tuple
+
+from automata_tools.Automata import Automata
+from automata_tools.constants import EPSILON
+
+# (is final, ((token, target states), ...)), states with same signature accept same tokens from there, or are reached by same tokens from same states
+IStateSignature = Tuple[bool, Tuple[Tuple[str, FrozenSet[int]], ...]]
+
+
+def getAutomataSize(automata: Automata) -> Tuple[int, int]:
+    """
+    (number of states, number of edges), an edge is a (from state, to state, token) triple
+    """
+    edgeCount = sum(len(transitionTokens) for toStates in automata.transitions.values() for transitionTokens in toStates.values())
+    return len(automata.states), edgeCount
+
+
+def NFAtoSimplifiedNFA(nfa: Automata, stats: Optional[Dict[str, int]] = None) -> Automata:
+    """
+    Shrink a Thompson NFA before subset construction, the result accepts same tokens:
+
+    1. ε elimination: only the start state and states entered by a token are kept, each of them takes the token transitions of all states in its ε closure, and is final if its ε closure has a final state.
+    2. States not reachable from the start state, and dead states that can't reach a final state, are dropped.
+    3. Equivalent states are merged until nothing changes: states with same finality and same outgoing transitions, and states (except the start state) with same incoming transitions.
+
+    Group metadata is not kept, same as NFAtoDFA. If stats is given, statesBefore, edgesBefore, statesAfter and edgesAfter are written into it.
+    """
+    if not isinstance(nfa.startstate, int):
+        raise BaseException(
+            "startstate is not a interger, please init this automata properly"
+        )
+    moves = nfa.getMoves()
+    eClosure = nfa.getEClosures()
+    nfaFinalStates = set(nfa.finalStates)
+    # 1. ε elimination, state -> token -> states
+    transitions: Dict[int, Dict[str, Set[int]]] = dict()
+    finalStates: Set[int] = set()
+    stack = [nfa.startstate]
+    visited = {nfa.startstate}
+    while len(stack) != 0:
+        state = stack.pop()
+        closure = eClosure.get(state, frozenset([state]))
+        if not nfaFinalStates.isdisjoint(closure):
+            finalStates.add(state)
+        movesOfState: Dict[str, Set[int]] = dict()
+        for closureState in closure:
+            for token, reachable in moves.get(closureState, {}).items():
+                if token != EPSILON:
+                    movesOfState.setdefault(token, set()).update(reachable)
+        transitions[state] = movesOfState
+        for reachable in movesOfState.values():
+            for toState in reachable:
+                if toState not in visited:
+                    visited.add(toState)
+                    stack.append(toState)
+
+    # 2. everything in transitions is reachable now, drop states that can't reach a final state
+    incoming: Dict[int, Set[int]] = dict()
+    for fromState, movesOfState in transitions.items():
+        for reachable in movesOfState.values():
+            for toState in reachable:
+                incoming.setdefault(toState, set()).add(fromState)
+    alive = set(finalStates)
+    stack = list(finalStates)
+    while len(stack) != 0:
+        state = stack.pop()
+        for fromState in incoming.get(state, ()):
+            if fromState not in alive:
+                alive.add(fromState)
+                stack.append(fromState)
+    alive.add(nfa.startstate)
+    transitions = {
+        fromState: {token: reachable & alive for token, reachable in movesOfState.items() if not reachable.isdisjoint(alive)}
+        for fromState, movesOfState in transitions.items() if fromState in alive
+    }
+
+    # 3. merge equivalent states, each pass redirects merged states to the representative of their class
+    startState = nfa.startstate
+    changed = True
+    while changed:
+        changed = False
+        for direction in ['outgoing', 'incoming']:
+            signatureTransitions = transitions if direction == 'outgoing' else reverseTransitions(transitions)
+            representativeOfSignature: Dict[IStateSignature, int] = dict()
+            representative: Dict[int, int] = dict()
+            for state in sorted(transitions):
+                signature: IStateSignature = (
+                    state in finalStates if direction == 'outgoing' else False,
+                    tuple(sorted((token, frozenset(reachable)) for token, reachable in signatureTransitions.get(state, {}).items())),
+                )
+                if direction == 'incoming' and state == startState:
+                    representative[state] = state
+                    continue
+                representative[state] = representativeOfSignature.setdefault(signature, state)
+            if all(state == kept for state, kept in representative.items()):
+                continue
+            changed = True
+            mergedTransitions: Dict[int, Dict[str, Set[int]]] = dict()
+            for fromState, movesOfState in transitions.items():
+                mergedMoves = mergedTransitions.setdefault(representative[fromState], dict())
+                for token, reachable in movesOfState.items():
+                    mergedMoves.setdefault(token, set()).update(representative[toState] for toState in reachable)
+            transitions = mergedTransitions
+            finalStates = {representative[state] for state in finalStates if state in representative}
+            startState = representative[startState]
+
+    # number states from 1 in order of first visit, so same NFA always gives same result
+    simplified = Automata(nfa.language)
+    stateNumber: Dict[int, int] = {startState: 1}
+    order: List[int] = [startState]
+    for state in order:
+        for token in sorted(transitions[state]):
+            for toState in sorted(transitions[state][token]):
+                if toState not in stateNumber:
+                    stateNumber[toState] = len(order) + 1
+                    order.append(toState)
+    simplified.setStartState(1)
+    for state in order:
+        for token in sorted(transitions[state]):
+            for toState in sorted(transitions[state][token]):
+                simplified.addTransition(stateNumber[state], stateNumber[toState], token)
+    simplified.addfinalStates([stateNumber[state] for state in order if state in finalStates])
+
+    if stats is not None:
+        stats['statesBefore'], stats['edgesBefore'] = getAutomataSize(nfa)
+        stats['statesAfter'], stats['edgesAfter'] = getAutomataSize(simplified)
+    return simplified
+
+
+def reverseTransitions(transitions: Dict[int, Dict[str, Set[int]]]) -> Dict[int, Dict[str, Set[int]]]:
+    reversedTransitions: Dict[int, Dict[str, Set[int]]] = dict()
+    for fromState, movesOfState in transitions.items():
+        for token, reachable in movesOfState.items():
+            for toState in reachable:
+                reversedTransitions.setdefault(toState, dict()).setdefault(token, set()).add(fromState)
+    return reversedTransitions
@@ -0,0 +1,224 @@
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple, Union
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import numpy as np
+
+from automata_tools.Automata import Automata
+from automata_tools.AutomataFile import FORMAT_VERSION, AutomataFileError
+from automata_tools.CompiledDFA import CompiledDFA
+from automata_tools.SparseTransitionTensor import SparseTransitionTensor
+from automata_tools.TokenClassifier import TokenClassifier
+from automata_tools.WFA import WFA
+from automata_tools.constants import BUILDER_VERSION, LIBRARY_VERSION
+
+# bump this when the layout of cached files changes
+CACHE_FORMAT_VERSION = 2
+# errors of loading a truncated or broken entry, the entry is dropped and built again
+BROKEN_ENTRY_ERRORS = (AutomataFileError, OSError, ValueError, KeyError, IndexError)
+
+
+class RuleCache:
+    """
+    Cache of automata built from rules, so we don't rebuild every rule (parse → NFA → DFA → minimized DFA) on every startup.
+
+    Entries are content-addressed by a hash of the rule, the namespace (which build function is used), the library version and BUILDER_VERSION, so a new version of this library, or of its builders, never loads automata built by an old one. There are two tiers: an in-process LRU of at most maxSize automata, and an optional cacheDirectory, where each entry is a file saved by Automata.save and loaded with mmap. DFAs are saved with their compiled table (using defaultToken or classifier), so getCompiled loads it without copying. WFA tensors can be cached too, see getWFA.
+    """
+
+    def __init__(self,
+                 buildFunction: Callable[[str], Automata],
+                 cacheDirectory: Optional[str] = None,
+                 maxSize: int = 128,
+                 namespace: Optional[str] = None,
+                 defaultToken: Optional[str] = None,
+                 classifier: Optional[TokenClassifier] = None):
+        self.buildFunction = buildFunction
+        self.defaultToken = defaultToken
+        self.classifier = classifier
+        self.cacheDirectory = cacheDirectory
+        self.maxSize = maxSize
+        self.namespace = namespace if namespace is not None else f"{buildFunction.__module__}.{buildFunction.__qualname__}"
+        self.memoryCache: 'OrderedDict[str, Union[Automata, CompiledDFA]]' = OrderedDict()
+        self.stats = {'memory': 0, 'disk': 0, 'build': 0}
+        if cacheDirectory is not None:
+            os.makedirs(cacheDirectory, exist_ok=True)
+
+    def getKey(self, rule: str) -> str:
+        content = json.dumps([LIBRARY_VERSION, BUILDER_VERSION, CACHE_FORMAT_VERSION, FORMAT_VERSION, self.namespace, self.defaultToken, self.classifier.wildcards if self.classifier is not None else None, rule])
+        return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+    def getEntryPath(self, rule: str) -> Optional[str]:
+        if self.cacheDirectory is None:
+            return None
+        return os.path.join(self.cacheDirectory, self.getKey(rule) + '.automata')
+
+    def getFromMemory(self, key: str):
+        if key not in self.memoryCache:
+            return None
+        self.memoryCache.move_to_end(key)
+        self.stats['memory'] += 1
+        return self.memoryCache[key]
+
+    def putToMemory(self, key: str, value: Union[Automata, CompiledDFA]):
+        self.memoryCache[key] = value
+        if len(self.memoryCache) > self.maxSize:
+            self.memoryCache.popitem(last=False)
+
+    def get(self, rule: str) -> Automata:
+        """
+        Get automata of the rule from memory, then from disk, and build it if both missed. The same Automata object is returned for the same rule while it is in memory, don't mutate it.
+        """
+        key = self.getKey(rule)
+        automata = self.getFromMemory(key)
+        if automata is not None:
+            return automata
+        entryPath = self.getEntryPath(rule)
+        if entryPath is not None:
+            automata = self.loadEntry(entryPath, Automata.load)
+        if automata is None:
+            automata = self.build(rule, entryPath)
+        self.putToMemory(key, automata)
+        return automata
+
+    def getCompiled(self, rule: str) -> CompiledDFA:
+        """
+        CompiledDFA of the rule, with the defaultToken or classifier of this cache. It is loaded from the mmap of the cached file, so worker processes share the same pages.
+        """
+        key = 'compiled-' + self.getKey(rule)
+        compiled = self.getFromMemory(key)
+        if compiled is not None:
+            return compiled
+        entryPath = self.getEntryPath(rule)
+        if entryPath is None:
+            compiled = self.get(rule).compile(self.defaultToken, self.classifier)
+        else:
+            compiled = self.loadEntry(entryPath, lambda path: CompiledDFA.load(path, self.classifier))
+            if compiled is None:
+                self.build(rule, entryPath)
+                compiled = CompiledDFA.load(entryPath, self.classifier)
+        self.putToMemory(key, compiled)
+        return compiled
+
+    def loadEntry(self, entryPath: str, load: Callable[[str], Any]) -> Any:
+        """
+        Load an entry from disk, None if it doesn't exist, or if it is truncated or broken, then it is removed so it will be built again
+        """
+        if not os.path.isfile(entryPath):
+            return None
+        try:
+            loaded = load(entryPath)
+        except BROKEN_ENTRY_ERRORS:
+            removeEntry(entryPath)
+            return None
+        self.stats['disk'] += 1
+        return loaded
+
+    def build(self, rule: str, entryPath: Optional[str]) -> Automata:
+        automata = self.buildFunction(rule)
+        self.stats['build'] += 1
+        if entryPath is not None:
+            writeEntry(entryPath, lambda path: automata.save(path, self.defaultToken, self.classifier))
+        return automata
+
+    def getWFA(self, rule: str, word2index: Dict[str, int],
+               dfa_to_tensor: Callable) -> WFA:
+        """
+        WFA of the rule, its tensor is cached on disk by the vocabulary and dfa_to_tensor function, and loaded with mmap
+        """
+        dfa = self.get(rule)
+        if self.cacheDirectory is None:
+            return WFA(dfa, word2index, dfa_to_tensor, self.classifier)
+        vocabularyContent = json.dumps([f"{dfa_to_tensor.__module__}.{dfa_to_tensor.__qualname__}", sorted(word2index.items())])
+        tensorDirectory = os.path.join(self.cacheDirectory, self.getKey(rule) + '.tensor-' + hashlib.sha256(vocabularyContent.encode('utf-8')).hexdigest())
+
+        def cachedDFAToTensor(automata, word2idx: Dict[str, int]):
+            if os.path.isdir(tensorDirectory):
+                try:
+                    return loadTensor(tensorDirectory)
+                except BROKEN_ENTRY_ERRORS:
+                    removeEntry(tensorDirectory)
+            tensorTuple = dfa_to_tensor(automata, word2idx)
+            writeEntry(tensorDirectory, lambda directory: saveTensor(tensorTuple, directory), isDirectory=True)
+            return tensorTuple
+
+        return WFA(dfa, word2index, cachedDFAToTensor, self.classifier)
+
+    def invalidate(self, rule: str):
+        """
+        Drop the rule from both tiers, so it will be rebuilt next time
+        """
+        key = self.getKey(rule)
+        self.memoryCache.pop(key, None)
+        self.memoryCache.pop('compiled-' + key, None)
+        if self.cacheDirectory is not None:
+            for entryName in os.listdir(self.cacheDirectory):
+                if entryName.startswith(key):
+                    removeEntry(os.path.join(self.cacheDirectory, entryName))
+
+    def clear(self):
+        self.memoryCache.clear()
+        if self.cacheDirectory is not None:
+            for entryName in os.listdir(self.cacheDirectory):
+                removeEntry(os.path.join(self.cacheDirectory, entryName))
+
+
+def writeEntry(entryPath: str, save: Callable[[str], None], isDirectory: bool = False):
+    """
+    Write into a temporary file or directory then rename it, so other processes never see a half written entry
+    """
+    parentDirectory = os.path.dirname(entryPath)
+    if isDirectory:
+        temporaryPath = tempfile.mkdtemp(dir=parentDirectory, prefix='.writing-')
+    else:
+        fileDescriptor, temporaryPath = tempfile.mkstemp(dir=parentDirectory, prefix='.writing-')
+        os.close(fileDescriptor)
+    try:
+        save(temporaryPath)
+        if isDirectory:
+            os.rename(temporaryPath, entryPath)
+        else:
+            os.replace(temporaryPath, entryPath)
+    except OSError:
+        # another process has written the same entry
+        removeEntry(temporaryPath)
+
+
+def removeEntry(entryPath: str):
+    if os.path.isdir(entryPath):
+        shutil.rmtree(entryPath, ignore_errors=True)
+    elif os.path.exists(entryPath):
+        os.remove(entryPath)
+
+
+def saveTensor(tensorTuple: Tuple, directory: str):
+    tensor, state2idx, wildcardMatrix, language = tensorTuple
+    if isinstance(tensor, SparseTransitionTensor):
+        for arrayName in ['indptr', 'fromStates', 'toStates', 'weights']:
+            np.save(os.path.join(directory, f"{arrayName}.npy"), getattr(tensor, arrayName))
+        shape = list(tensor.shape)
+    else:
+        np.save(os.path.join(directory, 'tensor.npy'), tensor)
+        shape = None
+    np.save(os.path.join(directory, 'wildcardMatrix.npy'), wildcardMatrix)
+    with open(os.path.join(directory, 'tensor.json'), 'w', encoding='utf-8') as metadataFile:
+        json.dump({
+            'sparseShape': shape,
+            'state2idx': [[state, index] for state, index in state2idx.items()],
+            'language': list(language),
+        }, metadataFile, ensure_ascii=False)
+
+
+def loadTensor(directory: str) -> Tuple:
+    with open(os.path.join(directory, 'tensor.json'), encoding='utf-8') as metadataFile:
+        metadata = json.load(metadataFile)
+    if metadata['sparseShape'] is not None:
+        wordCount, stateCount, _ = metadata['sparseShape']
+        arrays = [np.load(os.path.join(directory, f"{arrayName}.npy"), mmap_mode='r') for arrayName in ['indptr', 'fromStates', 'toStates', 'weights']]
+        tensor = SparseTransitionTensor(wordCount, stateCount, *arrays)
+    else:
+        tensor = np.load(os.path.join(directory, 'tensor.npy'), mmap_mode='r')
+    wildcardMatrix = np.load(os.path.join(directory, 'wildcardMatrix.npy'), mmap_mode='r')
+    return tensor, {state: index for state, index in metadata['state2idx']}, wildcardMatrix, metadata['language']
@@ -0,0 +1,90 @@
+from typing import Dict, Iterable, Tuple
+import numpy as np
+
+
+class SparseTransitionTensor:
+    """
+    A V×S×S word transition tensor that only stores its edges, so memory scales with the number of edges instead of V·S².
+
+    Edges are kept in CSR layout grouped by word: edges of word w are fromStates[indptr[w]:indptr[w + 1]] -> toStates[indptr[w]:indptr[w + 1]], with their weights.
+    """
+
+    indptr: np.ndarray
+    fromStates: np.ndarray
+    toStates: np.ndarray
+    weights: np.ndarray
+
+    def __init__(self, wordCount: int, stateCount: int, indptr: np.ndarray,
+                 fromStates: np.ndarray, toStates: np.ndarray,
+                 weights: np.ndarray):
+        self.wordCount = wordCount
+        self.stateCount = stateCount
+        self.indptr = indptr
+        self.fromStates = fromStates
+        self.toStates = toStates
+        self.weights = weights
+
+    @staticmethod
+    def fromEdges(wordCount: int, stateCount: int,
+                  edges: Dict[int, Iterable[Tuple[int, int]]]) -> 'SparseTransitionTensor':
+        """
+        Build from { wordIndex: [(fromStateIndex, toStateIndex), ...] }, every edge has weight 1
+        """
+        edgeCounts = np.zeros(wordCount, dtype=np.int64)
+        sortedEdges = []
+        for wordIndex in sorted(edges):
+            edgesOfWord = sorted(set(edges[wordIndex]))
+            edgeCounts[wordIndex] = len(edgesOfWord)
+            sortedEdges.extend(edgesOfWord)
+        indptr = np.zeros(wordCount + 1, dtype=np.int64)
+        np.cumsum(edgeCounts, out=indptr[1:])
+        edgeArray = np.array(sortedEdges, dtype=np.int32).reshape(len(sortedEdges), 2)
+        return SparseTransitionTensor(wordCount, stateCount, indptr,
+                                      edgeArray[:, 0].copy(), edgeArray[:, 1].copy(),
+                                      np.ones(len(sortedEdges)))
+
+    @property
+    def shape(self) -> Tuple[int, int, int]:
+        return (self.wordCount, self.stateCount, self.stateCount)
+
+    @property
+    def nbytes(self) -> int:
+        return self.indptr.nbytes + self.fromStates.nbytes + self.toStates.nbytes + self.weights.nbytes
+
+    def getEdges(self, wordIndex: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        start, end = self.indptr[wordIndex], self.indptr[wordIndex + 1]
+        return self.fromStates[start:end], self.toStates[start:end], self.weights[start:end]
+
+    def __getitem__(self, wordIndex: int) -> np.ndarray:
+        """
+        Dense S×S transition matrix of a word, same as dense_tensor[wordIndex]
+        """
+        matrix = np.zeros((self.stateCount, self.stateCount))
+        fromStates, toStates, weights = self.getEdges(int(wordIndex))
+        np.add.at(matrix, (fromStates, toStates), weights)
+        return matrix
+
+    def toDense(self) -> np.ndarray:
+        return np.stack([self[wordIndex] for wordIndex in range(self.wordCount)]) if self.wordCount else np.zeros(self.shape)
+
+    def multiply(self, wordIndex: int, stateVector: np.ndarray) -> np.ndarray:
+        """
+        stateVector (S,) times the transition matrix of the word, i.e. np.dot(tensor[wordIndex].T, stateVector)
+        """
+        fromStates, toStates, weights = self.getEdges(int(wordIndex))
+        return np.bincount(toStates, weights=stateVector[fromStates] * weights, minlength=self.stateCount)
+
+    def multiplyBatch(self, wordIndexes: np.ndarray, stateMatrix: np.ndarray) -> np.ndarray:
+        """
+        Each row of stateMatrix (B, S) times the transition matrix of its own word in wordIndexes (B,)
+        """
+        batchSize = len(wordIndexes)
+        starts = self.indptr[wordIndexes]
+        edgeCounts = self.indptr[wordIndexes + 1] - starts
+        rowOfEdge = np.repeat(np.arange(batchSize), edgeCounts)
+        # position of each edge in self.fromStates / self.toStates
+        edgeOffsets = np.arange(len(rowOfEdge)) - np.repeat(np.cumsum(edgeCounts) - edgeCounts, edgeCounts)
+        edgeIndexes = np.repeat(starts, edgeCounts) + edgeOffsets
+        flatTargets = rowOfEdge * self.stateCount + self.toStates[edgeIndexes]
+        flatWeights = stateMatrix[rowOfEdge, self.fromStates[edgeIndexes]] * self.weights[edgeIndexes]
+        return np.bincount(flatTargets, weights=flatWeights, minlength=batchSize * self.stateCount).reshape(batchSize, self.stateCount)
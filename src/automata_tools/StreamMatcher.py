@@ -0,0 +1,162 @@
+from typing import Dict, FrozenSet, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+
+from automata_tools.Automata import Automata
+from automata_tools.TokenClassifier import TokenClassifier
+from automata_tools.TokenColumns import getWildcardOfToken
+
+
+class StreamMatcher:
+    """
+    Match a stream of tokens that is fed one at a time, like a live transcript or a log being tailed, instead of executing on a whole input.
+
+    It keeps the set of states the automata can be in, so it works on NFA as well as DFA, and memory is bounded by the number of states no matter how long the stream is. A token goes through transitions on itself, and on its wildcard (defaultToken, or the one given by classifier).
+
+    If anchored, the automata starts at the first token, and a match is reported every time a final state is reached (check isFinal before feeding anything for the empty match). Otherwise a new run starts on every token, so a match is reported at the end of every substring that matches.
+
+    finditer searches a whole tokenized document for match spans instead, so rules don't need to be wrapped in "$* ... $*".
+    """
+
+    position: int  # number of tokens fed
+    states: FrozenSet[int]
+
+    def __init__(self,
+                 automata: Automata,
+                 defaultToken: Optional[str] = None,
+                 classifier: Optional[TokenClassifier] = None,
+                 anchored: bool = True):
+        if not isinstance(automata.startstate, int):
+            raise BaseException(
+                "startstate is not a interger, please init this automata properly"
+            )
+        self.defaultToken = defaultToken
+        self.classifier = classifier
+        self.anchored = anchored
+        self.finalStates = frozenset(automata.finalStates)
+        # state -> token -> states reachable from it on the token, with their ε closure
+        self.closedMoves: Dict[int, Dict[str, FrozenSet[int]]] = automata.getClosedMoves()
+        self.startStates = automata.getEClosures()[automata.startstate]
+        self.reset()
+
+    def reset(self):
+        """
+        Go back to the start of the stream
+        """
+        self.position = 0
+        self.states = self.startStates
+
+    @property
+    def isFinal(self) -> bool:
+        return not self.finalStates.isdisjoint(self.states)
+
+    @property
+    def isAlive(self) -> bool:
+        """
+        False if anchored and no more token can lead to a match
+        """
+        return len(self.states) != 0 or not self.anchored
+
+    def feed(self, token: str) -> bool:
+        """
+        Consume a token, return True if a final state is reached on it
+        """
+        wildcard = getWildcardOfToken(token, self.defaultToken, self.classifier)
+        nextStates: Set[int] = set()
+        for state in self.states:
+            movesOfState = self.closedMoves.get(state)
+            if movesOfState is None:
+                continue
+            nextStates.update(movesOfState.get(token, ()))
+            if wildcard is not None and wildcard != token:
+                nextStates.update(movesOfState.get(wildcard, ()))
+        if not self.anchored:
+            nextStates.update(self.startStates)
+        self.states = frozenset(nextStates)
+        self.position += 1
+        return self.isFinal
+
+    def matches(self, tokens: Iterable[str]) -> Iterator[int]:
+        """
+        Feed tokens from an iterable or generator, yield the position (index in the whole stream) of every token where a match ends, as soon as it is fed
+        """
+        for token in tokens:
+            if self.feed(token):
+                yield self.position - 1
+            elif not self.isAlive:
+                return
+
+    def finditer(self, tokens: Sequence[str], mode: str = 'longest') -> Iterator[Tuple[int, int]]:
+        """
+        Yield (start, end) token offsets of non-overlapping matches in the document, from left to right, like re.finditer. Empty matches are skipped.
+
+        All start positions are tried in one pass, each state remembers the leftmost start that reaches it. When a match is found, we go on only with runs that can still give a better one: runs that started earlier, and in "longest" mode also runs with the same start that can end later. In "first" mode the leftmost match ends as soon as a final state is reached, same as the backtracking executor. Next search starts at the end of the match.
+
+        A backward pass first finds, at each position, the states that can still reach a final state on the rest of the document, runs in other states are dropped. So a search never scans past the end of the match it yields (a rule like "aaa | aaa $* zzz" would otherwise rescan the document after every "aaa"), and the whole document is scanned once in each direction.
+        """
+        if mode not in ['longest', 'first']:
+            raise BaseException(f"Unknown mode {mode}, should be longest or first")
+        closedMoves = self.closedMoves
+        finalStates = self.finalStates
+        labelsOfPosition = []
+        for token in tokens:
+            wildcard = getWildcardOfToken(token, self.defaultToken, self.classifier)
+            labelsOfPosition.append((token, wildcard) if wildcard is not None and wildcard != token else (token,))
+        aliveStatesOfPosition = self.getAliveStates(labelsOfPosition)
+        searchStart = 0
+        while searchStart < len(tokens):
+            startOfState: Dict[int, int] = dict()
+            match: Optional[Tuple[int, int]] = None
+            position = searchStart
+            while position < len(tokens):
+                aliveStates = aliveStatesOfPosition[position]
+                if match is None:
+                    for state in self.startStates:
+                        if state in aliveStates:
+                            startOfState.setdefault(state, position)
+                nextAliveStates = aliveStatesOfPosition[position + 1]
+                nextStartOfState: Dict[int, int] = dict()
+                for state, start in startOfState.items():
+                    movesOfState = closedMoves.get(state)
+                    if movesOfState is None:
+                        continue
+                    for label in labelsOfPosition[position]:
+                        for nextState in movesOfState.get(label, ()):
+                            if nextState in nextAliveStates and start < nextStartOfState.get(nextState, position + 1):
+                                nextStartOfState[nextState] = start
+                startOfState = nextStartOfState
+                position += 1
+                finalStarts = [start for state, start in startOfState.items() if state in finalStates]
+                if len(finalStarts) != 0:
+                    start = min(finalStarts)
+                    if match is None or start < match[0] or (mode == 'longest' and start == match[0]):
+                        match = (start, position)
+                if match is not None:
+                    matchStart = match[0]
+                    startOfState = {state: start for state, start in startOfState.items()
+                                    if start < matchStart or (mode == 'longest' and start == matchStart)}
+                    if len(startOfState) == 0:
+                        break
+            if match is None:
+                return
+            yield match
+            searchStart = match[1]
+
+    def getAliveStates(self, labelsOfPosition: Sequence[Tuple[str, ...]]) -> List[FrozenSet[int]]:
+        """
+        States at each position (0 to len(labelsOfPosition)) that are final, or can reach a final state by consuming tokens from there
+        """
+        reverseMoves: Dict[int, Dict[str, Set[int]]] = dict()
+        for fromState, movesOfState in self.closedMoves.items():
+            for label, toStates in movesOfState.items():
+                for toState in toStates:
+                    reverseMoves.setdefault(toState, dict()).setdefault(label, set()).add(fromState)
+        aliveStatesOfPosition: List[FrozenSet[int]] = [self.finalStates] * (len(labelsOfPosition) + 1)
+        for position in range(len(labelsOfPosition) - 1, -1, -1):
+            aliveStates = set(self.finalStates)
+            for state in aliveStatesOfPosition[position + 1]:
+                movesToState = reverseMoves.get(state)
+                if movesToState is None:
+                    continue
+                for label in labelsOfPosition[position]:
+                    aliveStates.update(movesToState.get(label, ()))
+            aliveStatesOfPosition[position] = frozenset(aliveStates)
+        return aliveStatesOfPosition
@@ -0,0 +1,51 @@
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional
+import numpy as np
+
+# a vocabulary of this size is classified only once, classifyFunction is called again for a token only after it is evicted
+DEFAULT_CACHE_SIZE = 1 << 16
+
+
+class TokenClassifier:
+    """
+    Tell which wildcard transition can consume a token, when there is no transition on the token itself.
+
+    For example in our custom rule, "$" consumes words, "%" consumes numbers and "&" consumes punctuations, so the classifier is TokenClassifier(['$', '%', '&'], wildcardOfToken)
+
+    Results of classifyFunction are kept in a bounded LRU cache of cacheSize tokens (None for unbounded, 0 to disable it), so executors can classify a token each time they need it. getWildcardIndexes classifies a whole vocabulary into an array instead.
+    """
+
+    wildcards: List[str]
+
+    def __init__(self, wildcards: List[str],
+                 classifyFunction: Callable[[str], Optional[str]],
+                 cacheSize: Optional[int] = DEFAULT_CACHE_SIZE):
+        self.wildcards = wildcards
+        self.classifyFunction = classifyFunction
+        self.cacheSize = cacheSize
+        self.cachedClassify = lru_cache(maxsize=cacheSize)(classifyFunction) if cacheSize != 0 else classifyFunction
+
+    def __getstate__(self):
+        # functions wrapped by lru_cache can't be pickled, the cache is rebuilt in the process that loads it
+        state = self.__dict__.copy()
+        del state['cachedClassify']
+        return state
+
+    def __setstate__(self, state):
+        self.__init__(state['wildcards'], state['classifyFunction'], state['cacheSize'])
+
+    def classify(self, token: str) -> Optional[str]:
+        """
+        Return the wildcard that can consume this token, or None if no wildcard can consume it
+        """
+        return self.cachedClassify(token)
+
+    def getWildcardIndexes(self, wordToIndex: Dict[str, int]) -> np.ndarray:
+        """
+        Index in wildcards of the wildcard that can consume each word, indexed by word index, -1 if no wildcard can consume it
+        """
+        wildcardIndex = {wildcard: index for index, wildcard in enumerate(self.wildcards)}
+        wildcardIndexes = np.full(max(wordToIndex.values(), default=-1) + 1, -1, dtype=np.int32)
+        for word, wordIndex in wordToIndex.items():
+            wildcardIndexes[wordIndex] = wildcardIndex.get(self.classify(word), -1)  # type: ignore
+        return wildcardIndexes
@@ -0,0 +1,79 @@
+from typing import Dict, Iterable, List, Optional
+
+from automata_tools.TokenClassifier import TokenClassifier
+from automata_tools.constants import EPSILON
+
+
+def getWildcards(defaultToken: Optional[str] = None, classifier: Optional[TokenClassifier] = None) -> List[str]:
+    if classifier is not None:
+        return list(classifier.wildcards)
+    return [defaultToken] if defaultToken is not None else []
+
+
+def getWildcardOfToken(token: str, defaultToken: Optional[str] = None, classifier: Optional[TokenClassifier] = None) -> Optional[str]:
+    """
+    Wildcard that can consume a token, the one given by classifier, or defaultToken
+    """
+    if classifier is not None:
+        return classifier.classify(token)
+    return defaultToken
+
+
+class TokenColumns:
+    """
+    Map tokens to columns of a next state table: tokens in the alphabet, then one column for each wildcard, then an unknown column for tokens no wildcard consumes. A token not in the alphabet uses the column of the wildcard it belongs to, that is defaultToken, or the wildcard given by the classifier.
+
+    Base of CompiledDFA, MultiRuleDFA and LazyDFA.
+    """
+
+    alphabet: List[str]  # column -> token
+    tokenIndex: Dict[str, int]  # token -> column
+    wildcards: List[str]  # column - len(alphabet) -> wildcard
+    wildcardIndex: Dict[str, int]  # wildcard -> column
+    defaultToken: Optional[str]
+    classifier: Optional[TokenClassifier]
+
+    def __init__(self,
+                 alphabet: List[str],
+                 wildcards: List[str],
+                 defaultToken: Optional[str] = None,
+                 classifier: Optional[TokenClassifier] = None):
+        self.alphabet = alphabet
+        self.tokenIndex = {token: column for column, token in enumerate(alphabet)}
+        self.wildcards = wildcards
+        self.wildcardIndex = {wildcard: len(alphabet) + index for index, wildcard in enumerate(wildcards)}
+        self.defaultToken = defaultToken
+        self.classifier = classifier
+
+    @staticmethod
+    def getAlphabet(labels: Iterable[str], wildcards: List[str]) -> List[str]:
+        """
+        Transition labels that are neither ε nor a wildcard, sorted
+        """
+        return sorted(set(labels) - set(wildcards) - {EPSILON})
+
+    @property
+    def unknownColumn(self) -> int:
+        return len(self.alphabet) + len(self.wildcards)
+
+    def getWildcard(self, token: str) -> Optional[str]:
+        return getWildcardOfToken(token, self.defaultToken, self.classifier)
+
+    def getColumn(self, token: str) -> int:
+        """
+        Classify a token into the column of table
+        """
+        column = self.tokenIndex.get(token)
+        if column is not None:
+            return column
+        return self.wildcardIndex.get(self.getWildcard(token), self.unknownColumn)  # type: ignore
+
+    def getLabelsOfColumns(self) -> List[List[str]]:
+        """
+        Transition labels each column (except the unknown column) goes through, tokens in the alphabet can also be consumed by their wildcard
+        """
+        labelsOfColumn: List[List[str]] = []
+        for token in self.alphabet:
+            wildcard = self.getWildcard(token)
+            labelsOfColumn.append([token, wildcard] if wildcard in self.wildcardIndex else [token])  # type: ignore
+        return labelsOfColumn + [[wildcard] for wildcard in self.wildcards]
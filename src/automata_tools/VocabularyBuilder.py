@@ -0,0 +1,148 @@
+from collections import Counter
+from itertools import chain, groupby, islice
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+import heapq
+import json
+import os
+import tempfile
+
+# (word, count, first seen), first seen orders words of same frequency
+IWordEntry = Tuple[str, int, int]
+
+
+class VocabularyBuilder:
+    """
+    Count words of a corpus streamed from an iterable or generator of tokenized sentences, on corpora larger than memory.
+
+    Sentences are counted chunkSize at a time into an in-memory Counter. When it holds more than maxMemoryWords distinct words, it is spilled to a run file sorted by word, in a temporary directory under spillDirectory, and counting starts over. getWords merges the runs in one streaming pass, so memory is bounded by maxMemoryWords and the words kept (at most maxSize), never by the long tail of rare words. Counts are exact.
+
+    getWordToIndex keeps words seen at least minFrequency times, at most maxSize of them, most frequent first, and words of same frequency in the order they are first seen, so same corpus always gives same indexes.
+    """
+
+    counts: 'Counter[str]'  # words of the current run, in the order they are first seen
+
+    def __init__(self,
+                 minFrequency: int = 1,
+                 maxSize: Optional[int] = None,
+                 chunkSize: int = 10000,
+                 maxMemoryWords: int = 1000000,
+                 spillDirectory: Optional[str] = None):
+        self.minFrequency = minFrequency
+        self.maxSize = maxSize
+        self.chunkSize = chunkSize
+        self.maxMemoryWords = maxMemoryWords
+        self.spillDirectory = spillDirectory
+        self.counts = Counter()
+        # tokens counted before the current run, first seen of a word is this plus its order in the run
+        self.tokensBeforeRun = 0
+        self.runPaths: List[str] = []
+        self.temporaryDirectory: Optional[tempfile.TemporaryDirectory] = None
+
+    def add(self, tokens: Iterable[str]):
+        """
+        Count tokens of one sentence
+        """
+        self.counts.update(tokens)
+        if len(self.counts) > self.maxMemoryWords:
+            self.spill()
+
+    def addAll(self, texts: Iterable[Iterable[str]]) -> 'VocabularyBuilder':
+        """
+        Count tokens of many sentences, texts can be a generator, it is consumed chunkSize sentences at a time
+        """
+        iterator = iter(texts)
+        while True:
+            chunk = list(islice(iterator, self.chunkSize))
+            if len(chunk) == 0:
+                return self
+            self.add(chain.from_iterable(chunk))
+
+    def getRunEntries(self) -> List[IWordEntry]:
+        """
+        Entries of the current run, sorted by word
+        """
+        return sorted((word, count, self.tokensBeforeRun + order) for order, (word, count) in enumerate(self.counts.items()))
+
+    def spill(self):
+        """
+        Write the current run to disk, and start a new one
+        """
+        if self.temporaryDirectory is None:
+            self.temporaryDirectory = tempfile.TemporaryDirectory(dir=self.spillDirectory, prefix='vocabulary-')
+        runPath = os.path.join(self.temporaryDirectory.name, f"run-{len(self.runPaths)}.jsonl")
+        writeEntries(runPath, self.getRunEntries())
+        self.runPaths.append(runPath)
+        self.tokensBeforeRun += sum(self.counts.values())
+        self.counts = Counter()
+
+    def getEntries(self) -> Iterator[IWordEntry]:
+        """
+        Counts of all words, merged from the runs on disk and the current run, sorted by word
+        """
+        runs = [readEntries(runPath) for runPath in self.runPaths] + [iter(self.getRunEntries())]
+        for word, entries in groupby(heapq.merge(*runs), key=lambda entry: entry[0]):
+            entryList = list(entries)
+            yield word, sum(count for _, count, _ in entryList), min(firstSeen for _, _, firstSeen in entryList)
+
+    def getWords(self) -> List[str]:
+        if len(self.runPaths) == 0:
+            words = [word for word, count in self.counts.items() if count >= self.minFrequency]
+            # sorted is stable, so words of same frequency stay in the order they are first seen
+            words.sort(key=lambda word: -self.counts[word])
+            return words[:self.maxSize] if self.maxSize is not None else words
+        frequentEntries = (entry for entry in self.getEntries() if entry[1] >= self.minFrequency)
+        orderOfEntry = lambda entry: (-entry[1], entry[2])
+        if self.maxSize is not None:
+            return [word for word, _, _ in heapq.nsmallest(self.maxSize, frequentEntries, key=orderOfEntry)]
+        return [word for word, _, _ in sorted(frequentEntries, key=orderOfEntry)]
+
+    def getWordToIndex(self) -> Dict[str, int]:
+        return {word: index for index, word in enumerate(self.getWords())}
+
+    def getIndexToWord(self) -> Dict[int, str]:
+        return dict(enumerate(self.getWords()))
+
+    def save(self, path: str):
+        """
+        Save cutoffs and counts as json lines, a header then [word, count, first seen] of each word, written while the runs are merged, so it doesn't load all counts in memory
+        """
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(json.dumps({
+                'minFrequency': self.minFrequency,
+                'maxSize': self.maxSize,
+                'chunkSize': self.chunkSize,
+                'maxMemoryWords': self.maxMemoryWords,
+                'tokenCount': self.tokensBeforeRun + sum(self.counts.values()),
+            }) + '\n')
+            for entry in self.getEntries():
+                file.write(json.dumps(entry, ensure_ascii=False) + '\n')
+
+    @staticmethod
+    def load(path: str, spillDirectory: Optional[str] = None) -> 'VocabularyBuilder':
+        """
+        Load counts saved by save as a run, more sentences can be added after that
+        """
+        with open(path, encoding='utf-8') as file:
+            header = json.loads(file.readline())
+            vocabularyBuilder = VocabularyBuilder(header['minFrequency'], header['maxSize'], header['chunkSize'], header['maxMemoryWords'], spillDirectory)
+            vocabularyBuilder.temporaryDirectory = tempfile.TemporaryDirectory(dir=spillDirectory, prefix='vocabulary-')
+            runPath = os.path.join(vocabularyBuilder.temporaryDirectory.name, 'run-0.jsonl')
+            with open(runPath, 'w', encoding='utf-8') as runFile:
+                for line in file:
+                    runFile.write(line)
+        vocabularyBuilder.runPaths.append(runPath)
+        vocabularyBuilder.tokensBeforeRun = header['tokenCount']
+        return vocabularyBuilder
+
+
+def writeEntries(path: str, entries: Iterable[IWordEntry]):
+    with open(path, 'w', encoding='utf-8') as file:
+        for entry in entries:
+            file.write(json.dumps(entry, ensure_ascii=False) + '\n')
+
+
+def readEntries(path: str) -> Iterator[IWordEntry]:
+    with open(path, encoding='utf-8') as file:
+        for line in file:
+            word, count, firstSeen = json.loads(line)
+            yield word, count, firstSeen
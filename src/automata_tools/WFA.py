@@ -1,26 +1,71 @@
 from automata_tools.Automata import Automata
-from typing import Dict, List, Union, Callable
+from automata_tools.SparseTransitionTensor import SparseTransitionTensor
+from automata_tools.TokenClassifier import TokenClassifier
+from automata_tools.constants import UNKNOWN_TOKEN
+from itertools import chain
+from typing import Dict, Iterable, List, Optional, Tuple, Union, Callable
 import numpy as np
 
+# from state index -> [(to state index, weight)], only states that have transitions
+IStateRows = Dict[int, List[Tuple[int, float]]]
+
 
 class WFA:
     dfa: Automata
 
     def __init__(self, dfa: Automata, word2index: Dict[str, int],
-                 dfa_to_tensor: Callable) -> None:
+                 dfa_to_tensor: Callable,
+                 classifier: Optional[TokenClassifier] = None) -> None:
+        """
+        If word2index has unknown word buckets (see from_vocabulary), a word not in it takes the bucket of its wildcard given by classifier, otherwise it raises KeyError
+        """
         self.dfa = dfa
+        self.classifier = classifier
+        self.unknownIndexes = {word[len(UNKNOWN_TOKEN):]: index for word, index in word2index.items() if word.startswith(UNKNOWN_TOKEN)}
         self.dfaDict = self.dfa.to_dict()
         wfaTensor, wfaState2idx, wildcardMatrix, language = dfa_to_tensor(
             self.dfaDict, word2index)
         self.word2index = word2index
-        self.wfaTensor = wfaTensor + wildcardMatrix  # word sparse transition matrix and wildcard all 1 transition matrix
+        self.wildcardMatrix = wildcardMatrix
+        # dfa_to_tensor can return a dense V×S×S np.array, or a SparseTransitionTensor that only stores edges
+        self.sparse = not isinstance(wfaTensor, np.ndarray)
+        # wildcard matrix is shared by all words, instead of being added to every slice, so a dense tensor loaded with mmap (see RuleCache.getWFA) is not copied
+        self.wfaTensor = wfaTensor
         self.wfaState2idx = wfaState2idx
         self.language = language
+        # transitions of each state, used by execute_active
+        self.wildcardRows = getStateRows(*np.nonzero(wildcardMatrix), wildcardMatrix[np.nonzero(wildcardMatrix)])
+        self.wordRows: Dict[int, IStateRows] = dict()
+        self.wordEdges: Optional[SparseTransitionTensor] = None
         self.tokenizer = lambda inputText: self.dfa.tokenizer(inputText)
 
+    @staticmethod
+    def from_vocabulary(dfa: Automata,
+                        vocabulary: Iterable[str],
+                        dfa_to_tensor: Callable,
+                        classifier: Optional[TokenClassifier] = None) -> 'WFA':
+        """
+        Build the WFA of a rule once for a whole vocabulary, instead of a word index of each sentence. Words of the rule are added to the vocabulary, and an unknown word bucket for each wildcard of classifier (and one for words no wildcard consumes), named UNKNOWN_TOKEN + wildcard, so dfa_to_tensor can give them transitions of the wildcard. Words not in the vocabulary go through the bucket of their wildcard.
+        """
+        word2index: Dict[str, int] = dict()
+        wildcards = classifier.wildcards if classifier is not None else []
+        ruleWords = sorted(token for token in dfa.language if token not in wildcards)
+        for word in [*vocabulary, *ruleWords, *[UNKNOWN_TOKEN + wildcard for wildcard in wildcards], UNKNOWN_TOKEN]:
+            word2index.setdefault(word, len(word2index))
+        return WFA(dfa, word2index, dfa_to_tensor, classifier)
+
     def setTokenizer(self, tokenizerFunction: Callable[[str], List[str]]):
         self.tokenizer = tokenizerFunction
 
+    def getWordIndex(self, word: str) -> int:
+        wordIndex = self.word2index.get(word)
+        if wordIndex is not None:
+            return wordIndex
+        if len(self.unknownIndexes) == 0:
+            raise KeyError(word)
+        wildcard = self.classifier.classify(word) if self.classifier is not None else None
+        return self.unknownIndexes.get(wildcard if wildcard is not None else '', self.unknownIndexes[''])
+
     def getStateLength(self) -> int:
         return len(self.dfaDict['states'])
 
@@ -30,25 +75,116 @@ class WFA:
     def getStartStateIndex(self) -> int:
         return self.wfaState2idx[self.dfaDict['startstate']]
 
-    def execute(self, inputWords: Union[str, np.array]) -> bool:
+    def getWordIndexes(self, inputWords: Union[str, np.array]) -> np.array:
         if isinstance(inputWords, str):
-            inputWordTensor = np.array(
-                list(
-                    map(lambda word: self.word2index[word],
-                        self.tokenizer(inputWords))))
-        else:
-            inputWordTensor = inputWords
-        stateTensor = np.zeros((self.getStateLength(), 1))
-        stateTensor[self.getStartStateIndex(
-        )] = 1  # set initial state's probability to 1
+            return np.array(
+                list(map(self.getWordIndex, self.tokenizer(inputWords))),
+                dtype=np.int64)
+        return np.asarray(inputWords, dtype=np.int64)
+
+    def transit(self, wordIndex: int, stateVector: np.array) -> np.array:
+        """
+        Given the weight of each state, get the weight of each state after consuming a word
+        """
+        if self.sparse:
+            return np.dot(self.wildcardMatrix.T, stateVector) + self.wfaTensor.multiply(wordIndex, stateVector)
         # every word have a size SxS transition matrix, where S = self.getStateLength()
+        return np.dot(self.wildcardMatrix.T, stateVector) + np.dot(self.wfaTensor[wordIndex].T, stateVector)
+
+    def getWordEdges(self) -> SparseTransitionTensor:
+        """
+        Edges of the dense tensor in CSR layout, found once, so execute_batch advances a whole batch with one gather and one scatter per token, without copying a S×S matrix for each sentence
+        """
+        if self.wordEdges is None:
+            wordIndexes, fromStates, toStates = np.nonzero(self.wfaTensor)
+            wordCount, stateCount, _ = self.wfaTensor.shape
+            indptr = np.zeros(wordCount + 1, dtype=np.int64)
+            np.cumsum(np.bincount(wordIndexes, minlength=wordCount), out=indptr[1:])
+            self.wordEdges = SparseTransitionTensor(wordCount, stateCount, indptr,
+                                                    fromStates.astype(np.int32), toStates.astype(np.int32),
+                                                    np.asarray(self.wfaTensor[wordIndexes, fromStates, toStates], dtype=np.float64))
+        return self.wordEdges
+
+    def execute(self, inputWords: Union[str, np.array]) -> bool:
+        inputWordTensor = self.getWordIndexes(inputWords)
+        stateVector = np.zeros(self.getStateLength())
+        stateVector[self.getStartStateIndex(
+        )] = 1  # set initial state's probability to 1
         for inputIndex in range(len(inputWordTensor)):
-            inputWordIndex = inputWordTensor[inputIndex]
-            transitionMatrixOfCurrentInputWord = self.wfaTensor[int(
-                inputWordIndex)].transpose()
-            stateTensor = np.dot(transitionMatrixOfCurrentInputWord,
-                                 stateTensor)
+            stateVector = self.transit(int(inputWordTensor[inputIndex]), stateVector)
         for index in self.getFinalStateIndex():
-            if int(stateTensor[index]) >= 1:
+            if int(stateVector[index]) >= 1:
                 return True
-        return False
\ No newline at end of file
+        return False
+
+    def getWordRows(self, wordIndex: int) -> IStateRows:
+        """
+        Transitions on the word itself (not the wildcard ones) of each state, built the first time the word is executed
+        """
+        rows = self.wordRows.get(wordIndex)
+        if rows is None:
+            if self.sparse:
+                fromStates, toStates, weights = self.wfaTensor.getEdges(wordIndex)
+            else:
+                wordMatrix = self.wfaTensor[wordIndex]
+                fromStates, toStates = np.nonzero(wordMatrix)
+                weights = wordMatrix[fromStates, toStates]
+            rows = getStateRows(fromStates, toStates, weights)
+            self.wordRows[wordIndex] = rows
+        return rows
+
+    def execute_active(self, inputWords: Union[str, np.array]) -> bool:
+        """
+        Same as execute, but only keeps states with non zero weight, and gathers their transitions instead of multiplying the S×S matrix of each word. The state vector of a WFA from a DFA is one hot (unless word and wildcard transitions overlap), so a word costs time linear to the transitions of the active states instead of S².
+        """
+        wildcardRows = self.wildcardRows
+        activeStates: Dict[int, float] = {self.getStartStateIndex(): 1.0}
+        for wordIndex in self.getWordIndexes(inputWords).tolist():
+            wordRows = self.getWordRows(wordIndex)
+            nextStates: Dict[int, float] = dict()
+            for state, weight in activeStates.items():
+                for toState, transitionWeight in chain(wordRows.get(state, ()), wildcardRows.get(state, ())):
+                    nextStates[toState] = nextStates.get(toState, 0.0) + weight * transitionWeight
+            activeStates = nextStates
+            if len(activeStates) == 0:
+                return False
+        return any(int(activeStates.get(index, 0.0)) >= 1 for index in self.getFinalStateIndex())
+
+    def execute_batch(self,
+                      inputs: List[Union[str, np.array]],
+                      returnScores: bool = False,
+                      batchSize: int = 1024):
+        """
+        Execute many sentences at once. Sentences are bucketed by their length, so each bucket can advance a B×S state matrix per time step with one batched matrix multiplication, instead of looping over sentences.
+
+        Returns a boolean array telling whether each sentence is matched, and if returnScores, also the weight each sentence reaches the final states with.
+        """
+        wordIndexes = [self.getWordIndexes(inputWords) for inputWords in inputs]
+        sentencesOfLength: Dict[int, List[int]] = dict()
+        for sentenceIndex, wordIndexesOfSentence in enumerate(wordIndexes):
+            sentencesOfLength.setdefault(len(wordIndexesOfSentence), []).append(sentenceIndex)
+        finalStateIndex = self.getFinalStateIndex()
+        wordEdges = self.wfaTensor if self.sparse else self.getWordEdges()
+        matches = np.zeros(len(inputs), dtype=np.bool_)
+        scores = np.zeros(len(inputs))
+        for length, sentenceIndexes in sentencesOfLength.items():
+            for batchStart in range(0, len(sentenceIndexes), batchSize):
+                batchSentenceIndexes = sentenceIndexes[batchStart:batchStart + batchSize]
+                batchWordIndexes = np.array([wordIndexes[sentenceIndex] for sentenceIndex in batchSentenceIndexes], dtype=np.int64).reshape(len(batchSentenceIndexes), length)
+                stateMatrix = np.zeros((len(batchSentenceIndexes), self.getStateLength()))
+                stateMatrix[:, self.getStartStateIndex()] = 1
+                for step in range(length):
+                    stateMatrix = np.dot(stateMatrix, self.wildcardMatrix) + wordEdges.multiplyBatch(batchWordIndexes[:, step], stateMatrix)
+                finalStateMatrix = stateMatrix[:, finalStateIndex]
+                matches[batchSentenceIndexes] = (finalStateMatrix.astype(np.int64) >= 1).any(axis=1)
+                scores[batchSentenceIndexes] = finalStateMatrix.sum(axis=1)
+        if returnScores:
+            return matches, scores
+        return matches
+
+
+def getStateRows(fromStates: np.ndarray, toStates: np.ndarray, weights: np.ndarray) -> IStateRows:
+    rows: IStateRows = dict()
+    for fromState, toState, weight in zip(fromStates.tolist(), toStates.tolist(), weights.tolist()):
+        rows.setdefault(fromState, []).append((toState, weight))
+    return rows
@@ -1,7 +1,23 @@
 from automata_tools.Automata import Automata
 from automata_tools.BuildAutomata import BuildAutomata
+from automata_tools.BuildAutomataInPlace import BuildAutomataInPlace, AutomataFragment
 from automata_tools.NFAtoDFA import NFAtoDFA, NFAtoDFAGroupStable
+from automata_tools.NFAtoSimplifiedNFA import NFAtoSimplifiedNFA, getAutomataSize
 from automata_tools.DFAtoMinimizedDFA import DFAtoMinimizedDFA
 from automata_tools.WFA import WFA
+from automata_tools.CompiledDFA import CompiledDFA
+from automata_tools.TokenClassifier import TokenClassifier
+from automata_tools.TokenColumns import TokenColumns
+from automata_tools.Tokenizer import Tokenizer
+from automata_tools.MultiRuleDFA import MultiRuleDFA
+from automata_tools.LazyDFA import LazyDFA
+from automata_tools.BitParallelNFA import BitParallelNFA
+from automata_tools.StreamMatcher import StreamMatcher
+from automata_tools.CaptureMatcher import CaptureMatcher
+from automata_tools.SparseTransitionTensor import SparseTransitionTensor
+from automata_tools.AutomataFile import AutomataFile, AutomataFileError
+from automata_tools.RuleCache import RuleCache
+from automata_tools.VocabularyBuilder import VocabularyBuilder
+from automata_tools.constants import LIBRARY_VERSION as __version__
 
 from automata_tools.utils import drawGraph, isInstalled, get_word_to_index
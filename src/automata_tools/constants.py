@@ -1 +1,21 @@
 EPSILON = 'ε'
+
+# next state of a table cell that has no transition
+DEAD_STATE = -1
+# next state of a table cell not determinized yet, in MultiRuleDFA and LazyDFA
+UNKNOWN_STATE = -2
+# if fewer tokens than this per cached state were executed since the last flush of a lazily determinized DFA, the cache doesn't pay off, like the "bytes per state" check of RE2
+MIN_TOKENS_PER_STATE = 10
+
+# keep in sync with setup.py, cached automata built by other versions are not reused
+LIBRARY_VERSION = '2.0.1'
+
+# bump this whenever automata built from a same rule change (e.g. linear repeat ranges, NFA simplification no longer on by default in NFAtoDFA), so RuleCache doesn't serve automata built the old way
+BUILDER_VERSION = 4
+
+# prefixes of the edges NFAtoDFAGroupStable adds around each capture group, followed by the group name
+CAPTURE_START = 'CaptureStart-'
+CAPTURE_END = 'CaptureEnd-'
+
+# prefix of the word index of unknown words in WFA.from_vocabulary, followed by the wildcard that consumes them, or nothing if no wildcard does. It has a space, so no token from a tokenizer can be taken for a bucket
+UNKNOWN_TOKEN = 'Unknown word '
@@ -38,7 +38,8 @@ def isInstalled(program):
 def get_word_to_index(texts: List[List[str]]):
     vocab = Counter()
     for text in texts:
-        vocab += Counter(text)
+        # update counts in place, += would copy the whole counter for every text
+        vocab.update(text)
     vocabList = list(vocab.keys())
     indexToWord = {idx: vocab for idx, vocab in enumerate(vocabList)}
     wordToIndex = {vocab: idx for idx, vocab in enumerate(vocabList)}